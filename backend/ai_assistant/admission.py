@@ -0,0 +1,370 @@
+"""
+Inbound admission control and load shedding.
+
+Every AI endpoint ends in a slow upstream call. Accepting every request
+means that under a burst (a whole classroom pressing "Ask" at once) all
+of them queue behind the provider and time out together. Admission
+control rejects the excess up front, with a Retry-After the client can
+honour:
+
+- a token bucket per client (IP address) caps how fast one client can
+  send requests (429 Too Many Requests); off unless ADMISSION_CLIENT_RPM
+  is set, since users behind one proxy or NAT share an address;
+- a per-endpoint cap on in-flight requests, plus a short bounded queue,
+  keeps the number of concurrent upstream calls in check (503 Service
+  Unavailable once the queue is full or the wait runs out).
+
+Only the routes in GATED_ROUTES are subject to admission; health, config
+and session lookups are always served.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from config import config, ConfigSnapshot
+from deadlines import remaining
+
+
+# Routes that end in an upstream provider call
+GATED_ROUTES = frozenset({
+    "/mentor",
+    "/mentor/stream",
+    "/analyze",
+    "/analyze/batch",
+    "/generate",
+    "/generate/stream",
+})
+
+
+class Rejection:
+    """Why a request was not admitted, and how to answer it."""
+    
+    __slots__ = ("status", "outcome", "message", "retry_after")
+    
+    def __init__(self, status: int, outcome: str, message: str, retry_after: float):
+        self.status = status
+        self.outcome = outcome
+        self.message = message
+        self.retry_after = retry_after
+    
+    def body(self) -> Dict[str, Any]:
+        return {"error": self.message, "outcome": self.outcome}
+    
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(int(math.ceil(self.retry_after)), 1))}
+
+
+# =============================================================================
+# PER-CLIENT RATE LIMIT
+# =============================================================================
+
+class ClientRateLimiter:
+    """
+    Token bucket per client, LRU-bounded so unknown clients can't grow it.
+    
+    Thread-safe; also used from the event loop (no awaits inside).
+    """
+    
+    def __init__(self, per_minute: int, burst: int, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = float(max(burst, 1))
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def check(self, client: str) -> Optional[float]:
+        """
+        Take one token for `client`.
+        
+        Returns:
+            None if allowed, else seconds until the next token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.pop(client, (self.burst, now))
+            level = min(self.burst, level + (now - updated) * self.rate)
+            if level < 1:
+                self._buckets[client] = (level, now)
+                return (1 - level) / self.rate if self.rate > 0 else 60.0
+            self._buckets[client] = (level - 1, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return None
+
+
+# =============================================================================
+# PER-ENDPOINT CONCURRENCY
+# =============================================================================
+
+class _GateStats:
+    def __init__(self):
+        self.counts = {"admitted": 0, "queued": 0, "shed": 0}
+        self.in_flight = 0
+        self.waiting = 0
+    
+    def snapshot(self, limit: int) -> Dict[str, int]:
+        return {**self.counts, "in_flight": self.in_flight, "waiting": self.waiting, "limit": limit}
+
+
+class ConcurrencyGate:
+    """In-flight cap with a bounded wait queue (thread-based, for Flask)."""
+    
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._stats = _GateStats()
+    
+    def enter(self, timeout: float) -> bool:
+        """Take an in-flight slot, waiting up to `timeout`; False = shed."""
+        stats = self._stats
+        with self._cond:
+            if stats.in_flight >= self.limit:
+                if stats.waiting >= self.max_queue:
+                    stats.counts["shed"] += 1
+                    return False
+                stats.counts["queued"] += 1
+                stats.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: stats.in_flight < self.limit, timeout)
+                finally:
+                    stats.waiting -= 1
+                if not admitted:
+                    stats.counts["shed"] += 1
+                    return False
+            stats.in_flight += 1
+            stats.counts["admitted"] += 1
+            return True
+    
+    def leave(self) -> None:
+        with self._cond:
+            self._stats.in_flight -= 1
+            self._cond.notify()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return self._stats.snapshot(self.limit)
+
+
+class AsyncConcurrencyGate:
+    """
+    asyncio version of ConcurrencyGate, for the ASGI app.
+    
+    Slots are counted synchronously and handed directly to the oldest
+    waiter on leave(), so concurrent arrivals can't all slip past the cap.
+    """
+    
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self._waiters: Deque[Any] = deque()  # asyncio.Future
+        self._stats = _GateStats()
+    
+    async def enter(self, timeout: float) -> bool:
+        # Imported here: only the ASGI app builds async gates, and the Flask
+        # app's cold start shouldn't pay for asyncio
+        import asyncio
+        
+        stats = self._stats
+        if stats.in_flight < self.limit and not self._waiters:
+            stats.in_flight += 1
+            stats.counts["admitted"] += 1
+            return True
+        if stats.waiting >= self.max_queue:
+            stats.counts["shed"] += 1
+            return False
+        
+        stats.counts["queued"] += 1
+        stats.waiting += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # Shielded: a timeout must not cancel a slot that was just handed over
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the request went away: pass it on
+                self.leave()
+            raise
+        finally:
+            stats.waiting -= 1
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+        if waiter.cancelled():
+            stats.counts["shed"] += 1
+            return False
+        stats.counts["admitted"] += 1
+        return True
+    
+    def leave(self) -> None:
+        # Hand the slot straight to the oldest waiter, if any
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._stats.in_flight -= 1
+    
+    def stats(self) -> Dict[str, int]:
+        return self._stats.snapshot(self.limit)
+
+
+# =============================================================================
+# ADMISSION CONTROLLER
+# =============================================================================
+
+class AdmissionController:
+    """
+    Per-client rate limit plus per-route concurrency gates.
+    
+    Example (Flask):
+        rejection = admission.admit_client(client_ip)
+        if rejection is None:
+            rejection = admission.enter(route)   # then admission.leave(route)
+    """
+    
+    def __init__(self, asynchronous: bool = False):
+        self.asynchronous = asynchronous
+        self._clients = ClientRateLimiter(
+            per_minute=config.admission_client_rpm,
+            burst=config.admission_client_burst,
+        )
+        self._gates: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def admit_client(self, client: str) -> Optional[Rejection]:
+        """Apply the per-client rate limit."""
+        if config.admission_client_rpm <= 0:
+            return None
+        wait = self._clients.check(client)
+        if wait is None:
+            return None
+        return Rejection(429, "rate_limited", "Too many requests; slow down", wait)
+    
+    def enter(self, route: str) -> Optional[Rejection]:
+        """Take an in-flight slot for a route (sync)."""
+        if self._gate(route).enter(self._queue_timeout()):
+            return None
+        return self._overloaded()
+    
+    async def aenter(self, route: str) -> Optional[Rejection]:
+        """Take an in-flight slot for a route (async)."""
+        if await self._gate(route).enter(self._queue_timeout()):
+            return None
+        return self._overloaded()
+    
+    def leave(self, route: str) -> None:
+        self._gate(route).leave()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            gates = dict(self._gates)
+        return {route: gate.stats() for route, gate in gates.items()}
+    
+    def _gate(self, route: str):
+        gate = self._gates.get(route)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.get(route)
+                if gate is None:
+                    limit = config.admission_route_limits.get(route, config.admission_max_in_flight)
+                    gate_class = AsyncConcurrencyGate if self.asynchronous else ConcurrencyGate
+                    gate = gate_class(max(limit, 1), config.admission_max_queue)
+                    self._gates[route] = gate
+        return gate
+    
+    @staticmethod
+    def _queue_timeout() -> float:
+        """Queue for at most ADMISSION_QUEUE_TIMEOUT_MS, and never past the deadline."""
+        timeout = config.admission_queue_timeout_ms / 1000.0
+        left = remaining()
+        return max(min(timeout, left), 0.0) if left is not None else timeout
+    
+    @staticmethod
+    def _overloaded() -> Rejection:
+        return Rejection(
+            503, "overloaded", "Server is busy; try again shortly",
+            config.admission_queue_timeout_ms / 1000.0,
+        )
+
+
+class AdmittedStream:
+    """
+    Async iterator that holds a route's in-flight slot until a stream ends.
+    
+    Quart tears the request down before it sends a streamed body, so a
+    teardown hook would free the slot while the upstream call is still
+    running. Instead the slot travels with the body: it is released once,
+    when the stream is exhausted, raises, or is closed by the server (e.g.
+    on client disconnect), even if it never started.
+    """
+    
+    def __init__(self, chunks: AsyncIterator[Any], admission: AdmissionController, route: str):
+        self._chunks = chunks
+        self._admission: Optional[AdmissionController] = admission
+        self._route = route
+    
+    def __aiter__(self) -> "AdmittedStream":
+        return self
+    
+    async def __anext__(self) -> Any:
+        try:
+            return await self._chunks.__anext__()
+        except BaseException:
+            # Exhausted (StopAsyncIteration), failed or cancelled
+            self._release()
+            raise
+    
+    async def aclose(self) -> None:
+        try:
+            aclose = getattr(self._chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self._release()
+    
+    def _release(self) -> None:
+        admission, self._admission = self._admission, None
+        if admission is not None:
+            admission.leave(self._route)
+
+
+_controllers: Dict[bool, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(asynchronous: bool = False) -> Optional[AdmissionController]:
+    """
+    Get the process-wide admission controller for the Flask (sync) or
+    ASGI (async) app.
+    
+    Returns:
+        The controller, or None when ADMISSION_ENABLED is off.
+    """
+    if not config.admission_enabled:
+        return None
+    
+    controller = _controllers.get(asynchronous)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(asynchronous)
+            if controller is None:
+                controller = AdmissionController(asynchronous)
+                _controllers[asynchronous] = controller
+    return controller
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Rebuild the controllers on next use if their settings changed."""
+    if any(name.startswith("admission_") for name in new.changed_fields(old)):
+        with _controllers_lock:
+            _controllers.clear()
+
+
+config.on_reload(_on_config_reload)
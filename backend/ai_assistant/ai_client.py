@@ -13,16 +13,21 @@ Usage:
 To switch providers, modify the ACTIVE_PROVIDER variable in .env file.
 """
 
-from typing import Optional
+import threading
+from typing import Dict, Iterator, Optional, Tuple
 from base import BaseAIClient
-from config import config
+from config import config, ConfigSnapshot
+from logs import get_logger
+
+log = get_logger("ai_client")
+
 
 # =============================================================================
 # PROVIDER CONFIGURATION - Read from .env via config module
 # =============================================================================
 
-# These are loaded from .env file through config.py
-ACTIVE_PROVIDER = config.active_provider  # "gemini" or "groq"
+# These are loaded from .env file through config.py and refreshed on reload
+ACTIVE_PROVIDER = config.active_provider  # "gemini", "groq" or "fake"
 ACTIVE_MODEL = config.active_model  # Model override or None for default
 API_KEY = None  # API keys are read from environment by each provider
 
@@ -42,13 +47,80 @@ def _get_provider_class(provider_name: str):
     elif provider_name == "groq":
         from groq_provider import GroqClient
         return GroqClient
+    elif provider_name == "fake":
+        from fake_provider import FakeClient
+        return FakeClient
     else:
         raise ValueError(
             f"Unknown provider: {provider_name}. "
-            f"Available providers: gemini, groq"
+            f"Available providers: gemini, groq, fake"
         )
 
 
+# =============================================================================
+# CLIENT POOL - Long-lived clients shared across requests and threads
+# =============================================================================
+
+# Provider clients own an SDK client with its own HTTP connection pool (and,
+# for Gemini, a process-global genai.configure() call), so they are built once
+# per (provider, model, api key) and reused. The SDK clients are thread-safe.
+_client_pool: Dict[Tuple[Optional[str], ...], BaseAIClient] = {}
+_client_pool_lock = threading.Lock()
+
+
+def _create_client(
+    provider: str,
+    model: Optional[str],
+    api_key: Optional[str]
+) -> BaseAIClient:
+    """Instantiate a brand new client for the given provider."""
+    provider_class = _get_provider_class(provider)
+    client = provider_class(api_key=api_key, model=model)
+    
+    # Upstream latency/outcome metrics and usage ledger (innermost: only real provider calls)
+    if config.metrics_enabled or config.usage_ledger_enabled:
+        from metrics import MetricsClient
+        client = MetricsClient(client, provider)
+    
+    # Identical concurrent calls share a single upstream request
+    if config.singleflight_enabled:
+        from singleflight import CoalescingClient
+        client = CoalescingClient(client)
+    
+    # Skip a failing provider instead of waiting for every call to fail
+    if config.breaker_enabled:
+        from breaker import BreakerClient, get_breaker
+        client = BreakerClient(
+            client,
+            get_breaker(provider, client.model),
+            failover=_failover_for(provider, client.model),
+        )
+    
+    return client
+
+
+def _failover_for(provider: str, model: Optional[str]):
+    """
+    Factory for the client an open circuit routes to, or None for the demo path.
+    
+    The hedged client already fails over on its own, so no failover is set
+    when hedging is enabled.
+    """
+    if not config.breaker_failover or config.hedge_enabled:
+        return None
+    
+    def failover() -> Optional[BaseAIClient]:
+        secondary_provider = config.hedge_provider
+        secondary_model = config.hedge_model
+        if secondary_provider == provider and secondary_model in (None, model):
+            return None
+        if not config.has_api_key(secondary_provider):
+            return None
+        return get_ai_client(provider=secondary_provider, model=secondary_model)
+    
+    return failover
+
+
 def get_ai_client(
     provider: Optional[str] = None,
     model: Optional[str] = None,
@@ -57,18 +129,21 @@ def get_ai_client(
     """
     Get an AI client instance.
     
-    This function creates and returns an AI client based on the configuration.
-    By default, it uses the global ACTIVE_PROVIDER, ACTIVE_MODEL, and API_KEY
-    settings, but these can be overridden with function arguments.
+    This function returns a pooled AI client based on the configuration.
+    By default, it uses the current configuration snapshot's provider and
+    model, but these can be overridden with function arguments.
+    
+    Clients are cached per (provider, model, api key) and shared between
+    callers, so repeated calls do not pay for SDK setup or new connections.
     
     Args:
-        provider: Override the active provider. Options: "gemini", "groq"
+        provider: Override the active provider. Options: "gemini", "groq", "fake"
         model: Override the model to use.
         api_key: Override the API key.
-        
+    
     Returns:
         An instance of the appropriate AI client implementing BaseAIClient.
-        
+    
     Example:
         # Use default configuration
         client = get_ai_client()
@@ -79,14 +154,95 @@ def get_ai_client(
         # Use specific model
         client = get_ai_client(model="gemini-1.5-pro")
     """
-    # Use provided values or fall back to global configuration
-    selected_provider = provider or ACTIVE_PROVIDER
-    selected_model = model or ACTIVE_MODEL
+    # Default calls may be hedged across providers (explicit overrides never are)
+    if config.hedge_enabled and provider is None and model is None and api_key is None:
+        return _get_hedged_client()
+    
+    # Use provided values or fall back to the current configuration snapshot
+    snapshot = config.snapshot
+    selected_provider = provider or snapshot.active_provider
+    selected_model = model or snapshot.active_model
     selected_api_key = api_key or API_KEY
     
-    # Get the provider class and instantiate it
-    provider_class = _get_provider_class(selected_provider)
-    return provider_class(api_key=selected_api_key, model=selected_model)
+    # Key on the resolved API key so a rotated key gets a fresh client
+    pool_key = (
+        selected_provider,
+        selected_model,
+        selected_api_key or config.get_api_key(selected_provider),
+    )
+    
+    client = _client_pool.get(pool_key)
+    if client is not None:
+        return client
+    
+    with _client_pool_lock:
+        # Another thread may have created it while we waited for the lock
+        client = _client_pool.get(pool_key)
+        if client is None:
+            client = _create_client(selected_provider, selected_model, selected_api_key)
+            _client_pool[pool_key] = client
+        return client
+
+
+def _get_hedged_client() -> BaseAIClient:
+    """Get the pooled hedged client for the active provider (see hedging.py)."""
+    primary_provider = config.active_provider
+    primary_model = config.active_model
+    secondary_provider = config.hedge_provider
+    secondary_model = config.hedge_model
+    
+    primary = get_ai_client(provider=primary_provider, model=primary_model)
+    
+    # Hedging needs a different, usable secondary
+    if (secondary_provider, secondary_model) == (primary_provider, primary_model):
+        return primary
+    if not config.has_api_key(secondary_provider):
+        return primary
+    
+    pool_key = ("hedged", primary_provider, primary_model, secondary_provider, secondary_model)
+    client = _client_pool.get(pool_key)
+    if client is not None:
+        return client
+    
+    try:
+        secondary = get_ai_client(provider=secondary_provider, model=secondary_model)
+    except Exception as e:
+        log.warning(f"Hedging disabled, secondary unavailable: {e}")
+        return primary
+    
+    from hedging import HedgedClient
+    
+    with _client_pool_lock:
+        client = _client_pool.get(pool_key)
+        if client is None:
+            client = HedgedClient(
+                primary,
+                secondary,
+                percentile=config.hedge_percentile,
+                initial_delay=config.hedge_initial_delay_ms / 1000.0,
+                min_delay=config.hedge_min_delay_ms / 1000.0,
+            )
+            _client_pool[pool_key] = client
+        return client
+
+
+def clear_client_pool() -> None:
+    """Drop all pooled clients. Useful after rotating keys or changing models."""
+    with _client_pool_lock:
+        _client_pool.clear()
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Swap out clients built from the previous configuration."""
+    global ACTIVE_PROVIDER, ACTIVE_MODEL
+    
+    ACTIVE_PROVIDER = new.active_provider
+    ACTIVE_MODEL = new.active_model
+    
+    # In-flight requests keep the client they already hold; new requests
+    # build fresh clients from the new snapshot
+    clear_client_pool()
+    ai.reset()
 
 
 # =============================================================================
@@ -106,12 +262,17 @@ class _LazyAIClient:
     """
     
     _instance: Optional[BaseAIClient] = None
+    _lock = threading.Lock()
     
     def _get_client(self) -> BaseAIClient:
-        """Get or create the client instance."""
-        if self._instance is None:
-            self._instance = get_ai_client()
-        return self._instance
+        """Get or create the client instance (thread-safe)."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = get_ai_client()
+                instance = self._instance
+        return instance
     
     def generate_response(self, prompt: str, **kwargs) -> str:
         """Generate a response using the configured provider."""
@@ -144,7 +305,7 @@ class _LazyAIClient:
             topic: The topic being discussed.
             system_prompt: Optional system prompt override.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             The assistant's response text.
         """
@@ -163,19 +324,34 @@ class _LazyAIClient:
             concept_name: Name of the concept being explained.
             user_explanation: The user's explanation text.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             Dictionary with keys: understood, missing, incorrect, assumptions, summary.
         """
         return self._get_client().analyze_concept(concept_name, user_explanation, **kwargs)
     
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Stream a response chunk by chunk using the configured provider."""
+        return self._get_client().stream_response(prompt, **kwargs)
+    
+    def stream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """Stream a Mentor Mode chat response chunk by chunk."""
+        return self._get_client().stream_chat(messages, topic, system_prompt, **kwargs)
+    
     def get_model_info(self) -> dict:
         """Get information about the current model configuration."""
         return self._get_client().get_model_info()
     
     def reset(self):
         """Reset the client instance. Useful after changing configuration."""
-        self._instance = None
+        with self._lock:
+            self._instance = None
     
     def __repr__(self) -> str:
         if self._instance:
@@ -186,6 +362,8 @@ class _LazyAIClient:
 # Global AI client instance for convenient access
 ai = _LazyAIClient()
 
+config.on_reload(_on_config_reload)
+
 # =============================================================================
 # PUBLIC API
 # =============================================================================
@@ -193,7 +371,8 @@ ai = _LazyAIClient()
 __all__ = [
     # Main entry points
     "ai",               # Lazy global client instance
-    "get_ai_client",    # Factory function for creating clients
+    "get_ai_client",    # Factory function for pooled clients
+    "clear_client_pool",  # Drop pooled clients (e.g. after key rotation)
     
     # Configuration
     "ACTIVE_PROVIDER",  # Current provider setting
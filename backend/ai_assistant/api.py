@@ -5,25 +5,56 @@ Provides HTTP endpoints for Mentor Mode and Concept Mirror Mode,
 enabling the React frontend to communicate with the Python backend.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-import traceback
-import sys
+import contextvars
 
 from config import config
-from demo import get_mentor_demo_response, get_concept_mirror_demo_response
+from admission import GATED_ROUTES, get_admission_controller
+from deadlines import (
+    DEADLINE_HEADER, DeadlineExceeded, first_chunk_deadline,
+    record_deadline_exceeded, request_deadline, set_deadline,
+)
+from handlers import (
+    DEMO_FIELDS, analyze_fallback, answer_fields, batch_item_failure, batch_items,
+    check_admin, client_id, concept_demo, concept_input, delete_session, generate_demo,
+    generate_error, get_client, health_report, json_body, mentor_cache_lookup,
+    mentor_cache_store, mentor_demo, mentor_fallback, mentor_stream_fallback,
+    mentor_turn, prompt_input, provider_fields, reload_report, RequestError, session_body,
+    use_demo,
+)
+from ledger import keep_usage_scope, set_usage_scope, set_usage_topic, usage_report
+from logs import get_logger
+from metrics import first_chunk_timer, install_flask_metrics
+from preload import preload_provider
+from streaming import SSE_HEADERS, sse_stream
+from tracing import install_flask_tracing, span
 
-# Import the AI client factory
-def _get_ai_client():
-    """Lazy import to avoid circular dependencies."""
-    try:
-        from ai_client import get_ai_client
-        return get_ai_client()
-    except Exception as e:
-        print(f"[ERROR] Failed to get AI client: {e}")
-        traceback.print_exc()
-        raise
+log = get_logger("api")
+
+
+def _route() -> Optional[str]:
+    """The matched URL rule of the current request."""
+    return request.url_rule.rule if request.url_rule is not None else None
+
+
+def _client_id() -> str:
+    """Client identity for per-client rate limits (see handlers.client_id)."""
+    return client_id(request.headers.get("X-Forwarded-For"), request.remote_addr)
+
+
+def _sse_response(chunks, done: dict) -> Response:
+    """Wrap a chunk iterator in a streaming text/event-stream response."""
+    return Response(
+        stream_with_context(first_chunk_timer(
+            sse_stream(first_chunk_deadline(keep_usage_scope(chunks), _route()), done),
+            _route(), g.metrics_started,
+        )),
+        mimetype="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 def create_app() -> Flask:
@@ -33,6 +64,86 @@ def create_app() -> Flask:
     # Enable CORS for all routes (allows React frontend to connect)
     CORS(app, origins=["http://localhost:5173", "http://127.0.0.1:5173", "*"])
     
+    # Pick up .env edits without a restart (no-op unless ENV_WATCH_INTERVAL is set)
+    config.start_env_watcher()
+    
+    # Request metrics and /metrics (registered first so every request is timed)
+    install_flask_metrics(app)
+    
+    # Request traces and Server-Timing (before the deadline/admission hooks,
+    # so admission queueing shows up in the total)
+    install_flask_tracing(app)
+    
+    # ==========================================================================
+    # Request Deadlines
+    # ==========================================================================
+    
+    @app.before_request
+    def start_deadline():
+        """Give the request its deadline (see deadlines.py)."""
+        set_deadline(request_deadline(_route(), request.headers.get(DEADLINE_HEADER)))
+    
+    @app.teardown_request
+    def clear_deadline(exc):
+        set_deadline(None)
+    
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(e):
+        record_deadline_exceeded(_route())
+        return jsonify({"error": str(e), "outcome": "deadline_exceeded"}), 504
+    
+    @app.errorhandler(RequestError)
+    def request_error(e):
+        return jsonify(e.body()), e.status
+    
+    # ==========================================================================
+    # Usage Ledger
+    # ==========================================================================
+    
+    @app.before_request
+    def start_usage_scope():
+        """Attribute this request's provider usage to its endpoint (see ledger.py)."""
+        set_usage_scope(_route())
+    
+    @app.teardown_request
+    def clear_usage_scope(exc):
+        set_usage_scope(None)
+    
+    # ==========================================================================
+    # Admission Control
+    # ==========================================================================
+    
+    @app.before_request
+    def admit_request():
+        """
+        Shed load on the AI endpoints (see admission.py).
+        
+        Runs after start_deadline, so queueing for a slot counts against
+        the request deadline.
+        """
+        route = _route()
+        if request.method == "OPTIONS" or route not in GATED_ROUTES:
+            return None
+        
+        admission = get_admission_controller()
+        if admission is None:
+            return None
+        
+        rejection = admission.admit_client(_client_id())
+        if rejection is None:
+            rejection = admission.enter(route)
+        if rejection is not None:
+            return jsonify(rejection.body()), rejection.status, rejection.headers()
+        g.admission = (admission, route)
+        return None
+    
+    @app.teardown_request
+    def release_admission(exc):
+        admitted = g.pop("admission", None)
+        if admitted is not None:
+            admission, route = admitted
+            admission.leave(route)
+    
     # ==========================================================================
     # Health Check Endpoint
     # ==========================================================================
@@ -41,17 +152,42 @@ def create_app() -> Flask:
     @app.route("/health", methods=["GET"])
     def health_check():
         """Health check endpoint."""
-        return jsonify({
-            "status": "healthy",
-            "service": "ai-assistant",
-            "provider": config.active_provider,
-            "model": config.active_model,
-            "has_api_key": config.has_api_key(),
-            "demo_mode": config.demo_mode,
-        })
+        return jsonify(health_report(get_admission_controller()))
+    
+    # ==========================================================================
+    # Usage Endpoint
+    # ==========================================================================
+    
+    @app.route("/usage", methods=["GET"])
+    def get_usage():
+        """
+        Token and latency usage by endpoint, provider, model and topic.
+        
+        Topics are what students typed, so like /admin/reload this requires
+        the X-Admin-Token header and doesn't exist (404) without a token.
+        
+        Query parameters (all optional):
+            window: Seconds back from now (default 3600), or since/until
+                as Unix times
+            group_by: Comma-separated fields of time, endpoint, provider,
+                model, topic (default endpoint,model,topic)
+            endpoint, provider, model, topic: Keep only matching rows
+            limit: Most rows to return (default 50)
+        
+        Response:
+            {
+                "window": {"since": ..., "until": ..., "bucket_seconds": 60},
+                "group_by": ["endpoint", "model", "topic"],
+                "totals": {"calls": ..., "total_tokens": ..., ...},
+                "rows": [{"endpoint": "/mentor", "topic": "recursion", ...}, ...]
+            }
+        """
+        check_admin(request.headers.get("X-Admin-Token"))
+        body, status = usage_report(request.args)
+        return jsonify(body), status
     
     # ==========================================================================
-    # Configuration Endpoint
+    # Configuration Endpoints
     # ==========================================================================
     
     @app.route("/config", methods=["GET"])
@@ -59,8 +195,26 @@ def create_app() -> Flask:
         """Get current configuration (without sensitive data)."""
         return jsonify(config.to_dict())
     
+    @app.route("/admin/reload", methods=["POST"])
+    def reload_config():
+        """
+        Re-read .env and swap in a new configuration snapshot.
+        
+        Requires the X-Admin-Token header to match ADMIN_RELOAD_TOKEN. The
+        endpoint doesn't exist (404) unless a token is configured.
+        
+        Response:
+            {
+                "reloaded": true,
+                "changed": ["active_provider", ...],
+                "config": { ... }
+            }
+        """
+        check_admin(request.headers.get("X-Admin-Token"))
+        return jsonify(reload_report())
+    
     # ==========================================================================
-    # Mentor Mode Endpoint
+    # Mentor Mode Endpoints
     # ==========================================================================
     
     @app.route("/mentor", methods=["POST"])
@@ -74,61 +228,117 @@ def create_app() -> Flask:
                 "topic": "Python"
             }
             
+            or, with a server-side session (see sessions.MentorTurn):
+            {
+                "session_id": "...",   # omit to start a new session
+                "message": "...",
+                "topic": "Python"      # only used when starting
+            }
+        
         Response:
             {
                 "response": "AI mentor response...",
-                "provider": "gemini"
+                "provider": "gemini",
+                "session_id": "..."    # session requests only
             }
         """
+        data = turn = None
         try:
-            print(f"[MENTOR] Received POST request")
-            sys.stdout.flush()  # Force flush output
-            data = request.get_json()
-            
-            if not data:
-                return jsonify({"error": "Request body is required"}), 400
-            
-            messages = data.get("messages", [])
-            topic = data.get("topic", "General")
-            
-            if not messages:
-                return jsonify({"error": "Messages array is required"}), 400
+            with span("validate"):
+                data = request.get_json()
+                turn = mentor_turn(data)
+            set_usage_topic(turn.topic)
             
             # Check if demo mode or no API key
-            if config.demo_mode or not config.has_api_key():
-                response = get_mentor_demo_response(messages, topic)
-                return jsonify({
-                    "response": response,
-                    "provider": "demo",
-                    "demo_mode": True
-                })
+            if use_demo():
+                response = mentor_demo(turn.messages, turn.topic)
+                turn.record(response)
+                return jsonify({"response": response, **DEMO_FIELDS, **turn.response_fields()})
             
             # Get AI client and generate response
-            print(f"[MENTOR] Getting AI client...")
-            client = _get_ai_client()
-            print(f"[MENTOR] Client: {client}")
+            client = get_client()
             
-            response = client.chat(messages, topic)
-            print(f"[MENTOR] Response received")
+            hit = mentor_cache_lookup(turn, client)
+            if hit is not None:
+                cached, fields = hit
+                turn.record(cached)
+                return jsonify({
+                    "response": cached,
+                    **fields,
+                    "cached": True,
+                    **turn.response_fields(),
+                })
             
-            return jsonify({
-                "response": response,
-                "provider": config.active_provider,
-                "model": client.model,
-            })
+            response = client.chat(turn.messages, turn.topic)
+            mentor_cache_store(turn, client, response)
+            turn.record(response)
+            answered = answer_fields(client)
+            log.debug("Mentor response received", extra={"fields": answered})
             
+            return jsonify({"response": response, **answered, **turn.response_fields()})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
         except Exception as e:
             # Fall back to demo mode on error
-            response = get_mentor_demo_response(
-                data.get("messages", []) if data else [],
-                data.get("topic", "General") if data else "General"
-            )
-            return jsonify({
-                "response": response,
-                "provider": "demo",
-                "error": str(e),
-                "fallback": True
+            return jsonify(mentor_fallback(e, data, turn))
+    
+    @app.route("/mentor/stream", methods=["POST"])
+    def mentor_chat_stream():
+        """
+        Streaming Mentor Mode chat endpoint (server-sent events).
+        
+        Request body: same as /mentor (either protocol).
+        
+        Response (text/event-stream):
+            data: {"token": "partial text"}
+            ...
+            event: done
+            data: {"provider": "gemini", "model": "...", "session_id": "..."}
+        
+        With a session, the reply is recorded once the stream completes.
+        """
+        with span("validate"):
+            turn = mentor_turn(request.get_json(silent=True))
+        set_usage_topic(turn.topic)
+        
+        # Check if demo mode or no API key
+        if use_demo():
+            return _sse_response(turn.record_stream(iter([mentor_demo(turn.messages, turn.topic)])), {
+                **DEMO_FIELDS,
+                **turn.response_fields(),
             })
+        
+        try:
+            client = get_client()
+        except Exception as e:
+            # Fall back to demo mode on error
+            response, done = mentor_stream_fallback(e, turn)
+            return _sse_response(iter([response]), done)
+        
+        return _sse_response(turn.record_stream(client.stream_chat(turn.messages, turn.topic)), {
+            **provider_fields(client),
+            **turn.response_fields(),
+        })
+    
+    @app.route("/mentor/session/<session_id>", methods=["GET"])
+    def get_mentor_session(session_id):
+        """
+        Get a Mentor session's history (e.g. to restore the chat after a reload).
+        
+        Response:
+            {
+                "session_id": "...",
+                "topic": "Python",
+                "messages": [{"role": "user", "content": "..."}, ...]
+            }
+        """
+        return jsonify(session_body(session_id))
+    
+    @app.route("/mentor/session/<session_id>", methods=["DELETE"])
+    def delete_mentor_session(session_id):
+        """End a Mentor session and discard its history."""
+        return jsonify(delete_session(session_id))
     
     # ==========================================================================
     # Concept Mirror Mode Endpoint
@@ -144,7 +354,7 @@ def create_app() -> Flask:
                 "concept": "Binary Search",
                 "explanation": "User's explanation of the concept..."
             }
-            
+        
         Response:
             {
                 "understood": [...],
@@ -154,57 +364,109 @@ def create_app() -> Flask:
                 "summary": "..."
             }
         """
+        data = None
         try:
-            data = request.get_json()
-            
-            if not data:
-                return jsonify({"error": "Request body is required"}), 400
-            
-            concept_name = data.get("concept", "")
-            explanation = data.get("explanation", "")
-            
-            if not concept_name:
-                return jsonify({"error": "Concept name is required"}), 400
-            
-            if not explanation or len(explanation) < 20:
-                return jsonify({
-                    "error": "Explanation must be at least 20 characters"
-                }), 400
+            with span("validate"):
+                data = request.get_json()
+                concept_name, explanation = concept_input(json_body(data))
             
             # Check if demo mode or no API key
-            if config.demo_mode or not config.has_api_key():
-                result = get_concept_mirror_demo_response(concept_name, explanation)
-                return jsonify({
-                    **result,
-                    "provider": "demo",
-                    "demo_mode": True
-                })
+            if use_demo():
+                return jsonify(concept_demo(concept_name, explanation))
             
             # Get AI client and analyze
-            print(f"[ANALYZE] Getting AI client...")
-            client = _get_ai_client()
+            client = get_client()
             
+            set_usage_topic(concept_name)
             result = client.analyze_concept(concept_name, explanation)
-            print(f"[ANALYZE] Result received")
-            
-            return jsonify({
-                **result,
-                "provider": config.active_provider,
-                "model": client.model,
-            })
+            answered = answer_fields(client)
+            log.debug("Concept analysis received", extra={"fields": answered})
             
+            return jsonify({**result, **answered})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
         except Exception as e:
             # Fall back to demo mode on error
-            result = get_concept_mirror_demo_response(
-                data.get("concept", "") if data else "",
-                data.get("explanation", "") if data else ""
-            )
-            return jsonify({
-                **result,
-                "provider": "demo",
-                "error": str(e),
-                "fallback": True
-            })
+            return jsonify(analyze_fallback(e, data))
+    
+    @app.route("/analyze/batch", methods=["POST"])
+    def analyze_concept_batch():
+        """
+        Batch Concept Mirror analysis endpoint.
+        
+        Items are analyzed concurrently (up to BATCH_CONCURRENCY at a time)
+        with the same validation and demo fallback as /analyze.
+        
+        Request body:
+            {
+                "items": [
+                    {"concept": "Binary Search", "explanation": "..."},
+                    ...
+                ]
+            }
+        
+        Response (results are in request order):
+            {
+                "results": [
+                    {"understood": [...], ..., "provider": "gemini"},
+                    {"error": "Explanation must be at least 20 characters"},
+                    ...
+                ],
+                "count": 2
+            }
+        """
+        items = batch_items(request.get_json(silent=True))
+        
+        # Check if demo mode or no API key
+        demo = use_demo()
+        client = None
+        client_error = None
+        
+        if not demo:
+            try:
+                client = get_client()
+            except Exception as e:
+                client_error = str(e)
+        
+        route = _route()
+        
+        def analyze_item(item) -> dict:
+            try:
+                concept_name, explanation = concept_input(item)
+            except RequestError as e:
+                return e.body()
+            
+            if demo:
+                return concept_demo(concept_name, explanation)
+            
+            try:
+                if client is None:
+                    raise Exception(client_error)
+                set_usage_topic(concept_name)
+                result = client.analyze_concept(concept_name, explanation)
+                return {**result, **answer_fields(client)}
+            except Exception as e:
+                # Fall back to demo mode on error (per item)
+                return batch_item_failure(e, concept_name, explanation, route)
+        
+        if client is None:
+            # Demo analysis is local and fast; no need for worker threads
+            results = [analyze_item(item) for item in items]
+        else:
+            workers = min(config.batch_concurrency, len(items))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Each item runs in a copy of this request's context (deadline, trace)
+                futures = [
+                    pool.submit(contextvars.copy_context().run, analyze_item, item)
+                    for item in items
+                ]
+                results = [future.result() for future in futures]
+        
+        return jsonify({
+            "results": results,
+            "count": len(results),
+        })
     
     # ==========================================================================
     # Simple Response Endpoint
@@ -219,7 +481,7 @@ def create_app() -> Flask:
             {
                 "prompt": "Explain DSA in simple terms"
             }
-            
+        
         Response:
             {
                 "response": "Generated text...",
@@ -227,42 +489,56 @@ def create_app() -> Flask:
             }
         """
         try:
-            data = request.get_json()
-            
-            if not data:
-                return jsonify({"error": "Request body is required"}), 400
-            
-            prompt = data.get("prompt", "")
-            
-            if not prompt:
-                return jsonify({"error": "Prompt is required"}), 400
+            with span("validate"):
+                prompt = prompt_input(request.get_json())
             
             # Check if demo mode or no API key
-            if config.demo_mode or not config.has_api_key():
-                return jsonify({
-                    "response": f"Demo response for: {prompt[:50]}...",
-                    "provider": "demo",
-                    "demo_mode": True
-                })
+            if use_demo():
+                return jsonify({"response": generate_demo(prompt), **DEMO_FIELDS})
             
             # Get AI client and generate
-            print(f"[GENERATE] Getting AI client...")
-            client = _get_ai_client()
+            client = get_client()
             
             response = client.generate_response(prompt)
-            print(f"[GENERATE] Response received")
-            
-            return jsonify({
-                "response": response,
-                "provider": config.active_provider,
-                "model": client.model,
-            })
+            answered = answer_fields(client)
+            log.debug("Generate response received", extra={"fields": answered})
             
+            return jsonify({"response": response, **answered})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
+        except Exception as e:
+            return jsonify(generate_error(e)), 500
+    
+    @app.route("/generate/stream", methods=["POST"])
+    def generate_response_stream():
+        """
+        Streaming text generation endpoint (server-sent events).
+        
+        Request body: same as /generate.
+        
+        Response (text/event-stream):
+            data: {"token": "partial text"}
+            ...
+            event: done
+            data: {"provider": "gemini", "model": "..."}
+        """
+        with span("validate"):
+            prompt = prompt_input(request.get_json(silent=True))
+        
+        # Check if demo mode or no API key
+        if use_demo():
+            return _sse_response(iter([generate_demo(prompt)]), DEMO_FIELDS)
+        
+        try:
+            client = get_client()
         except Exception as e:
-            return jsonify({
-                "error": str(e),
-                "provider": "error"
-            }), 500
+            return jsonify(generate_error(e)), 500
+        
+        return _sse_response(client.stream_response(prompt), provider_fields(client))
+    
+    # Load the provider SDK now rather than on the first request (see preload.py)
+    preload_provider()
     
     return app
 
@@ -284,6 +560,9 @@ def run_server(
         port: Server port (default from config).
         debug: Debug mode (default from config).
     """
+    # `kill -HUP <pid>` reloads the configuration
+    config.install_reload_signal()
+    
     app = create_app()
     
     app.run(
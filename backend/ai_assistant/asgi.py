@@ -0,0 +1,490 @@
+"""
+ASGI REST API for AI Assistant.
+
+Async twin of api.py built on Quart (Flask's async sibling). It exposes the
+same endpoints with the same request/response contracts, but awaits the
+providers' async methods (achat, aanalyze_concept, agenerate_response) so an
+in-flight LLM call does not pin a worker thread.
+
+Run with any ASGI server, e.g.:
+    hypercorn asgi:app --bind 127.0.0.1:5050
+    uvicorn asgi:app --port 5050
+"""
+
+from typing import Optional
+import asyncio
+
+from quart import Quart, Response, g, request, jsonify
+from quart_cors import cors
+
+from config import config
+from admission import GATED_ROUTES, AdmittedStream, get_admission_controller
+from deadlines import (
+    DEADLINE_HEADER, DeadlineExceeded, afirst_chunk_deadline,
+    record_deadline_exceeded, request_deadline, set_deadline,
+)
+from handlers import (
+    DEMO_FIELDS, adelete_session, amentor_turn, analyze_fallback, answer_fields,
+    asession_body, batch_item_failure, batch_items, check_admin, client_id,
+    concept_demo, concept_input, generate_demo, generate_error, get_client,
+    health_report, json_body, mentor_cache_lookup, mentor_cache_store, mentor_demo,
+    mentor_fallback, mentor_stream_fallback, prompt_input, provider_fields, reload_report,
+    RequestError, use_demo,
+)
+from ledger import akeep_usage_scope, set_usage_scope, set_usage_topic, usage_report
+from logs import get_logger
+from metrics import install_quart_metrics, TimedStream
+from preload import preload_provider
+from streaming import SSE_HEADERS, aiter_once, asse_stream
+from tracing import install_quart_tracing, span
+
+log = get_logger("asgi")
+
+
+def _route() -> Optional[str]:
+    """The matched URL rule of the current request."""
+    return request.url_rule.rule if request.url_rule is not None else None
+
+
+def _client_id() -> str:
+    """Client identity for per-client rate limits (see handlers.client_id)."""
+    return client_id(request.headers.get("X-Forwarded-For"), request.remote_addr)
+
+
+def _sse_response(chunks, done: dict) -> Response:
+    """
+    Wrap an async chunk iterator in a streaming text/event-stream response.
+    
+    The request's metrics timer and admission slot move to the body and
+    end with the stream (see metrics.TimedStream, admission.AdmittedStream).
+    """
+    body = asse_stream(afirst_chunk_deadline(akeep_usage_scope(chunks), _route()), done)
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        body = TimedStream(body, _route(), request.method, started)
+    admitted = g.pop("admission", None)
+    if admitted is not None:
+        body = AdmittedStream(body, *admitted)
+    
+    response = Response(body, mimetype="text/event-stream", headers=SSE_HEADERS)
+    # Stream for as long as the upstream keeps producing
+    response.timeout = None
+    return response
+
+
+def create_asgi_app() -> Quart:
+    """Create and configure the Quart (ASGI) application."""
+    app = Quart(__name__)
+    
+    # Same CORS policy as the Flask app
+    app = cors(app, allow_origin=["http://localhost:5173", "http://127.0.0.1:5173", "*"])
+    
+    # Pick up .env edits without a restart (no-op unless ENV_WATCH_INTERVAL is set)
+    config.start_env_watcher()
+    
+    # Request metrics and /metrics (registered first so every request is timed)
+    install_quart_metrics(app)
+    
+    # Request traces and Server-Timing (before the deadline/admission hooks,
+    # so admission queueing shows up in the total)
+    install_quart_tracing(app)
+    
+    # ==========================================================================
+    # Request Deadlines
+    # ==========================================================================
+    
+    @app.before_request
+    async def start_deadline():
+        """Give the request its deadline (see deadlines.py)."""
+        set_deadline(request_deadline(_route(), request.headers.get(DEADLINE_HEADER)))
+    
+    @app.teardown_request
+    async def clear_deadline(exc):
+        set_deadline(None)
+    
+    @app.errorhandler(DeadlineExceeded)
+    async def deadline_exceeded(e):
+        record_deadline_exceeded(_route())
+        return jsonify({"error": str(e), "outcome": "deadline_exceeded"}), 504
+    
+    @app.errorhandler(RequestError)
+    async def request_error(e):
+        return jsonify(e.body()), e.status
+    
+    # ==========================================================================
+    # Usage Ledger
+    # ==========================================================================
+    
+    @app.before_request
+    async def start_usage_scope():
+        """Attribute this request's provider usage to its endpoint (see ledger.py)."""
+        set_usage_scope(_route())
+    
+    @app.teardown_request
+    async def clear_usage_scope(exc):
+        set_usage_scope(None)
+    
+    # ==========================================================================
+    # Admission Control
+    # ==========================================================================
+    
+    @app.before_request
+    async def admit_request():
+        """
+        Shed load on the AI endpoints (see admission.py).
+        
+        Runs after start_deadline, so queueing for a slot counts against
+        the request deadline.
+        
+        Streams hold their slot until the stream ends (see _sse_response);
+        other requests release it at teardown.
+        """
+        route = _route()
+        if request.method == "OPTIONS" or route not in GATED_ROUTES:
+            return None
+        
+        admission = get_admission_controller(asynchronous=True)
+        if admission is None:
+            return None
+        
+        rejection = admission.admit_client(_client_id())
+        if rejection is None:
+            rejection = await admission.aenter(route)
+        if rejection is not None:
+            return jsonify(rejection.body()), rejection.status, rejection.headers()
+        g.admission = (admission, route)
+        return None
+    
+    @app.teardown_request
+    async def release_admission(exc):
+        admitted = g.pop("admission", None)
+        if admitted is not None:
+            admission, route = admitted
+            admission.leave(route)
+    
+    # ==========================================================================
+    # Health Check Endpoint
+    # ==========================================================================
+    
+    @app.route("/", methods=["GET"])
+    @app.route("/health", methods=["GET"])
+    async def health_check():
+        """Health check endpoint."""
+        return jsonify(health_report(get_admission_controller(asynchronous=True)))
+    
+    # ==========================================================================
+    # Usage Endpoint
+    # ==========================================================================
+    
+    @app.route("/usage", methods=["GET"])
+    async def get_usage():
+        """
+        Token and latency usage by endpoint, provider, model and topic.
+        
+        Topics are what students typed, so like /admin/reload this requires
+        the X-Admin-Token header and doesn't exist (404) without a token.
+        
+        Query parameters (all optional):
+            window: Seconds back from now (default 3600), or since/until
+                as Unix times
+            group_by: Comma-separated fields of time, endpoint, provider,
+                model, topic (default endpoint,model,topic)
+            endpoint, provider, model, topic: Keep only matching rows
+            limit: Most rows to return (default 50)
+        
+        Response:
+            {
+                "window": {"since": ..., "until": ..., "bucket_seconds": 60},
+                "group_by": ["endpoint", "model", "topic"],
+                "totals": {"calls": ..., "total_tokens": ..., ...},
+                "rows": [{"endpoint": "/mentor", "topic": "recursion", ...}, ...]
+            }
+        """
+        check_admin(request.headers.get("X-Admin-Token"))
+        body, status = usage_report(request.args)
+        return jsonify(body), status
+    
+    # ==========================================================================
+    # Configuration Endpoints
+    # ==========================================================================
+    
+    @app.route("/config", methods=["GET"])
+    async def get_config():
+        """Get current configuration (without sensitive data)."""
+        return jsonify(config.to_dict())
+    
+    @app.route("/admin/reload", methods=["POST"])
+    async def reload_config():
+        """
+        Re-read .env and swap in a new configuration snapshot.
+        
+        Requires the X-Admin-Token header to match ADMIN_RELOAD_TOKEN. The
+        endpoint doesn't exist (404) unless a token is configured.
+        
+        Response:
+            {
+                "reloaded": true,
+                "changed": ["active_provider", ...],
+                "config": { ... }
+            }
+        """
+        check_admin(request.headers.get("X-Admin-Token"))
+        return jsonify(reload_report())
+    
+    # ==========================================================================
+    # Mentor Mode Endpoints
+    # ==========================================================================
+    
+    @app.route("/mentor", methods=["POST"])
+    async def mentor_chat():
+        """Mentor Mode chat endpoint. See api.mentor_chat for the contract."""
+        data = turn = None
+        try:
+            with span("validate"):
+                data = await request.get_json()
+                turn = await amentor_turn(data)
+            set_usage_topic(turn.topic)
+            
+            # Check if demo mode or no API key
+            if use_demo():
+                response = mentor_demo(turn.messages, turn.topic)
+                await turn.arecord(response)
+                return jsonify({"response": response, **DEMO_FIELDS, **turn.response_fields()})
+            
+            client = get_client()
+            
+            hit = mentor_cache_lookup(turn, client)
+            if hit is not None:
+                cached, fields = hit
+                await turn.arecord(cached)
+                return jsonify({
+                    "response": cached,
+                    **fields,
+                    "cached": True,
+                    **turn.response_fields(),
+                })
+            
+            response = await client.achat(turn.messages, turn.topic)
+            mentor_cache_store(turn, client, response)
+            await turn.arecord(response)
+            answered = answer_fields(client)
+            log.debug("Mentor response received", extra={"fields": answered})
+            
+            return jsonify({"response": response, **answered, **turn.response_fields()})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
+        except Exception as e:
+            # Fall back to demo mode on error
+            return jsonify(mentor_fallback(e, data, turn))
+    
+    @app.route("/mentor/stream", methods=["POST"])
+    async def mentor_chat_stream():
+        """Streaming Mentor Mode endpoint. See api.mentor_chat_stream."""
+        with span("validate"):
+            turn = await amentor_turn(await request.get_json(silent=True))
+        set_usage_topic(turn.topic)
+        
+        # Check if demo mode or no API key
+        if use_demo():
+            return _sse_response(turn.arecord_stream(aiter_once(mentor_demo(turn.messages, turn.topic))), {
+                **DEMO_FIELDS,
+                **turn.response_fields(),
+            })
+        
+        try:
+            client = get_client()
+        except Exception as e:
+            # Fall back to demo mode on error
+            response, done = mentor_stream_fallback(e, turn)
+            return _sse_response(aiter_once(response), done)
+        
+        return _sse_response(turn.arecord_stream(client.astream_chat(turn.messages, turn.topic)), {
+            **provider_fields(client),
+            **turn.response_fields(),
+        })
+    
+    @app.route("/mentor/session/<session_id>", methods=["GET"])
+    async def get_mentor_session(session_id):
+        """Get a Mentor session's history. See api.get_mentor_session."""
+        return jsonify(await asession_body(session_id))
+    
+    @app.route("/mentor/session/<session_id>", methods=["DELETE"])
+    async def delete_mentor_session(session_id):
+        """End a Mentor session and discard its history."""
+        return jsonify(await adelete_session(session_id))
+    
+    # ==========================================================================
+    # Concept Mirror Mode Endpoint
+    # ==========================================================================
+    
+    @app.route("/analyze", methods=["POST"])
+    async def analyze_concept():
+        """Concept Mirror analysis endpoint. See api.analyze_concept."""
+        data = None
+        try:
+            with span("validate"):
+                data = await request.get_json()
+                concept_name, explanation = concept_input(json_body(data))
+            
+            # Check if demo mode or no API key
+            if use_demo():
+                return jsonify(concept_demo(concept_name, explanation))
+            
+            client = get_client()
+            set_usage_topic(concept_name)
+            result = await client.aanalyze_concept(concept_name, explanation)
+            answered = answer_fields(client)
+            log.debug("Concept analysis received", extra={"fields": answered})
+            
+            return jsonify({**result, **answered})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
+        except Exception as e:
+            # Fall back to demo mode on error
+            return jsonify(analyze_fallback(e, data))
+    
+    @app.route("/analyze/batch", methods=["POST"])
+    async def analyze_concept_batch():
+        """Batch Concept Mirror endpoint. See api.analyze_concept_batch."""
+        items = batch_items(await request.get_json(silent=True))
+        
+        # Check if demo mode or no API key
+        demo = use_demo()
+        client = None
+        client_error = None
+        
+        if not demo:
+            try:
+                client = get_client()
+            except Exception as e:
+                client_error = str(e)
+        
+        semaphore = asyncio.Semaphore(config.batch_concurrency)
+        route = _route()
+        
+        async def analyze_item(item) -> dict:
+            try:
+                concept_name, explanation = concept_input(item)
+            except RequestError as e:
+                return e.body()
+            
+            if demo:
+                return concept_demo(concept_name, explanation)
+            
+            try:
+                if client is None:
+                    raise Exception(client_error)
+                async with semaphore:
+                    set_usage_topic(concept_name)
+                    result = await client.aanalyze_concept(concept_name, explanation)
+                return {**result, **answer_fields(client)}
+            except Exception as e:
+                # Fall back to demo mode on error (per item)
+                return batch_item_failure(e, concept_name, explanation, route)
+        
+        results = await asyncio.gather(*(analyze_item(item) for item in items))
+        
+        return jsonify({
+            "results": results,
+            "count": len(results),
+        })
+    
+    # ==========================================================================
+    # Simple Response Endpoints
+    # ==========================================================================
+    
+    @app.route("/generate", methods=["POST"])
+    async def generate_response():
+        """Simple text generation endpoint. See api.generate_response."""
+        try:
+            with span("validate"):
+                prompt = prompt_input(await request.get_json())
+            
+            # Check if demo mode or no API key
+            if use_demo():
+                return jsonify({"response": generate_demo(prompt), **DEMO_FIELDS})
+            
+            client = get_client()
+            response = await client.agenerate_response(prompt)
+            answered = answer_fields(client)
+            log.debug("Generate response received", extra={"fields": answered})
+            
+            return jsonify({"response": response, **answered})
+        
+        except (DeadlineExceeded, RequestError):
+            raise
+        except Exception as e:
+            return jsonify(generate_error(e)), 500
+    
+    @app.route("/generate/stream", methods=["POST"])
+    async def generate_response_stream():
+        """Streaming text generation endpoint. See api.generate_response_stream."""
+        with span("validate"):
+            prompt = prompt_input(await request.get_json(silent=True))
+        
+        # Check if demo mode or no API key
+        if use_demo():
+            return _sse_response(aiter_once(generate_demo(prompt)), DEMO_FIELDS)
+        
+        try:
+            client = get_client()
+        except Exception as e:
+            return jsonify(generate_error(e)), 500
+        
+        return _sse_response(client.astream_response(prompt), provider_fields(client))
+    
+    # Load the provider SDK now rather than on the first request (see preload.py)
+    preload_provider()
+    
+    return app
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def run_server(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    debug: Optional[bool] = None
+):
+    """
+    Run the Quart development server.
+    
+    For production use an ASGI server such as hypercorn or uvicorn instead.
+    
+    Args:
+        host: Server host (default from config).
+        port: Server port (default from config).
+        debug: Debug mode (default from config).
+    """
+    # `kill -HUP <pid>` reloads the configuration
+    config.install_reload_signal()
+    
+    app = create_asgi_app()
+    
+    app.run(
+        host=host or config.flask_host,
+        port=port or config.flask_port,
+        debug=debug if debug is not None else config.flask_debug,
+    )
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("AI Assistant API Server (ASGI)")
+    print("=" * 60)
+    print(f"Provider: {config.active_provider}")
+    print(f"Model: {config.active_model or 'default'}")
+    print(f"API Key: {'configured' if config.has_api_key() else 'NOT configured (demo mode)'}")
+    print(f"Demo Mode: {config.demo_mode}")
+    print("=" * 60)
+    print(f"Starting server at http://{config.flask_host}:{config.flask_port}")
+    print("=" * 60)
+    
+    run_server()
+
+# Expose app for ASGI servers
+app = create_asgi_app()
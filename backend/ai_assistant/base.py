@@ -6,7 +6,44 @@ must inherit from, ensuring a consistent interface across different LLM provider
 """
 
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, Callable, Iterator, AsyncIterator, Tuple
+
+
+class FallbackText(str):
+    """
+    A demo/fallback answer returned in place of a real model response.
+    
+    Behaves exactly like a plain string (JSON encoding included), but lets
+    callers such as caches tell a degraded answer apart from a real one.
+    """
+    
+    reason: str
+    
+    def __new__(cls, text: str, reason: str = "provider_error"):
+        obj = super().__new__(cls, text)
+        obj.reason = reason
+        return obj
+
+
+class FallbackResult(dict):
+    """
+    A demo/fallback Concept Mirror analysis returned in place of a real one.
+    
+    The dict counterpart of FallbackText: serializes like a plain dict, but
+    marks the analysis as degraded.
+    """
+    
+    reason: str
+    
+    def __init__(self, result: Dict[str, Any], reason: str = "provider_error"):
+        super().__init__(result)
+        self.reason = reason
+
+
+def is_fallback(result: Any) -> bool:
+    """Check whether a provider result is a demo/fallback answer."""
+    return isinstance(result, (FallbackText, FallbackResult))
 
 
 class BaseAIClient(ABC):
@@ -37,10 +74,10 @@ class BaseAIClient(ABC):
         Args:
             prompt: The input prompt/question to send to the model.
             **kwargs: Additional provider-specific parameters.
-            
+        
         Returns:
             The generated text response from the model.
-            
+        
         Raises:
             Exception: If the API call fails or returns an error.
         """
@@ -62,7 +99,7 @@ class BaseAIClient(ABC):
             context: Additional context to include (e.g., document content).
             system_prompt: System-level instructions for the model.
             **kwargs: Additional provider-specific parameters.
-            
+        
         Returns:
             The generated text response from the model.
         """
@@ -94,7 +131,7 @@ class BaseAIClient(ABC):
             topic: The topic being discussed.
             system_prompt: Optional system prompt override.
             **kwargs: Additional provider-specific parameters.
-            
+        
         Returns:
             The assistant's response text.
         """
@@ -114,12 +151,264 @@ class BaseAIClient(ABC):
             concept_name: Name of the concept being explained.
             user_explanation: The user's explanation text.
             **kwargs: Additional provider-specific parameters.
-            
+        
         Returns:
             Dictionary with keys: understood, missing, incorrect, assumptions, summary.
         """
         pass
     
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Stream a response from the AI model chunk by chunk.
+        
+        Providers with native token streaming override this. The default
+        implementation yields the full generate_response() result at once.
+        
+        Args:
+            prompt: The input prompt/question to send to the model.
+            **kwargs: Additional provider-specific parameters.
+        
+        Yields:
+            Text chunks of the generated response, in order.
+        """
+        yield self.generate_response(prompt, **kwargs)
+    
+    def stream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a multi-turn chat response (Mentor Mode) chunk by chunk.
+        
+        Providers with native token streaming override this. The default
+        implementation yields the full chat() result at once.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys.
+            topic: The topic being discussed.
+            system_prompt: Optional system prompt override.
+            **kwargs: Additional provider-specific parameters.
+        
+        Yields:
+            Text chunks of the assistant's response, in order.
+        """
+        yield self.chat(messages, topic, system_prompt, **kwargs)
+    
+    # ==========================================================================
+    # Async Interface
+    # ==========================================================================
+    #
+    # Async counterparts of the methods above, used by the ASGI app. Providers
+    # with an async SDK override these so no thread is held while waiting on
+    # the upstream. The defaults run the sync method in a worker thread.
+    
+    @staticmethod
+    async def _to_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+        # Imported here: only the ASGI app needs asyncio, and the Flask app's
+        # cold start shouldn't pay for it
+        import asyncio
+        return await asyncio.to_thread(func, *args, **kwargs)
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        """Async version of generate_response()."""
+        return await self._to_thread(self.generate_response, prompt, **kwargs)
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Async version of chat()."""
+        return await self._to_thread(
+            self.chat, messages, topic, system_prompt, **kwargs
+        )
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async version of analyze_concept()."""
+        return await self._to_thread(
+            self.analyze_concept, concept_name, user_explanation, **kwargs
+        )
+    
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async version of stream_response(). Defaults to a single chunk."""
+        yield await self.agenerate_response(prompt, **kwargs)
+    
+    async def astream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Async version of stream_chat(). Defaults to a single chunk."""
+        yield await self.achat(messages, topic, system_prompt, **kwargs)
+    
     def __repr__(self) -> str:
         """String representation of the client."""
         return f"{self.__class__.__name__}(model={self.model})"
+
+
+
+class DelegatingClient(BaseAIClient):
+    """
+    Base class for wrappers that add behavior around another client.
+    
+    Every BaseAIClient method is forwarded to the wrapped client, so a
+    subclass only overrides the methods it changes. Wrappers can be stacked.
+    """
+    
+    def __init__(self, inner: BaseAIClient):
+        """
+        Wrap a client.
+        
+        Args:
+            inner: The client that actually talks to the provider.
+        """
+        self._inner = inner
+    
+    @property
+    def inner(self) -> BaseAIClient:
+        """The wrapped client."""
+        return self._inner
+    
+    @property
+    def api_key(self) -> Optional[str]:
+        return self._inner.api_key
+    
+    @property
+    def model(self) -> Optional[str]:
+        return self._inner.model
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        return self._inner.generate_response(prompt, **kwargs)
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._inner.generate_response_with_context(
+            prompt, context, system_prompt, **kwargs
+        )
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        return self._inner.get_model_info()
+    
+    def chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._inner.chat(messages, topic, system_prompt, **kwargs)
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return self._inner.analyze_concept(concept_name, user_explanation, **kwargs)
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        return self._inner.stream_response(prompt, **kwargs)
+    
+    def stream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        return self._inner.stream_chat(messages, topic, system_prompt, **kwargs)
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        return await self._inner.agenerate_response(prompt, **kwargs)
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return await self._inner.achat(messages, topic, system_prompt, **kwargs)
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return await self._inner.aanalyze_concept(concept_name, user_explanation, **kwargs)
+    
+    def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self._inner.astream_response(prompt, **kwargs)
+    
+    def astream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        return self._inner.astream_chat(messages, topic, system_prompt, **kwargs)
+    
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._inner!r})"
+
+
+# =============================================================================
+# Answer Attribution
+# =============================================================================
+#
+# Wrappers that can route a call to another client (hedging, breaker
+# failover) note which one answered, so responses, caches and logs name the
+# provider that actually produced the answer. The note is per context (one
+# request, or one batch item) and only describes the last call made through
+# the wrapper that set it.
+
+_answered_by: ContextVar[Optional[Tuple[BaseAIClient, str, Optional[str]]]] = ContextVar(
+    "answered_by", default=None
+)
+
+
+def record_answer(via: BaseAIClient, answered: Optional[BaseAIClient]) -> None:
+    """
+    Note that the last call on `via` was answered by `answered`.
+    
+    Pass None when `via`'s own (primary) client answered.
+    """
+    if answered is None:
+        _answered_by.set(None)
+        return
+    provider = answered.get_model_info().get("provider")
+    _answered_by.set((via, provider, answered.model))
+
+
+def answered_by(client: BaseAIClient, provider: str) -> Tuple[str, Optional[str]]:
+    """
+    (provider, model) that answered the last call on `client` in this context.
+    
+    Args:
+        client: The client the call was made on.
+        provider: The client's own provider, reported unless a wrapper
+            recorded another answer.
+    """
+    entry = _answered_by.get()
+    if entry is not None and entry[0] is client:
+        return entry[1], entry[2]
+    return provider, client.model
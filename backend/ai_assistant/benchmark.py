@@ -0,0 +1,370 @@
+"""
+In-process HTTP load benchmark for the AI Assistant API.
+
+Drives the Flask app from api.create_app() through its WSGI test client, so
+every request goes through the real hooks (deadlines, admission, tracing,
+metrics) and the real client wrappers (metrics, coalescing, breaker). The provider is
+the fake one (fake_provider/), which simulates upstream latency instead of
+calling Gemini/Groq, so a run is offline and, with a seed, repeatable.
+
+Each scenario is a weighted mix of /mentor, /analyze, /generate and
+/health requests, run closed-loop at one or more concurrency levels. For
+each run the throughput, latency percentiles and memory use are reported
+and written as JSON, so runs can be compared across changes:
+
+    python benchmark.py --output before.json
+    ... make a change ...
+    python benchmark.py --output after.json --compare before.json
+
+With --compare, the exit status is 1 when any run's p95 latency or
+throughput is worse than the baseline by more than --max-regression
+percent.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+
+# Scenarios: endpoint -> weight
+SCENARIOS: Dict[str, Dict[str, int]] = {
+    "health": {"/health": 1},
+    "mentor": {"/mentor": 1},
+    "analyze": {"/analyze": 1},
+    "generate": {"/generate": 1},
+    "mixed": {"/mentor": 40, "/analyze": 30, "/generate": 20, "/health": 10},
+}
+
+
+def _configure_environment(args: argparse.Namespace) -> None:
+    """
+    Settings for a benchmark run; must happen before the app is imported.
+    
+    The fake provider needs no key, so requests reach it with demo mode
+    off; it is seeded from --seed. Caches and sessions stay in memory, so
+    runs don't share them. All requests come from one address, so the
+    per-client rate limit is off unless asked for; the in-flight caps stay on.
+    """
+    os.environ["ACTIVE_PROVIDER"] = "fake"
+    os.environ["ACTIVE_MODEL"] = ""
+    os.environ["FAKE_TTFT_MS"] = str(args.latency_ms)
+    os.environ["FAKE_TTFT_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["FAKE_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_SEED"] = str(args.seed)
+    os.environ["DEMO_MODE"] = "False"
+    os.environ["ENV_WATCH_INTERVAL"] = "0"
+    # In-memory caches and sessions: every run numbers its requests from 0,
+    # so a shared file would serve one run from the previous run's answers
+    os.environ["CONCEPT_CACHE_PATH"] = ""
+    os.environ["SESSION_STORE_PATH"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.client_rate_limit:
+        os.environ["ADMISSION_CLIENT_RPM"] = "0"
+    for setting in args.env:
+        name, _, value = setting.partition("=")
+        os.environ[name] = value
+
+
+# =============================================================================
+# LOAD GENERATION
+# =============================================================================
+
+def _request_for(route: str, n: int) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """
+    (method, path, JSON body) of request number `n` to `route`.
+    
+    Bodies differ per request so caches and request coalescing don't turn
+    the benchmark into a cache benchmark.
+    """
+    if route == "/mentor":
+        return "POST", route, {
+            "messages": [{"role": "user", "content": f"Question {n}: how does recursion work?"}],
+            "topic": "Python",
+        }
+    if route == "/analyze":
+        return "POST", route, {
+            "concept": "Binary Search",
+            "explanation": f"Attempt {n}: split the sorted list in half and keep the half "
+                           f"that can still contain the target.",
+        }
+    if route == "/generate":
+        return "POST", route, {"prompt": f"Prompt {n}: explain Big-O notation briefly"}
+    return "GET", route, None
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = min(max(int(round(fraction * len(values) + 0.5)) - 1, 0), len(values) - 1)
+    return values[index]
+
+
+def _rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def run_scenario(
+    app,
+    name: str,
+    mix: Dict[str, int],
+    concurrency: int,
+    total_requests: int,
+    seed: int,
+    trace_memory: bool,
+    first_number: int = 0,
+) -> Dict[str, Any]:
+    """
+    Send `total_requests` requests from `concurrency` workers; return the stats.
+    
+    Requests are numbered from `first_number`; give every run its own range
+    so no run is served from a cache warmed by an earlier one.
+    """
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    rng = random.Random(seed)
+    plan = rng.choices(routes, weights=weights, k=total_requests)
+    
+    next_index = iter(range(total_requests))
+    index_lock = threading.Lock()
+    samples: List[Tuple[str, int, float]] = []
+    samples_lock = threading.Lock()
+    
+    def worker() -> None:
+        client = app.test_client()
+        local: List[Tuple[str, int, float]] = []
+        while True:
+            with index_lock:
+                n = next(next_index, None)
+            if n is None:
+                break
+            method, path, body = _request_for(plan[n], first_number + n)
+            started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            elapsed = time.perf_counter() - started
+            local.append((plan[n], response.status_code, elapsed))
+        with samples_lock:
+            samples.extend(local)
+    
+    rss_before = _rss_mb()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    alloc_peak = None
+    if trace_memory:
+        alloc_peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    
+    latencies = sorted(elapsed for _, _, elapsed in samples)
+    statuses: Dict[str, int] = {}
+    per_route: Dict[str, List[float]] = {}
+    for route, status, elapsed in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        per_route.setdefault(route, []).append(elapsed)
+    
+    def summary(values: List[float]) -> Dict[str, float]:
+        values = sorted(values)
+        return {
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+            "mean_ms": round(statistics.fmean(values) * 1000, 2) if values else 0.0,
+        }
+    
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status >= 400),
+        "statuses": statuses,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall > 0 else 0.0,
+        "latency": summary(latencies),
+        "routes": {route: {"requests": len(values), **summary(values)} for route, values in per_route.items()},
+        "memory": {
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+            "alloc_peak_mb": round(alloc_peak, 2) if alloc_peak is not None else None,
+        },
+    }
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    latency = result["latency"]
+    print(
+        f"{result['scenario']:<10} c={result['concurrency']:<4} "
+        f"{result['throughput_rps']:>9.1f} req/s  "
+        f"p50 {latency['p50_ms']:>8.1f}  p95 {latency['p95_ms']:>8.1f}  p99 {latency['p99_ms']:>8.1f} ms  "
+        f"errors {result['errors']:<4} rss {result['memory']['rss_mb']:.0f} MB"
+    )
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, max_regression: float) -> bool:
+    """
+    Print the change against a baseline run.
+    
+    Returns:
+        True if no run regressed by more than `max_regression` percent.
+    """
+    with open(baseline_path) as f:
+        baseline = {
+            (run["scenario"], run["concurrency"]): run
+            for run in json.load(f)["results"]
+        }
+    
+    ok = True
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        p95_change = _change(old["latency"]["p95_ms"], result["latency"]["p95_ms"])
+        rps_change = _change(old["throughput_rps"], result["throughput_rps"])
+        regressed = p95_change > max_regression or -rps_change > max_regression
+        ok = ok and not regressed
+        print(
+            f"{result['scenario']:<10} c={result['concurrency']:<4} "
+            f"p95 {p95_change:+6.1f}%  throughput {rps_change:+6.1f}%"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def _change(old: float, new: float) -> float:
+    return (new - old) / old * 100 if old else 0.0
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="Comma-separated concurrency levels (default: 1,8,32)")
+    parser.add_argument("--requests", type=int, default=400,
+                        help="Requests per scenario and concurrency level (default: 400)")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="Unmeasured requests before each scenario (default: 20)")
+    parser.add_argument("--latency-ms", type=int, default=50,
+                        help="Fake provider time to first token (default: 50)")
+    parser.add_argument("--jitter-ms", type=int, default=10,
+                        help="Standard deviation of the time to first token (default: 10)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Fake provider token rate after the first; 0 sends all at once (default: 0)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the request mix")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record peak Python allocations (tracemalloc; slows the run)")
+    parser.add_argument("--client-rate-limit", action="store_true",
+                        help="Keep the per-client admission rate limit (ADMISSION_CLIENT_RPM) as configured")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra setting for the app under test (repeatable)")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="JSON results file (default: benchmark_results.json)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=10.0,
+                        help="Allowed p95/throughput regression in percent (default: 10)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    _configure_environment(args)
+    
+    from api import create_app
+    app = create_app()
+    
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = []
+    sent = 0
+    for name in args.scenario or list(SCENARIOS):
+        mix = SCENARIOS[name]
+        if args.warmup:
+            run_scenario(app, name, mix, min(levels), args.warmup, args.seed, False, sent)
+            sent += args.warmup
+        for concurrency in levels:
+            result = run_scenario(
+                app, name, mix, concurrency, args.requests, args.seed, args.trace_memory, sent
+            )
+            sent += args.requests
+            _print_result(result)
+            results.append(result)
+    
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "settings": {
+                "requests": args.requests,
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "tokens_per_second": args.tokens_per_second,
+                "seed": args.seed,
+                "env": args.env,
+            },
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
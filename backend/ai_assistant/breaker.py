@@ -0,0 +1,552 @@
+"""
+Per-provider circuit breakers.
+
+During an outage or a rate-limit storm every request would still wait for
+the SDK call to fail (often several seconds) before falling back to a demo
+answer. A circuit breaker per provider+model watches recent outcomes and,
+once the failure rate or the share of very slow calls crosses a threshold,
+opens: requests then skip the provider entirely and go to the secondary
+provider (if configured) or the demo path in microseconds. After a cool-down
+a few probe requests are let through (half-open); if they succeed the
+circuit closes again, otherwise it re-opens.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from base import (
+    BaseAIClient, DelegatingClient, FallbackText, FallbackResult, is_fallback, record_answer,
+)
+from config import config, ConfigSnapshot
+from deadlines import DeadlineExceeded
+from demo import get_mentor_demo_response, get_concept_mirror_demo_response
+from logs import get_logger
+from metrics import record_fallback
+
+log = get_logger("breaker")
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker over a sliding time window.
+    
+    Thread-safe. Call allow() before a request and record() after it, or
+    release() if it was cancelled before it had an outcome.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        slow_call_rate: float = 0.8,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 2
+    ):
+        """
+        Initialize the breaker.
+        
+        Args:
+            name: Label used in logs and /health (e.g. "groq:llama-3.3-70b-versatile").
+            failure_rate: Share of failed calls in the window that opens the circuit.
+            slow_call_seconds: Calls slower than this count as slow.
+            slow_call_rate: Share of slow calls in the window that opens the circuit.
+            min_calls: Calls needed in the window before rates are evaluated.
+            window_seconds: Length of the sliding window.
+            open_seconds: How long the circuit stays open before probing.
+            half_open_probes: Successful probes needed to close the circuit.
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()  # (time, failed, slow)
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._short_circuited = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+    
+    def allow(self) -> bool:
+        """Whether a request may go to the provider now."""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            
+            if self._state == CLOSED:
+                return True
+            
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            
+            self._short_circuited += 1
+            return False
+    
+    def record(self, success: bool, latency: float, timed_out: bool = False) -> None:
+        """
+        Record the outcome of a request that allow() let through.
+        
+        Args:
+            success: Whether the provider answered.
+            latency: Seconds the call took (to the first chunk for streams).
+            timed_out: The request's deadline expired during the call. Closed,
+                that only counts through its latency; a half-open probe that
+                times out or is slow fails, since a hanging provider is the
+                outage the breaker is there to catch.
+        """
+        with self._lock:
+            now = time.monotonic()
+            
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if not success or timed_out or latency >= self.slow_call_seconds:
+                    self._trip(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    log.info(f"{self.name} closed")
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            
+            if self._state == OPEN:
+                # A call admitted before the circuit opened; nothing to learn
+                return
+            
+            self._outcomes.append((now, not success, latency >= self.slow_call_seconds))
+            self._expire(now)
+            
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failed = sum(1 for _, f, _ in self._outcomes if f)
+            slow = sum(1 for _, _, s in self._outcomes if s)
+            if failed / calls >= self.failure_rate or slow / calls >= self.slow_call_rate:
+                self._trip(now)
+    
+    def release(self) -> None:
+        """Give back the probe slot of a request cancelled before its outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+    
+    def stats(self) -> Dict[str, Any]:
+        """State and window counters, for /health."""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            self._expire(now)
+            calls = len(self._outcomes)
+            failed = sum(1 for _, f, _ in self._outcomes if f)
+            slow = sum(1 for _, _, s in self._outcomes if s)
+            stats = {
+                "state": self._state,
+                "calls": calls,
+                "failure_rate": round(failed / calls, 4) if calls else 0.0,
+                "slow_call_rate": round(slow / calls, 4) if calls else 0.0,
+                "short_circuited": self._short_circuited,
+            }
+            if self._state == OPEN:
+                stats["retry_in_seconds"] = round(
+                    max(self._opened_at + self.open_seconds - now, 0.0), 1
+                )
+            return stats
+    
+    def _trip(self, now: float) -> None:
+        log.warning(f"{self.name} opened for {self.open_seconds:.0f}s")
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+    
+    def _advance(self, now: float) -> None:
+        """Move from open to half-open once the cool-down has passed."""
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+    
+    def _expire(self, now: float) -> None:
+        """Drop outcomes that fell out of the window."""
+        cutoff = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+
+# =============================================================================
+# BREAKER REGISTRY
+# =============================================================================
+
+_breakers: Dict[Tuple[str, Optional[str]], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, model: Optional[str]) -> CircuitBreaker:
+    """Get the process-wide breaker for a provider+model."""
+    key = (provider, model)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name=f"{provider}:{model}",
+                    failure_rate=config.breaker_failure_rate,
+                    slow_call_seconds=config.breaker_slow_call_ms / 1000.0,
+                    slow_call_rate=config.breaker_slow_call_rate,
+                    min_calls=config.breaker_min_calls,
+                    window_seconds=config.breaker_window_seconds,
+                    open_seconds=config.breaker_open_seconds,
+                    half_open_probes=config.breaker_half_open_probes,
+                )
+                _breakers[key] = breaker
+    return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Stats of every breaker, keyed by name."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def _is_failure(result: Any) -> bool:
+    """A provider-error fallback means the upstream call failed."""
+    return is_fallback(result) and getattr(result, "reason", "") == "provider_error"
+
+
+# =============================================================================
+# CLIENT WRAPPER
+# =============================================================================
+
+class BreakerClient(DelegatingClient):
+    """
+    Client wrapper that guards every call with a circuit breaker.
+    
+    While the circuit is open, calls go to the failover client (if any) or
+    return the same demo fallbacks the providers use on errors; methods
+    without a demo answer raise CircuitOpenError. Request/response calls
+    answered by the failover client are noted with base.record_answer().
+    """
+    
+    def __init__(
+        self,
+        inner: BaseAIClient,
+        breaker: CircuitBreaker,
+        failover: Optional[Callable[[], Optional[BaseAIClient]]] = None
+    ):
+        """
+        Initialize the wrapper.
+        
+        Args:
+            inner: The provider client.
+            breaker: The breaker for the client's provider+model.
+            failover: Returns the client to use while open (None = demo path).
+        """
+        super().__init__(inner)
+        self.breaker = breaker
+        self._failover = failover
+    
+    # ==========================================================================
+    # Sync Interface
+    # ==========================================================================
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        return self._call("generate_response", (prompt,), kwargs, self._raise_open)
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._call(
+            "generate_response_with_context", (prompt, context, system_prompt), kwargs,
+            self._raise_open
+        )
+    
+    def chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._call(
+            "chat", (messages, topic, system_prompt), kwargs,
+            lambda: _chat_fallback(messages, topic)
+        )
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return self._call(
+            "analyze_concept", (concept_name, user_explanation), kwargs,
+            lambda: _concept_fallback(concept_name, user_explanation)
+        )
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        return self._stream("stream_response", (prompt,), kwargs, self._raise_open)
+    
+    def stream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        return self._stream(
+            "stream_chat", (messages, topic, system_prompt), kwargs,
+            lambda: _chat_fallback(messages, topic)
+        )
+    
+    def _call(self, method: str, args: tuple, kwargs: dict, on_open: Callable[[], Any]) -> Any:
+        """Run a call through the breaker."""
+        if not self.breaker.allow():
+            failover = self._failover_client()
+            record_answer(self, failover)
+            if failover is not None:
+                return getattr(failover, method)(*args, **kwargs)
+            return on_open()
+        record_answer(self, None)
+        
+        started = time.monotonic()
+        try:
+            result = getattr(self._inner, method)(*args, **kwargs)
+        except DeadlineExceeded:
+            # The request ran out of time, which says little about the provider
+            # beyond its latency (unless this was a probe)
+            self.breaker.record(True, time.monotonic() - started, timed_out=True)
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        self.breaker.record(not _is_failure(result), time.monotonic() - started)
+        return result
+    
+    def _stream(
+        self,
+        method: str,
+        args: tuple,
+        kwargs: dict,
+        on_open: Callable[[], Any]
+    ) -> Iterator[str]:
+        """Run a streaming call through the breaker (latency = time to first chunk)."""
+        if not self.breaker.allow():
+            failover = self._failover_client()
+            if failover is not None:
+                yield from getattr(failover, method)(*args, **kwargs)
+            else:
+                yield on_open()
+            return
+        
+        started = time.monotonic()
+        first_chunk: Optional[float] = None
+        success = True
+        timed_out = False
+        try:
+            for chunk in getattr(self._inner, method)(*args, **kwargs):
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                    success = not _is_failure(chunk)
+                yield chunk
+        except GeneratorExit:
+            # The client went away; not the provider's fault
+            raise
+        except DeadlineExceeded:
+            timed_out = first_chunk is None
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            latency = first_chunk if first_chunk is not None else time.monotonic() - started
+            self.breaker.record(success, latency, timed_out)
+    
+    # ==========================================================================
+    # Async Interface
+    # ==========================================================================
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        return await self._acall("agenerate_response", (prompt,), kwargs, self._raise_open)
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return await self._acall(
+            "achat", (messages, topic, system_prompt), kwargs,
+            lambda: _chat_fallback(messages, topic)
+        )
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return await self._acall(
+            "aanalyze_concept", (concept_name, user_explanation), kwargs,
+            lambda: _concept_fallback(concept_name, user_explanation)
+        )
+    
+    def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self._astream("astream_response", (prompt,), kwargs, self._raise_open)
+    
+    def astream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        return self._astream(
+            "astream_chat", (messages, topic, system_prompt), kwargs,
+            lambda: _chat_fallback(messages, topic)
+        )
+    
+    async def _acall(self, method: str, args: tuple, kwargs: dict, on_open: Callable[[], Any]) -> Any:
+        """Async version of _call()."""
+        if not self.breaker.allow():
+            failover = self._failover_client()
+            record_answer(self, failover)
+            if failover is not None:
+                return await getattr(failover, method)(*args, **kwargs)
+            return on_open()
+        record_answer(self, None)
+        
+        started = time.monotonic()
+        try:
+            result = await getattr(self._inner, method)(*args, **kwargs)
+        except DeadlineExceeded:
+            # The request ran out of time, which says little about the provider
+            # beyond its latency (unless this was a probe)
+            self.breaker.record(True, time.monotonic() - started, timed_out=True)
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # Cancelled (a hedge loser, a client that went away): no outcome,
+            # but a probe must give its slot back
+            self.breaker.release()
+            raise
+        self.breaker.record(not _is_failure(result), time.monotonic() - started)
+        return result
+    
+    async def _astream(
+        self,
+        method: str,
+        args: tuple,
+        kwargs: dict,
+        on_open: Callable[[], Any]
+    ) -> AsyncIterator[str]:
+        """Async version of _stream()."""
+        if not self.breaker.allow():
+            failover = self._failover_client()
+            if failover is not None:
+                async for chunk in getattr(failover, method)(*args, **kwargs):
+                    yield chunk
+            else:
+                yield on_open()
+            return
+        
+        started = time.monotonic()
+        first_chunk: Optional[float] = None
+        success = True
+        timed_out = cancelled = False
+        try:
+            async for chunk in getattr(self._inner, method)(*args, **kwargs):
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                    success = not _is_failure(chunk)
+                yield chunk
+        except GeneratorExit:
+            raise
+        except DeadlineExceeded:
+            timed_out = first_chunk is None
+            raise
+        except Exception:
+            success = False
+            raise
+        except BaseException:
+            # Cancelled while waiting for the provider: no outcome
+            cancelled = first_chunk is None
+            raise
+        finally:
+            if cancelled:
+                self.breaker.release()
+            else:
+                latency = first_chunk if first_chunk is not None else time.monotonic() - started
+                self.breaker.record(success, latency, timed_out)
+    
+    # ==========================================================================
+    # Helpers
+    # ==========================================================================
+    
+    def _failover_client(self) -> Optional[BaseAIClient]:
+        if self._failover is None:
+            return None
+        try:
+            return self._failover()
+        except Exception as e:
+            log.warning(f"Failover client unavailable: {e}")
+            return None
+    
+    def _raise_open(self) -> Any:
+        raise CircuitOpenError(f"Circuit open for {self.breaker.name}; provider temporarily skipped")
+
+
+def _chat_fallback(messages: list, topic: str) -> FallbackText:
+    record_fallback("circuit_open")
+    return FallbackText(get_mentor_demo_response(messages, topic), reason="circuit_open")
+
+
+def _concept_fallback(concept_name: str, user_explanation: str) -> FallbackResult:
+    record_fallback("circuit_open")
+    return FallbackResult(
+        get_concept_mirror_demo_response(concept_name, user_explanation),
+        reason="circuit_open",
+    )
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Start fresh breakers (with the new thresholds) if their settings changed."""
+    if any(name.startswith("breaker_") for name in new.changed_fields(old)):
+        with _breakers_lock:
+            _breakers.clear()
+
+
+config.on_reload(_on_config_reload)
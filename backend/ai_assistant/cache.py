@@ -0,0 +1,340 @@
+"""
+Result cache for Concept Mirror analyses.
+
+Two tiers sit in front of the provider call:
+- A bounded in-memory LRU with per-entry TTL (per process, microseconds).
+- A local SQLite file that survives restarts and is shared by every worker
+  process on the host (milliseconds).
+
+Entries are keyed on the normalized concept and explanation plus provider,
+model and prompt version, so a prompt change never serves stale analyses.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import config, ConfigSnapshot
+from logs import get_logger
+from prompts import CONCEPT_MIRROR_PROMPT_VERSION
+
+log = get_logger("cache")
+
+
+# Purge expired SQLite rows after this many writes
+_PURGE_EVERY = 256
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace and case so trivial variations share a key."""
+    return " ".join(text.split()).casefold()
+
+
+class ConceptAnalysisCache:
+    """
+    Two-tier (memory + SQLite) cache for Concept Mirror results.
+    
+    Thread-safe. Each thread gets its own SQLite connection; the database
+    runs in WAL mode so concurrent readers in other processes don't block.
+    Any SQLite error disables the disk tier and the cache keeps working
+    from memory.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 86400,
+        db_path: Optional[str] = None
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries: Max entries kept in the in-memory tier.
+            ttl: Time-to-live for each entry, in seconds.
+            db_path: SQLite file for the persistent tier, or None for memory only.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        self._writes_since_purge = 0
+        
+        if self.db_path:
+            self._init_db()
+    
+    # ==========================================================================
+    # Public API
+    # ==========================================================================
+    
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: Optional[str],
+        concept_name: str,
+        user_explanation: str
+    ) -> str:
+        """Build the cache key for an analysis request."""
+        raw = "\x00".join([
+            provider,
+            model or "",
+            CONCEPT_MIRROR_PROMPT_VERSION,
+            _normalize(concept_name),
+            _normalize(user_explanation),
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached analysis, or None if missing or expired."""
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return json.loads(value)
+                del self._memory[key]
+        
+        row = self._db_get(key, now)
+        if row is not None:
+            expires_at, value = row
+            self._remember(key, expires_at, value)
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            return json.loads(value)
+        
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+    
+    def set(self, key: str, analysis: Dict[str, Any]) -> None:
+        """Store an analysis in both tiers."""
+        expires_at = time.time() + self.ttl
+        value = json.dumps(analysis)
+        
+        self._remember(key, expires_at, value)
+        self._db_set(key, expires_at, value)
+        with self._lock:
+            self._stats["stores"] += 1
+    
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        conn = self._connection()
+        if conn is not None:
+            try:
+                with conn:
+                    conn.execute("DELETE FROM concept_analysis")
+            except sqlite3.Error as e:
+                self._disable_db(e)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size, for health and metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["persistent"] = bool(self.db_path)
+        return stats
+    
+    # ==========================================================================
+    # Memory Tier
+    # ==========================================================================
+    
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        """Insert into the LRU, evicting the least recently used entries."""
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+    
+    # ==========================================================================
+    # SQLite Tier
+    # ==========================================================================
+    
+    def _init_db(self) -> None:
+        """Create the table (idempotent) and purge expired rows."""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS concept_analysis ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "DELETE FROM concept_analysis WHERE expires_at <= ?",
+                    (time.time(),)
+                )
+        except sqlite3.Error as e:
+            self._disable_db(e)
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Get this thread's SQLite connection, opening it if needed."""
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=1.0)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error as e:
+                self._disable_db(e)
+                return None
+            self._local.conn = conn
+        return conn
+    
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        """Read a non-expired row from SQLite."""
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT expires_at, value FROM concept_analysis"
+                " WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._disable_db(e)
+            return None
+        return row
+    
+    def _db_set(self, key: str, expires_at: float, value: str) -> None:
+        """Upsert a row into SQLite."""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO concept_analysis (key, value, expires_at)"
+                    " VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                # Keep the file from growing forever: purge expired rows
+                # every so often instead of on every write
+                self._writes_since_purge += 1
+                if self._writes_since_purge >= _PURGE_EVERY:
+                    self._writes_since_purge = 0
+                    conn.execute(
+                        "DELETE FROM concept_analysis WHERE expires_at <= ?",
+                        (time.time(),)
+                    )
+        except sqlite3.Error as e:
+            self._disable_db(e)
+    
+    def _disable_db(self, error: Exception) -> None:
+        """Fall back to memory-only caching after a SQLite failure."""
+        log.warning(f"Disabling SQLite tier ({self.db_path}): {error}")
+        self.db_path = None
+    
+    def __repr__(self) -> str:
+        return (
+            f"ConceptAnalysisCache(max_entries={self.max_entries}, "
+            f"ttl={self.ttl}, db_path={self.db_path})"
+        )
+
+
+# =============================================================================
+# GLOBAL CACHE INSTANCE
+# =============================================================================
+
+_concept_cache: Optional[ConceptAnalysisCache] = None
+_concept_cache_lock = threading.Lock()
+
+
+def get_concept_cache() -> Optional[ConceptAnalysisCache]:
+    """
+    Get the process-wide Concept Mirror cache.
+    
+    Returns:
+        The shared cache, or None when CONCEPT_CACHE_ENABLED is off.
+    """
+    global _concept_cache
+    
+    if not config.concept_cache_enabled:
+        return None
+    
+    if _concept_cache is None:
+        with _concept_cache_lock:
+            if _concept_cache is None:
+                _concept_cache = ConceptAnalysisCache(
+                    max_entries=config.concept_cache_size,
+                    ttl=config.concept_cache_ttl,
+                    db_path=config.concept_cache_path,
+                )
+    return _concept_cache
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Rebuild the cache on next use if its settings changed."""
+    global _concept_cache
+    
+    if any(name.startswith("concept_cache_") for name in new.changed_fields(old)):
+        with _concept_cache_lock:
+            _concept_cache = None
+
+
+config.on_reload(_on_config_reload)
+
+
+def lookup_concept_analysis(
+    provider: str,
+    model: Optional[str],
+    concept_name: str,
+    user_explanation: str
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Look up a cached analysis for a provider call.
+    
+    Returns:
+        (cache key, cached analysis). The key is None when caching is off;
+        the analysis is None on a miss.
+    """
+    cache = get_concept_cache()
+    if cache is None:
+        return None, None
+    key = cache.make_key(provider, model, concept_name, user_explanation)
+    return key, cache.get(key)
+
+
+def store_concept_analysis(key: Optional[str], analysis: Dict[str, Any]) -> None:
+    """Store a successfully parsed analysis under a key from lookup_concept_analysis()."""
+    cache = get_concept_cache()
+    if cache is not None and key is not None:
+        cache.set(key, analysis)
+
+
+async def acache_call(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a cache call (lookup, or parse-and-store) from async code.
+    
+    With the SQLite tier on, the call can block on disk I/O or on another
+    process's write lock, so it runs in a worker thread instead of on the
+    event loop. Memory-only caches are called inline.
+    """
+    cache = get_concept_cache()
+    if cache is None or not cache.db_path:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
@@ -0,0 +1,329 @@
+"""
+Cold-start import budget for the WSGI entry point.
+
+On Vercel every cold start imports api.py (which builds the app) before the
+first request is served, and the first AI request then imports the provider
+package and its SDK unless PROVIDER_PRELOAD has done so already. This script
+measures both phases in fresh interpreters:
+
+- wall time of `import api` and of each provider package after it
+  (median of --runs processes, with PROVIDER_PRELOAD=off);
+- a per-package budget: import time spent in each top-level package;
+- the import graph of the entry and of each provider, pruned to the
+  modules that cost at least --min-ms (from `python -X importtime`).
+
+Results are written as JSON. The exit status is 1 when a phase is over its
+budget (DEFAULT_BUDGET_MS / DEFAULT_PROVIDER_BUDGET_MS unless overridden) or,
+with --compare, regressed against an earlier run:
+
+    python coldstart.py                      # check the default budgets
+    python coldstart.py --output cold.json
+    ... make a change ...
+    python coldstart.py --compare cold.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Default budgets, about twice what a developer laptop measures: `import api`
+# takes ~200 ms (Flask itself ~165 ms of it) and gemini_provider, the slowest
+# provider, ~800 ms
+DEFAULT_BUDGET_MS = 400.0
+DEFAULT_PROVIDER_BUDGET_MS = 1500.0
+
+PROVIDER_PACKAGES = {
+    "gemini": "gemini_provider",
+    "groq": "groq_provider",
+    "fake": "fake_provider",
+}
+
+# Runs in the child interpreter; prints the wall time of each phase
+_DRIVER = """
+import json, sys, time
+started = time.perf_counter()
+import api
+timings = {"entry": time.perf_counter() - started}
+for package in sys.argv[1:]:
+    started = time.perf_counter()
+    __import__(package)
+    timings[package] = time.perf_counter() - started
+sys.stdout.write(json.dumps(timings))
+"""
+
+
+class ImportNode:
+    """One module in `-X importtime` output, with the imports it triggered."""
+    
+    __slots__ = ("name", "self_us", "cumulative_us", "depth", "children")
+    
+    def __init__(self, name: str, self_us: int, cumulative_us: int, depth: int):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.depth = depth
+        self.children: List["ImportNode"] = []
+    
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+    
+    def to_dict(self, min_us: int, max_depth: int, depth: int = 0) -> Dict[str, Any]:
+        node = {
+            "module": self.name,
+            "self_ms": round(self.self_us / 1000, 2),
+            "cumulative_ms": round(self.cumulative_us / 1000, 2),
+        }
+        if depth < max_depth:
+            children = [
+                child.to_dict(min_us, max_depth, depth + 1)
+                for child in sorted(self.children, key=lambda c: -c.cumulative_us)
+                if child.cumulative_us >= min_us
+            ]
+            if children:
+                node["imports"] = children
+        return node
+
+
+def parse_importtime(output: str) -> List[ImportNode]:
+    """
+    Parse `python -X importtime` output into trees (one per top-level import).
+    
+    A module is reported after everything it imported, one level deeper
+    (two more spaces) than its importer.
+    """
+    stack: List[ImportNode] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name_field = fields[2].rstrip()
+        depth = (len(name_field) - len(name_field.lstrip()) - 1) // 2
+        node = ImportNode(name_field.strip(), int(fields[0]), int(fields[1]), depth)
+        while stack and stack[-1].depth > depth:
+            node.children.insert(0, stack.pop())
+        stack.append(node)
+    return stack
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def _child_env(extra: List[str]) -> Dict[str, str]:
+    """Environment of a measured interpreter: no preload, no watcher, quiet."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = HERE + os.pathsep + env.get("PYTHONPATH", "")
+    env["PROVIDER_PRELOAD"] = "off"
+    env["ENV_WATCH_INTERVAL"] = "0"
+    env.setdefault("LOG_LEVEL", "WARNING")
+    for setting in extra:
+        name, _, value = setting.partition("=")
+        env[name] = value
+    return env
+
+
+def _run(packages: List[str], env: Dict[str, str], importtime: bool) -> Tuple[Dict[str, float], str]:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _DRIVER] + packages
+    proc = subprocess.run(command, cwd=HERE, env=env, capture_output=True, text=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    return json.loads(proc.stdout), proc.stderr
+
+
+def measure(provider: Optional[str], runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Cold-start phases of `import api` (+ one provider package).
+    
+    Wall times come from plain interpreters (importtime's own bookkeeping
+    inflates them); the breakdown comes from one extra `-X importtime` run.
+    """
+    packages = [PROVIDER_PACKAGES[provider]] if provider else []
+    samples: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(runs):
+        timings, _ = _run(packages, env, importtime=False)
+        for phase, seconds in timings.items():
+            samples[phase].append(seconds * 1000)
+    _, importtime_output = _run(packages, env, importtime=True)
+    
+    return {
+        "provider": provider,
+        "phases_ms": {
+            ("entry" if phase == "entry" else "provider"): round(statistics.median(values), 1)
+            for phase, values in samples.items()
+        },
+        "roots": {root.name: root for root in parse_importtime(importtime_output)},
+    }
+
+
+def package_budget(root: ImportNode) -> List[Tuple[str, float]]:
+    """Self import time per top-level package under `root`, largest first."""
+    totals: Dict[str, int] = defaultdict(int)
+    for node in root.walk():
+        totals[node.name.split(".")[0]] += node.self_us
+    return sorted(((name, us / 1000) for name, us in totals.items()), key=lambda item: -item[1])
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def _print_tree(node: Dict[str, Any], indent: int = 0) -> None:
+    print(f"{'  ' * indent}{node['module']:<{48 - 2 * indent}} {node['cumulative_ms']:>8.1f} ms"
+          f"  (self {node['self_ms']:.1f})")
+    for child in node.get("imports", []):
+        _print_tree(child, indent + 1)
+
+
+def _print_section(title: str, root: ImportNode, args: argparse.Namespace) -> Dict[str, Any]:
+    graph = root.to_dict(int(args.min_ms * 1000), args.depth)
+    budget = package_budget(root)
+    
+    print(f"\n{title}: import graph (modules >= {args.min_ms:g} ms)")
+    _print_tree(graph)
+    print(f"\n{title}: time per package")
+    for name, ms in budget[:args.top]:
+        print(f"  {name:<32} {ms:>8.1f} ms")
+    
+    return {
+        "graph": graph,
+        "packages_ms": {name: round(ms, 2) for name, ms in budget},
+    }
+
+
+def compare(report: Dict[str, Any], baseline_path: str, max_regression: float) -> bool:
+    """Compare phase times with an earlier report; False on a regression."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["phases_ms"]
+    
+    ok = True
+    print(f"\nCompared with {baseline_path}:")
+    for phase, ms in report["phases_ms"].items():
+        old = baseline.get(phase)
+        if not old:
+            continue
+        change = (ms - old) / old * 100
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"  {phase:<20} {old:>8.1f} -> {ms:>8.1f} ms  {change:+6.1f}%"
+              + ("  REGRESSION" if regressed else ""))
+    return ok
+
+
+def check_budgets(report: Dict[str, Any], budget_ms: float, provider_budget_ms: float) -> bool:
+    """Check phase times against the absolute budgets; False if one is over."""
+    ok = True
+    for phase, ms in report["phases_ms"].items():
+        budget = budget_ms if phase == "entry" else provider_budget_ms
+        if budget and ms > budget:
+            print(f"OVER BUDGET: {phase} took {ms:.1f} ms (budget {budget:g} ms)")
+            ok = False
+    return ok
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# =============================================================================
+# Main Entry Point
+# =============================================================================
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--provider", action="append", choices=sorted(PROVIDER_PACKAGES),
+                        help="Provider package to measure (repeatable; default: gemini and groq)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="Interpreters per measurement; the median is reported (default: 5)")
+    parser.add_argument("--min-ms", type=float, default=5.0,
+                        help="Leave cheaper modules out of the import graph (default: 5)")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="Import graph depth (default: 3)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Packages listed in the budget (default: 10)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra setting for the measured interpreters (repeatable)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Fail if importing the entry takes longer; 0 disables "
+                             f"(default: {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--provider-budget-ms", type=float, default=DEFAULT_PROVIDER_BUDGET_MS,
+                        help=f"Fail if importing a provider package takes longer; 0 disables "
+                             f"(default: {DEFAULT_PROVIDER_BUDGET_MS:g})")
+    parser.add_argument("--output", default="coldstart_results.json",
+                        help="JSON results file (default: coldstart_results.json)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="Allowed regression of any phase in percent (default: 20)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    env = _child_env(args.env)
+    
+    entry = measure(None, args.runs, env)
+    phases = {"entry": entry["phases_ms"]["entry"]}
+    print(f"import api (entry)              {phases['entry']:>8.1f} ms")
+    
+    measured = []
+    for provider in args.provider or ["gemini", "groq"]:
+        try:
+            measured.append(measure(provider, args.runs, env))
+        except RuntimeError as e:
+            print(f"import {PROVIDER_PACKAGES[provider]:<25} skipped: {e}")
+            continue
+        phases[f"provider:{provider}"] = measured[-1]["phases_ms"]["provider"]
+        print(f"import {PROVIDER_PACKAGES[provider]:<25} {phases[f'provider:{provider}']:>8.1f} ms")
+    
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "env": args.env,
+        },
+        "phases_ms": phases,
+        "imports": {"entry": _print_section("api", entry["roots"]["api"], args)},
+    }
+    for result in measured:
+        package = PROVIDER_PACKAGES[result["provider"]]
+        report["imports"][f"provider:{result['provider']}"] = _print_section(
+            package, result["roots"][package], args
+        )
+    
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    
+    ok = check_budgets(report, args.budget_ms, args.provider_budget_ms)
+    if args.compare:
+        ok = compare(report, args.compare, args.max_regression) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Schema-validated parsing of Concept Mirror analyses.
+
+The providers ask for JSON output (Groq JSON mode, Gemini response schema),
+but a long analysis can still arrive wrapped in prose or code fences, cut
+off at the token limit, or with a trailing comma. Throwing that away costs
+a whole 4096-token call, so parsing here works in one pass and repairs
+before giving up:
+
+1. decode the first JSON object in the text with json.JSONDecoder.raw_decode
+   (no regex over the whole output; anything after the object is ignored);
+2. otherwise repair it locally: drop trailing commas, close a string,
+   array or object left open by truncation, cutting back to the last
+   complete element if what was cut off can't be closed;
+3. validate it against CONCEPT_MIRROR_SCHEMA: the four lists and the
+   summary, with missing lists defaulted to [] and stray types coerced.
+
+parse_concept_analysis() reports the outcome ("ok", "repaired", "failed")
+so callers can count parse failures instead of hiding them.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+LIST_FIELDS = ("understood", "missing", "incorrect", "assumptions")
+
+# JSON schema of an analysis; Gemini takes it as its response schema
+CONCEPT_MIRROR_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        **{field: {"type": "array", "items": {"type": "string"}} for field in LIST_FIELDS},
+        "summary": {"type": "string"},
+    },
+    "required": [*LIST_FIELDS, "summary"],
+}
+
+_decoder = json.JSONDecoder()
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _decode(text: str, start: int) -> Optional[Any]:
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def repair_json(fragment: str) -> Optional[Any]:
+    """
+    Repair a truncated or slightly malformed JSON object and decode it.
+    
+    Scans the fragment once, tracking strings and open brackets. Trailing
+    commas are dropped; at the end, an open string is closed and the open
+    brackets are closed in order. If that still doesn't decode (the text
+    stopped after a key, or inside a number or literal), the fragment is
+    cut back to the last comma between complete elements and closed there.
+    
+    Returns:
+        The decoded value, or None if it can't be repaired.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    # (length of `out`, open brackets) at each comma between complete elements
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escaped = False
+    
+    for char in fragment:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            # Trailing comma before a closer
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if not stack:
+                break
+            stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        elif char == ",":
+            cut_points.append((len(out), tuple(stack)))
+        out.append(char)
+    
+    def close(parts: List[str], brackets: Tuple[str, ...], open_string: bool) -> Optional[Any]:
+        text = "".join(parts)
+        if open_string:
+            text += '"'
+        text = text.rstrip().rstrip(",")
+        return _decode(text + "".join(_CLOSERS[b] for b in reversed(brackets)), 0)
+    
+    value = close(out, tuple(stack), in_string)
+    if value is None:
+        for length, brackets in reversed(cut_points):
+            value = close(out[:length], brackets, False)
+            if value is not None:
+                break
+    return value
+
+
+def _string(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def validate_concept_analysis(data: Any) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Check a decoded analysis against CONCEPT_MIRROR_SCHEMA.
+    
+    Returns:
+        (analysis, changed): the analysis with exactly the five keys, or None
+        if `data` isn't an analysis at all; `changed` is True when a field
+        had to be defaulted or coerced.
+    """
+    if not isinstance(data, dict) or not any(key in data for key in (*LIST_FIELDS, "summary")):
+        return None, False
+    
+    analysis: Dict[str, Any] = {}
+    changed = False
+    for field in LIST_FIELDS:
+        value = data.get(field)
+        if value is None:
+            items: List[str] = []
+            changed = True
+        elif isinstance(value, list):
+            items = [s for s in map(_string, value) if s]
+            changed = changed or len(items) != len(value)
+        else:
+            single = _string(value)
+            items = [single] if single else []
+            changed = True
+        analysis[field] = items
+    
+    summary = data.get("summary")
+    if isinstance(summary, str):
+        analysis["summary"] = summary.strip()
+    else:
+        parts = map(_string, summary) if isinstance(summary, list) else ()
+        analysis["summary"] = " ".join(part for part in parts if part)
+        changed = True
+    return analysis, changed
+
+
+def parse_concept_analysis(text: Optional[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Parse a Concept Mirror answer.
+    
+    Returns:
+        (analysis, outcome) where outcome is "ok" (valid as sent), "repaired"
+        (decoded only after local repair, or fields defaulted) or "failed"
+        (analysis is None).
+    """
+    start = text.find("{") if text else -1
+    if start < 0:
+        return None, "failed"
+    
+    repaired = False
+    data = _decode(text, start)
+    if data is None:
+        data = repair_json(text[start:])
+        repaired = True
+    
+    analysis, changed = validate_concept_analysis(data)
+    if analysis is None:
+        return None, "failed"
+    return analysis, "repaired" if repaired or changed else "ok"
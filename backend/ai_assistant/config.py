@@ -1,29 +1,411 @@
 """
 Configuration module for AI Assistant.
 
-Loads environment variables from the parent backend's .env file and provides 
+Loads environment variables from the parent backend's .env file and provides
 centralized configuration management for the AI assistant module.
+
+Settings are parsed once into an immutable ConfigSnapshot. Reading a setting
+is a plain attribute lookup; nothing is re-parsed per request. A reload
+(SIGHUP, the /admin/reload endpoint or the optional .env watcher) builds a
+new snapshot and swaps it in atomically, then notifies listeners such as the
+provider client pool so they can drop state built from the old settings.
 """
 
 import os
+import signal
+import tempfile
+import threading
+from dataclasses import dataclass, fields
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Callable, Dict, List, Optional, Literal
 
 # Try to load python-dotenv if available
 try:
-    from dotenv import load_dotenv
-    
+    from dotenv import dotenv_values
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False  # python-dotenv not installed, rely on system env vars
+
+
+def _find_env_file() -> Optional[Path]:
+    """Locate the .env file: the parent backend's (shared) first, then local."""
     # Load .env file from the parent backend directory (shared env)
     backend_env = Path(__file__).parent.parent / ".env"
     if backend_env.exists():
-        load_dotenv(backend_env)
-    else:
-        # Also check current directory for local development
-        local_env = Path(__file__).parent / ".env"
-        if local_env.exists():
-            load_dotenv(local_env)
-except ImportError:
-    pass  # python-dotenv not installed, rely on system env vars
+        return backend_env
+    
+    # Also check current directory for local development
+    local_env = Path(__file__).parent / ".env"
+    if local_env.exists():
+        return local_env
+    
+    return None
+
+
+ENV_FILE = _find_env_file()
+
+# Keys the .env file has set in os.environ, with the value each had before
+# (None = unset), so a key deleted from the file can be undone on reload
+_env_file_keys: Dict[str, Optional[str]] = {}
+
+
+def _load_env_file(override: bool) -> None:
+    """
+    Apply the .env file to os.environ.
+    
+    Args:
+        override: Let the file win over variables already set in the process
+            environment (on reload). Keys set by an earlier load always
+            follow the file.
+    """
+    if not DOTENV_AVAILABLE or ENV_FILE is None:
+        return
+    values = dotenv_values(ENV_FILE) if ENV_FILE.exists() else {}
+    
+    # Undo keys that were removed from the file since the last load
+    for key in [key for key in _env_file_keys if values.get(key) is None]:
+        previous = _env_file_keys.pop(key)
+        if previous is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = previous
+    
+    for key, value in values.items():
+        if value is None:
+            # A bare "KEY" line has no value
+            continue
+        if key not in _env_file_keys:
+            if key in os.environ and not override:
+                continue
+            _env_file_keys[key] = os.environ.get(key)
+        os.environ[key] = value
+
+
+_load_env_file(override=False)
+
+
+# =============================================================================
+# Environment Parsing Helpers
+# =============================================================================
+
+def _env_str(name: str, default: str = "") -> str:
+    return os.getenv(name, default)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("true", "1", "yes")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_int_map(name: str, default: str = "") -> Dict[str, int]:
+    """Parse "key=int,key=int" pairs (e.g. per-model budgets), skipping malformed entries."""
+    values: Dict[str, int] = {}
+    for item in os.getenv(name, default).split(","):
+        key, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            values[key.strip()] = int(value)
+        except ValueError:
+            continue
+    return values
+
+
+# Provider names accepted by ACTIVE_PROVIDER / HEDGE_PROVIDER
+PROVIDERS = ("gemini", "groq", "fake")
+
+
+def _is_real_key(key: Optional[str]) -> bool:
+    """Reject empty keys and the placeholders from .env.example."""
+    return bool(key and key != "your_gemini_api_key_here" and key != "your_groq_api_key_here")
+
+
+# =============================================================================
+# Configuration Snapshot
+# =============================================================================
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Immutable, fully parsed view of the configuration at one point in time.
+    
+    Build one with ConfigSnapshot.from_env(); never mutate it. A handler that
+    needs several settings to agree can read `config.snapshot` once and use
+    that object for the whole request.
+    """
+    
+    # Provider configuration
+    active_provider: Literal["gemini", "groq", "fake"]
+    active_model: Optional[str]
+    
+    # API keys
+    google_api_key: Optional[str]
+    groq_api_key: Optional[str]
+    has_google_api_key: bool
+    has_groq_api_key: bool
+    
+    # Server configuration
+    flask_host: str
+    flask_port: int
+    flask_debug: bool
+    demo_mode: bool
+    provider_preload: str
+    
+    # Cache configuration
+    concept_cache_enabled: bool
+    concept_cache_size: int
+    concept_cache_ttl: int
+    concept_cache_path: Optional[str]
+    mentor_cache_enabled: bool
+    mentor_cache_threshold: float
+    mentor_cache_ttl: int
+    mentor_cache_size: int
+    mentor_cache_max_history: int
+    
+    # Session configuration
+    session_store_size: int
+    session_ttl: int
+    session_max_messages: int
+    session_store_path: Optional[str]
+    
+    # Conversation history configuration
+    history_window_enabled: bool
+    history_token_budget: int
+    history_model_budgets: Dict[str, int]
+    history_summary_tokens: int
+    history_summary_cache_size: int
+    history_summary_model: Optional[str]
+    
+    # Upstream call configuration
+    singleflight_enabled: bool
+    batch_max_items: int
+    batch_concurrency: int
+    hedge_enabled: bool
+    hedge_provider: Optional[str]
+    hedge_model: Optional[str]
+    hedge_percentile: float
+    hedge_initial_delay_ms: int
+    hedge_min_delay_ms: int
+    hedge_max_workers: int
+    hedge_max_in_flight: int
+    breaker_enabled: bool
+    breaker_failover: bool
+    breaker_failure_rate: float
+    breaker_slow_call_ms: int
+    breaker_slow_call_rate: float
+    breaker_min_calls: int
+    breaker_window_seconds: float
+    breaker_open_seconds: float
+    breaker_half_open_probes: int
+    provider_timeout_ms: int
+    concept_json_mode: bool
+    retry_enabled: bool
+    retry_max_attempts: int
+    retry_base_delay_ms: int
+    retry_max_delay_ms: int
+    retry_max_wait_ms: int
+    rate_limit_enabled: bool
+    rate_limit_requests_per_minute: int
+    rate_limit_tokens_per_minute: int
+    rate_limit_max_wait_ms: int
+    metrics_enabled: bool
+    usage_ledger_enabled: bool
+    usage_ledger_bucket_seconds: int
+    usage_ledger_retention_hours: int
+    usage_ledger_max_rows: int
+    
+    # Tracing and logging configuration
+    tracing_enabled: bool
+    trace_sample_rate: float
+    trace_exporter: str
+    trace_otlp_endpoint: str
+    trace_service_name: str
+    server_timing_enabled: bool
+    log_level: str
+    log_format: str
+    
+    # Deadline configuration
+    deadline_default_ms: int
+    deadline_max_ms: int
+    deadline_routes: Dict[str, int]
+    
+    # Admission control configuration
+    admission_enabled: bool
+    admission_client_rpm: int
+    admission_client_burst: int
+    admission_trust_proxy: bool
+    admission_max_in_flight: int
+    admission_route_limits: Dict[str, int]
+    admission_max_queue: int
+    admission_queue_timeout_ms: int
+    
+    # Fake provider configuration
+    fake_ttft_ms: int
+    fake_ttft_jitter_ms: int
+    fake_tokens_per_second: float
+    fake_response_tokens: int
+    fake_response_tokens_sigma: float
+    fake_error_rate: float
+    fake_rate_limit_rate: float
+    fake_retry_after_ms: int
+    fake_seed: Optional[int]
+    
+    # Reload configuration
+    admin_token: Optional[str]
+    env_watch_interval: float
+    
+    @classmethod
+    def from_env(cls) -> "ConfigSnapshot":
+        """Parse the current environment into a new snapshot."""
+        provider = _env_str("ACTIVE_PROVIDER", "gemini").lower()
+        if provider not in PROVIDERS:
+            provider = "gemini"
+        
+        model = _env_str("ACTIVE_MODEL", "").strip()
+        
+        google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        
+        # Defaults to a file in the system temp dir so every worker process on
+        # the host shares it. An empty CONCEPT_CACHE_PATH keeps it in memory.
+        default_cache_path = os.path.join(tempfile.gettempdir(), "openlearn_ai_cache.sqlite3")
+        cache_path = _env_str("CONCEPT_CACHE_PATH", default_cache_path).strip()
+        
+        # Memory only unless a path is set: sessions hold learners' conversations
+        session_path = _env_str("SESSION_STORE_PATH", "").strip()
+        
+        hedge_provider = _env_str("HEDGE_PROVIDER", "").strip().lower()
+        if hedge_provider not in PROVIDERS:
+            hedge_provider = ""
+        hedge_model = _env_str("HEDGE_MODEL", "").strip()
+        
+        summary_model = _env_str("HISTORY_SUMMARY_MODEL", "").strip()
+        admin_token = _env_str("ADMIN_RELOAD_TOKEN", "").strip()
+        fake_seed = _env_str("FAKE_SEED", "").strip()
+        
+        return cls(
+            active_provider=provider,
+            active_model=model if model else None,
+            google_api_key=google_api_key,
+            groq_api_key=groq_api_key,
+            has_google_api_key=_is_real_key(google_api_key),
+            has_groq_api_key=_is_real_key(groq_api_key),
+            # Default port 5050 avoids a conflict with Node.js
+            flask_host=_env_str("FLASK_HOST", "127.0.0.1"),
+            flask_port=_env_int("FLASK_PORT", 5050),
+            flask_debug=_env_bool("FLASK_DEBUG", "True"),
+            demo_mode=_env_bool("DEMO_MODE", "False"),
+            provider_preload=_env_str("PROVIDER_PRELOAD", "background").lower(),
+            concept_cache_enabled=_env_bool("CONCEPT_CACHE_ENABLED", "True"),
+            concept_cache_size=_env_int("CONCEPT_CACHE_SIZE", 1024),
+            concept_cache_ttl=_env_int("CONCEPT_CACHE_TTL", 86400),
+            concept_cache_path=cache_path if cache_path else None,
+            mentor_cache_enabled=_env_bool("MENTOR_CACHE_ENABLED", "False"),
+            mentor_cache_threshold=min(max(_env_float("MENTOR_CACHE_THRESHOLD", 0.9), 0.75), 1.0),
+            mentor_cache_ttl=_env_int("MENTOR_CACHE_TTL", 3600),
+            mentor_cache_size=_env_int("MENTOR_CACHE_SIZE", 512),
+            mentor_cache_max_history=_env_int("MENTOR_CACHE_MAX_HISTORY", 1),
+            session_store_size=max(_env_int("SESSION_STORE_SIZE", 1000), 1),
+            session_ttl=_env_int("SESSION_TTL", 86400),
+            session_max_messages=max(_env_int("SESSION_MAX_MESSAGES", 500), 2),
+            session_store_path=session_path if session_path else None,
+            history_window_enabled=_env_bool("HISTORY_WINDOW_ENABLED", "True"),
+            history_token_budget=max(_env_int("HISTORY_TOKEN_BUDGET", 6000), 1000),
+            history_model_budgets=_env_int_map("HISTORY_MODEL_BUDGETS"),
+            history_summary_tokens=_env_int("HISTORY_SUMMARY_TOKENS", 300),
+            history_summary_cache_size=_env_int("HISTORY_SUMMARY_CACHE_SIZE", 256),
+            history_summary_model=summary_model if summary_model else None,
+            singleflight_enabled=_env_bool("SINGLEFLIGHT_ENABLED", "True"),
+            batch_max_items=_env_int("BATCH_MAX_ITEMS", 50),
+            batch_concurrency=max(_env_int("BATCH_CONCURRENCY", 4), 1),
+            hedge_enabled=_env_bool("HEDGE_ENABLED", "False"),
+            hedge_provider=hedge_provider if hedge_provider else None,
+            hedge_model=hedge_model if hedge_model else None,
+            hedge_percentile=min(max(_env_float("HEDGE_PERCENTILE", 95.0), 50.0), 99.9),
+            hedge_initial_delay_ms=_env_int("HEDGE_INITIAL_DELAY_MS", 2000),
+            hedge_min_delay_ms=_env_int("HEDGE_MIN_DELAY_MS", 250),
+            hedge_max_workers=max(_env_int("HEDGE_MAX_WORKERS", 32), 2),
+            hedge_max_in_flight=max(_env_int("HEDGE_MAX_IN_FLIGHT", 8), 1),
+            breaker_enabled=_env_bool("BREAKER_ENABLED", "True"),
+            breaker_failover=_env_bool("BREAKER_FAILOVER", "True"),
+            breaker_failure_rate=min(max(_env_float("BREAKER_FAILURE_RATE", 0.5), 0.05), 1.0),
+            breaker_slow_call_ms=_env_int("BREAKER_SLOW_CALL_MS", 15000),
+            breaker_slow_call_rate=min(max(_env_float("BREAKER_SLOW_CALL_RATE", 0.8), 0.05), 1.0),
+            breaker_min_calls=max(_env_int("BREAKER_MIN_CALLS", 10), 1),
+            breaker_window_seconds=max(_env_float("BREAKER_WINDOW_SECONDS", 30.0), 1.0),
+            breaker_open_seconds=max(_env_float("BREAKER_OPEN_SECONDS", 30.0), 1.0),
+            breaker_half_open_probes=max(_env_int("BREAKER_HALF_OPEN_PROBES", 2), 1),
+            provider_timeout_ms=max(_env_int("PROVIDER_TIMEOUT_MS", 30000), 100),
+            concept_json_mode=_env_bool("CONCEPT_JSON_MODE", "True"),
+            retry_enabled=_env_bool("RETRY_ENABLED", "True"),
+            retry_max_attempts=max(_env_int("RETRY_MAX_ATTEMPTS", 3), 1),
+            retry_base_delay_ms=max(_env_int("RETRY_BASE_DELAY_MS", 250), 1),
+            retry_max_delay_ms=max(_env_int("RETRY_MAX_DELAY_MS", 4000), 1),
+            retry_max_wait_ms=max(_env_int("RETRY_MAX_WAIT_MS", 10000), 0),
+            rate_limit_enabled=_env_bool("RATE_LIMIT_ENABLED", "True"),
+            rate_limit_requests_per_minute=max(_env_int("RATE_LIMIT_REQUESTS_PER_MINUTE", 0), 0),
+            rate_limit_tokens_per_minute=max(_env_int("RATE_LIMIT_TOKENS_PER_MINUTE", 0), 0),
+            rate_limit_max_wait_ms=max(_env_int("RATE_LIMIT_MAX_WAIT_MS", 5000), 0),
+            metrics_enabled=_env_bool("METRICS_ENABLED", "True"),
+            usage_ledger_enabled=_env_bool("USAGE_LEDGER_ENABLED", "True"),
+            usage_ledger_bucket_seconds=max(_env_int("USAGE_LEDGER_BUCKET_SECONDS", 60), 1),
+            usage_ledger_retention_hours=max(_env_int("USAGE_LEDGER_RETENTION_HOURS", 24), 1),
+            usage_ledger_max_rows=max(_env_int("USAGE_LEDGER_MAX_ROWS", 50000), 1),
+            tracing_enabled=_env_bool("TRACING_ENABLED", "True"),
+            trace_sample_rate=min(max(_env_float("TRACE_SAMPLE_RATE", 0.1), 0.0), 1.0),
+            trace_exporter=_env_str("TRACE_EXPORTER", "none").lower(),
+            trace_otlp_endpoint=_env_str("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+            trace_service_name=_env_str("TRACE_SERVICE_NAME", "ai-assistant"),
+            server_timing_enabled=_env_bool("SERVER_TIMING_ENABLED", "False"),
+            log_level=_env_str("LOG_LEVEL", "INFO").upper(),
+            log_format=_env_str("LOG_FORMAT", "text").lower(),
+            deadline_default_ms=max(_env_int("DEADLINE_DEFAULT_MS", 25000), 100),
+            deadline_max_ms=max(_env_int("DEADLINE_MAX_MS", 120000), 100),
+            deadline_routes=_env_int_map("DEADLINE_ROUTES", "/analyze/batch=90000"),
+            admission_enabled=_env_bool("ADMISSION_ENABLED", "True"),
+            admission_client_rpm=max(_env_int("ADMISSION_CLIENT_RPM", 0), 0),
+            admission_client_burst=max(_env_int("ADMISSION_CLIENT_BURST", 20), 1),
+            admission_trust_proxy=_env_bool("ADMISSION_TRUST_PROXY", "False"),
+            admission_max_in_flight=max(_env_int("ADMISSION_MAX_IN_FLIGHT", 16), 1),
+            admission_route_limits=_env_int_map("ADMISSION_ROUTE_LIMITS", "/analyze/batch=4"),
+            admission_max_queue=max(_env_int("ADMISSION_MAX_QUEUE", 32), 0),
+            admission_queue_timeout_ms=max(_env_int("ADMISSION_QUEUE_TIMEOUT_MS", 2000), 0),
+            admin_token=admin_token if admin_token else None,
+            env_watch_interval=max(_env_float("ENV_WATCH_INTERVAL", 0.0), 0.0),
+            fake_ttft_ms=max(_env_int("FAKE_TTFT_MS", 400), 0),
+            fake_ttft_jitter_ms=max(_env_int("FAKE_TTFT_JITTER_MS", 100), 0),
+            fake_tokens_per_second=max(_env_float("FAKE_TOKENS_PER_SECOND", 80.0), 0.0),
+            fake_response_tokens=max(_env_int("FAKE_RESPONSE_TOKENS", 250), 1),
+            fake_response_tokens_sigma=max(_env_float("FAKE_RESPONSE_TOKENS_SIGMA", 0.5), 0.0),
+            fake_error_rate=min(max(_env_float("FAKE_ERROR_RATE", 0.0), 0.0), 1.0),
+            fake_rate_limit_rate=min(max(_env_float("FAKE_RATE_LIMIT_RATE", 0.0), 0.0), 1.0),
+            fake_retry_after_ms=max(_env_int("FAKE_RETRY_AFTER_MS", 1000), 0),
+            fake_seed=int(fake_seed) if fake_seed.lstrip("-").isdigit() else None,
+        )
+    
+    def changed_fields(self, other: "ConfigSnapshot") -> List[str]:
+        """Names of the settings that differ between two snapshots."""
+        return [
+            f.name for f in fields(self)
+            if getattr(self, f.name) != getattr(other, f.name)
+        ]
+
+
+# Called with (old_snapshot, new_snapshot) after every reload
+ReloadListener = Callable[[ConfigSnapshot, ConfigSnapshot], None]
 
 
 class Config:
@@ -31,25 +413,34 @@ class Config:
     Centralized configuration class for AI Assistant.
     
     All settings are loaded from environment variables with sensible defaults.
+    Properties read from the current immutable snapshot; call reload() to
+    pick up changes.
     """
     
+    def __init__(self):
+        self._snapshot = ConfigSnapshot.from_env()
+        self._listeners: List[ReloadListener] = []
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """The current configuration snapshot."""
+        return self._snapshot
+    
     # ==========================================================================
     # Provider Configuration
     # ==========================================================================
     
     @property
-    def active_provider(self) -> Literal["gemini", "groq"]:
+    def active_provider(self) -> Literal["gemini", "groq", "fake"]:
         """Get the active AI provider."""
-        provider = os.getenv("ACTIVE_PROVIDER", "gemini").lower()
-        if provider not in ("gemini", "groq"):
-            return "gemini"
-        return provider
+        return self._snapshot.active_provider
     
     @property
     def active_model(self) -> Optional[str]:
         """Get the model override, if any."""
-        model = os.getenv("ACTIVE_MODEL", "").strip()
-        return model if model else None
+        return self._snapshot.active_model
     
     # ==========================================================================
     # API Keys
@@ -58,26 +449,35 @@ class Config:
     @property
     def google_api_key(self) -> Optional[str]:
         """Get Gemini/Google API key."""
-        return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        return self._snapshot.google_api_key
     
     @property
     def groq_api_key(self) -> Optional[str]:
         """Get Groq API key."""
-        return os.getenv("GROQ_API_KEY")
+        return self._snapshot.groq_api_key
     
     def get_api_key(self, provider: Optional[str] = None) -> Optional[str]:
         """Get API key for the specified or active provider."""
-        provider = provider or self.active_provider
+        snapshot = self._snapshot
+        provider = provider or snapshot.active_provider
         if provider == "gemini":
-            return self.google_api_key
+            return snapshot.google_api_key
         elif provider == "groq":
-            return self.groq_api_key
+            return snapshot.groq_api_key
         return None
     
     def has_api_key(self, provider: Optional[str] = None) -> bool:
         """Check if API key is configured for the specified or active provider."""
-        key = self.get_api_key(provider)
-        return bool(key and key != "your_gemini_api_key_here" and key != "your_groq_api_key_here")
+        snapshot = self._snapshot
+        provider = provider or snapshot.active_provider
+        if provider == "gemini":
+            return snapshot.has_google_api_key
+        elif provider == "groq":
+            return snapshot.has_groq_api_key
+        elif provider == "fake":
+            # Simulated upstream; needs no key
+            return True
+        return False
     
     # ==========================================================================
     # Server Configuration
@@ -86,25 +486,600 @@ class Config:
     @property
     def flask_host(self) -> str:
         """Get Flask server host."""
-        return os.getenv("FLASK_HOST", "127.0.0.1")
+        return self._snapshot.flask_host
     
     @property
     def flask_port(self) -> int:
         """Get Flask server port (default 5050 to avoid conflict with Node.js)."""
-        try:
-            return int(os.getenv("FLASK_PORT", "5050"))
-        except ValueError:
-            return 5050
+        return self._snapshot.flask_port
     
     @property
     def flask_debug(self) -> bool:
         """Get Flask debug mode setting."""
-        return os.getenv("FLASK_DEBUG", "True").lower() in ("true", "1", "yes")
+        return self._snapshot.flask_debug
     
     @property
     def demo_mode(self) -> bool:
         """Check if demo mode is enabled."""
-        return os.getenv("DEMO_MODE", "False").lower() in ("true", "1", "yes")
+        return self._snapshot.demo_mode
+    
+    @property
+    def provider_preload(self) -> str:
+        """How the provider SDK is loaded at startup: background, eager or off."""
+        return self._snapshot.provider_preload
+    
+    # ==========================================================================
+    # Cache Configuration
+    # ==========================================================================
+    
+    @property
+    def concept_cache_enabled(self) -> bool:
+        """Check if Concept Mirror results are cached."""
+        return self._snapshot.concept_cache_enabled
+    
+    @property
+    def concept_cache_size(self) -> int:
+        """Get the max number of analyses kept in the in-memory cache tier."""
+        return self._snapshot.concept_cache_size
+    
+    @property
+    def concept_cache_ttl(self) -> int:
+        """Get how long a cached analysis stays valid, in seconds."""
+        return self._snapshot.concept_cache_ttl
+    
+    @property
+    def concept_cache_path(self) -> Optional[str]:
+        """Get the SQLite file backing the persistent cache tier (None = memory only)."""
+        return self._snapshot.concept_cache_path
+    
+    @property
+    def mentor_cache_enabled(self) -> bool:
+        """Check if the near-duplicate Mentor answer cache is enabled (opt-in)."""
+        return self._snapshot.mentor_cache_enabled
+    
+    @property
+    def mentor_cache_threshold(self) -> float:
+        """Get the SimHash similarity (0.75-1) required to reuse a cached answer."""
+        return self._snapshot.mentor_cache_threshold
+    
+    @property
+    def mentor_cache_ttl(self) -> int:
+        """Get how long a cached Mentor answer stays valid, in seconds."""
+        return self._snapshot.mentor_cache_ttl
+    
+    @property
+    def mentor_cache_size(self) -> int:
+        """Get the max number of cached Mentor answers."""
+        return self._snapshot.mentor_cache_size
+    
+    @property
+    def mentor_cache_max_history(self) -> int:
+        """Get the longest conversation (in messages) eligible for the cache."""
+        return self._snapshot.mentor_cache_max_history
+    
+    # ==========================================================================
+    # Session Configuration
+    # ==========================================================================
+    
+    @property
+    def session_store_size(self) -> int:
+        """Get the max number of Mentor sessions kept in memory."""
+        return self._snapshot.session_store_size
+    
+    @property
+    def session_ttl(self) -> int:
+        """Get how long an idle Mentor session is kept, in seconds."""
+        return self._snapshot.session_ttl
+    
+    @property
+    def session_max_messages(self) -> int:
+        """Get the max number of messages kept per session."""
+        return self._snapshot.session_max_messages
+    
+    @property
+    def session_store_path(self) -> Optional[str]:
+        """Get the SQLite file evicted sessions spill to (None = memory only)."""
+        return self._snapshot.session_store_path
+    
+    # ==========================================================================
+    # Conversation History Configuration
+    # ==========================================================================
+    
+    @property
+    def history_window_enabled(self) -> bool:
+        """Check if long Mentor conversations are windowed with a summary."""
+        return self._snapshot.history_window_enabled
+    
+    @property
+    def history_token_budget(self) -> int:
+        """Get the default prompt token budget (system prompt + history)."""
+        return self._snapshot.history_token_budget
+    
+    @property
+    def history_model_budgets(self) -> Dict[str, int]:
+        """Get per-model prompt token budget overrides."""
+        return self._snapshot.history_model_budgets
+    
+    @property
+    def history_summary_tokens(self) -> int:
+        """Get the token allowance for the rolling summary."""
+        return self._snapshot.history_summary_tokens
+    
+    @property
+    def history_summary_cache_size(self) -> int:
+        """Get the max number of cached conversation summaries."""
+        return self._snapshot.history_summary_cache_size
+    
+    @property
+    def history_summary_model(self) -> Optional[str]:
+        """Get the summary model override (None = provider's cheap default)."""
+        return self._snapshot.history_summary_model
+    
+    # ==========================================================================
+    # Upstream Call Configuration
+    # ==========================================================================
+    
+    @property
+    def singleflight_enabled(self) -> bool:
+        """Check if identical concurrent provider calls are coalesced."""
+        return self._snapshot.singleflight_enabled
+    
+    @property
+    def batch_max_items(self) -> int:
+        """Get the max number of items accepted by /analyze/batch."""
+        return self._snapshot.batch_max_items
+    
+    @property
+    def batch_concurrency(self) -> int:
+        """Get how many batch items are analyzed concurrently."""
+        return self._snapshot.batch_concurrency
+    
+    @property
+    def hedge_enabled(self) -> bool:
+        """Check if slow primary calls are hedged to a secondary provider (opt-in)."""
+        return self._snapshot.hedge_enabled
+    
+    @property
+    def hedge_provider(self) -> str:
+        """Get the secondary provider for hedged calls (default: the other one)."""
+        if self._snapshot.hedge_provider:
+            return self._snapshot.hedge_provider
+        return "groq" if self._snapshot.active_provider == "gemini" else "gemini"
+    
+    @property
+    def hedge_model(self) -> Optional[str]:
+        """Get the secondary model for hedged calls (None = provider default)."""
+        return self._snapshot.hedge_model
+    
+    @property
+    def hedge_percentile(self) -> float:
+        """Get the primary latency percentile used as the hedge delay."""
+        return self._snapshot.hedge_percentile
+    
+    @property
+    def hedge_initial_delay_ms(self) -> int:
+        """Get the hedge delay used until enough latencies are observed."""
+        return self._snapshot.hedge_initial_delay_ms
+    
+    @property
+    def hedge_min_delay_ms(self) -> int:
+        """Get the lower bound for the hedge delay."""
+        return self._snapshot.hedge_min_delay_ms
+    
+    @property
+    def hedge_max_workers(self) -> int:
+        """Get the size of the thread pool running sync primary calls."""
+        return self._snapshot.hedge_max_workers
+    
+    @property
+    def hedge_max_in_flight(self) -> int:
+        """Get the max secondary (hedge) calls in flight; past it, nothing is hedged."""
+        return self._snapshot.hedge_max_in_flight
+    
+    @property
+    def breaker_enabled(self) -> bool:
+        """Check if provider calls go through per-provider circuit breakers."""
+        return self._snapshot.breaker_enabled
+    
+    @property
+    def breaker_failover(self) -> bool:
+        """Check if an open circuit routes to the secondary provider (HEDGE_PROVIDER)."""
+        return self._snapshot.breaker_failover
+    
+    @property
+    def breaker_failure_rate(self) -> float:
+        """Get the failure rate (0-1) that opens a circuit."""
+        return self._snapshot.breaker_failure_rate
+    
+    @property
+    def breaker_slow_call_ms(self) -> int:
+        """Get the latency above which a call counts as slow."""
+        return self._snapshot.breaker_slow_call_ms
+    
+    @property
+    def breaker_slow_call_rate(self) -> float:
+        """Get the slow-call rate (0-1) that opens a circuit."""
+        return self._snapshot.breaker_slow_call_rate
+    
+    @property
+    def breaker_min_calls(self) -> int:
+        """Get the calls needed in the window before a circuit can open."""
+        return self._snapshot.breaker_min_calls
+    
+    @property
+    def breaker_window_seconds(self) -> float:
+        """Get the sliding window over which rates are computed."""
+        return self._snapshot.breaker_window_seconds
+    
+    @property
+    def breaker_open_seconds(self) -> float:
+        """Get how long a circuit stays open before probing."""
+        return self._snapshot.breaker_open_seconds
+    
+    @property
+    def breaker_half_open_probes(self) -> int:
+        """Get the successful probes needed to close a circuit."""
+        return self._snapshot.breaker_half_open_probes
+    
+    @property
+    def provider_timeout_ms(self) -> int:
+        """Get the longest any single provider call may take."""
+        return self._snapshot.provider_timeout_ms
+    
+    @property
+    def concept_json_mode(self) -> bool:
+        """Check if Concept Mirror calls request structured JSON output."""
+        return self._snapshot.concept_json_mode
+    
+    @property
+    def retry_enabled(self) -> bool:
+        """Check if transient provider errors (429/5xx) are retried."""
+        return self._snapshot.retry_enabled
+    
+    @property
+    def retry_max_attempts(self) -> int:
+        """Get the max attempts per provider call, including the first."""
+        return self._snapshot.retry_max_attempts
+    
+    @property
+    def retry_base_delay_ms(self) -> int:
+        """Get the backoff before the first retry (doubles per attempt)."""
+        return self._snapshot.retry_base_delay_ms
+    
+    @property
+    def retry_max_delay_ms(self) -> int:
+        """Get the cap on the jittered backoff."""
+        return self._snapshot.retry_max_delay_ms
+    
+    @property
+    def retry_max_wait_ms(self) -> int:
+        """Get the longest provider-requested wait (Retry-After) worth retrying after."""
+        return self._snapshot.retry_max_wait_ms
+    
+    @property
+    def rate_limit_enabled(self) -> bool:
+        """Check if outbound calls are paced to the provider's quotas."""
+        return self._snapshot.rate_limit_enabled
+    
+    @property
+    def rate_limit_requests_per_minute(self) -> int:
+        """Get the request quota assumed until the provider reports one (0 = none)."""
+        return self._snapshot.rate_limit_requests_per_minute
+    
+    @property
+    def rate_limit_tokens_per_minute(self) -> int:
+        """Get the token quota assumed until the provider reports one (0 = none)."""
+        return self._snapshot.rate_limit_tokens_per_minute
+    
+    @property
+    def rate_limit_max_wait_ms(self) -> int:
+        """Get the longest a call may queue for quota."""
+        return self._snapshot.rate_limit_max_wait_ms
+    
+    @property
+    def metrics_enabled(self) -> bool:
+        """Check if request and provider metrics are recorded for /metrics."""
+        return self._snapshot.metrics_enabled
+    
+    @property
+    def usage_ledger_enabled(self) -> bool:
+        """Check if token usage is recorded per endpoint/model/topic for /usage."""
+        return self._snapshot.usage_ledger_enabled
+    
+    @property
+    def usage_ledger_bucket_seconds(self) -> int:
+        """Get the time resolution of the usage ledger."""
+        return self._snapshot.usage_ledger_bucket_seconds
+    
+    @property
+    def usage_ledger_retention_hours(self) -> int:
+        """Get how long usage ledger rows are kept."""
+        return self._snapshot.usage_ledger_retention_hours
+    
+    @property
+    def usage_ledger_max_rows(self) -> int:
+        """Get the row cap of the usage ledger (further topics count as "(other)")."""
+        return self._snapshot.usage_ledger_max_rows
+    
+    # ==========================================================================
+    # Tracing and Logging Configuration
+    # ==========================================================================
+    
+    @property
+    def tracing_enabled(self) -> bool:
+        """Check if requests are traced (spans and Server-Timing)."""
+        return self._snapshot.tracing_enabled
+    
+    @property
+    def trace_sample_rate(self) -> float:
+        """Get the fraction of traces exported (0.0 - 1.0)."""
+        return self._snapshot.trace_sample_rate
+    
+    @property
+    def trace_exporter(self) -> str:
+        """Get where sampled traces go: "none", "log" or "otlp"."""
+        return self._snapshot.trace_exporter
+    
+    @property
+    def trace_otlp_endpoint(self) -> str:
+        """Get the OTLP/HTTP traces endpoint of the collector."""
+        return self._snapshot.trace_otlp_endpoint
+    
+    @property
+    def trace_service_name(self) -> str:
+        """Get the service.name reported with exported spans."""
+        return self._snapshot.trace_service_name
+    
+    @property
+    def server_timing_enabled(self) -> bool:
+        """Check if responses carry a Server-Timing header."""
+        return self._snapshot.server_timing_enabled
+    
+    @property
+    def log_level(self) -> str:
+        """Get the level of the application log (e.g. "INFO")."""
+        return self._snapshot.log_level
+    
+    @property
+    def log_format(self) -> str:
+        """Get the log record format: "text" or "json"."""
+        return self._snapshot.log_format
+    
+    # ==========================================================================
+    # Deadline Configuration
+    # ==========================================================================
+    
+    @property
+    def deadline_default_ms(self) -> int:
+        """Get the request deadline for routes without an override."""
+        return self._snapshot.deadline_default_ms
+    
+    @property
+    def deadline_max_ms(self) -> int:
+        """Get the longest deadline a client may ask for via header."""
+        return self._snapshot.deadline_max_ms
+    
+    @property
+    def deadline_routes(self) -> Dict[str, int]:
+        """Get per-route deadline overrides, keyed by URL rule."""
+        return self._snapshot.deadline_routes
+    
+    # ==========================================================================
+    # Admission Control Configuration
+    # ==========================================================================
+    
+    @property
+    def admission_enabled(self) -> bool:
+        """Check if AI endpoints shed load past their limits."""
+        return self._snapshot.admission_enabled
+    
+    @property
+    def admission_client_rpm(self) -> int:
+        """Get the requests per minute allowed per client (0 = unlimited)."""
+        return self._snapshot.admission_client_rpm
+    
+    @property
+    def admission_client_burst(self) -> int:
+        """Get the burst size of the per-client token bucket."""
+        return self._snapshot.admission_client_burst
+    
+    @property
+    def admission_trust_proxy(self) -> bool:
+        """Check if clients are identified by X-Forwarded-For."""
+        return self._snapshot.admission_trust_proxy
+    
+    @property
+    def admission_max_in_flight(self) -> int:
+        """Get the in-flight request cap per endpoint."""
+        return self._snapshot.admission_max_in_flight
+    
+    @property
+    def admission_route_limits(self) -> Dict[str, int]:
+        """Get per-route in-flight caps, keyed by URL rule."""
+        return self._snapshot.admission_route_limits
+    
+    @property
+    def admission_max_queue(self) -> int:
+        """Get how many requests may wait for an in-flight slot per endpoint."""
+        return self._snapshot.admission_max_queue
+    
+    @property
+    def admission_queue_timeout_ms(self) -> int:
+        """Get the longest a request waits for an in-flight slot."""
+        return self._snapshot.admission_queue_timeout_ms
+    
+    # ==========================================================================
+    # Fake Provider Configuration
+    # ==========================================================================
+    
+    @property
+    def fake_ttft_ms(self) -> int:
+        """Get the fake provider's mean time to first token."""
+        return self._snapshot.fake_ttft_ms
+    
+    @property
+    def fake_ttft_jitter_ms(self) -> int:
+        """Get the standard deviation of the fake time to first token."""
+        return self._snapshot.fake_ttft_jitter_ms
+    
+    @property
+    def fake_tokens_per_second(self) -> float:
+        """Get the fake generation speed (0 = whole answer at once)."""
+        return self._snapshot.fake_tokens_per_second
+    
+    @property
+    def fake_response_tokens(self) -> int:
+        """Get the median fake response length in tokens."""
+        return self._snapshot.fake_response_tokens
+    
+    @property
+    def fake_response_tokens_sigma(self) -> float:
+        """Get the spread (log-normal sigma) of fake response lengths."""
+        return self._snapshot.fake_response_tokens_sigma
+    
+    @property
+    def fake_error_rate(self) -> float:
+        """Get the fraction of fake calls that fail with a 503."""
+        return self._snapshot.fake_error_rate
+    
+    @property
+    def fake_rate_limit_rate(self) -> float:
+        """Get the fraction of fake calls that fail with a 429."""
+        return self._snapshot.fake_rate_limit_rate
+    
+    @property
+    def fake_retry_after_ms(self) -> int:
+        """Get the Retry-After sent with fake 429s."""
+        return self._snapshot.fake_retry_after_ms
+    
+    @property
+    def fake_seed(self) -> Optional[int]:
+        """Get the fake provider's seed (None = different every run)."""
+        return self._snapshot.fake_seed
+    
+    # ==========================================================================
+    # Reload Configuration
+    # ==========================================================================
+    
+    @property
+    def admin_token(self) -> Optional[str]:
+        """Get the token required by admin endpoints (None disables them)."""
+        return self._snapshot.admin_token
+    
+    @property
+    def env_watch_interval(self) -> float:
+        """Get the .env polling interval in seconds (0 disables the watcher)."""
+        return self._snapshot.env_watch_interval
+    
+    # ==========================================================================
+    # Hot Reload
+    # ==========================================================================
+    
+    def on_reload(self, listener: ReloadListener) -> None:
+        """
+        Register a callback to run after each reload.
+        
+        Args:
+            listener: Called with (old_snapshot, new_snapshot).
+        """
+        with self._reload_lock:
+            self._listeners.append(listener)
+    
+    def reload(self) -> List[str]:
+        """
+        Re-read the .env file and environment and swap in a new snapshot.
+        
+        Values in the .env file take precedence over the process environment
+        on reload, so editing the file is enough to change a setting; a key
+        deleted from the file goes back to its process value (or unset).
+        
+        Returns:
+            Names of the settings that changed.
+        """
+        # Imported here (logs imports this module), and before taking the
+        # lock: importing logs registers a reload listener
+        from logs import get_logger
+        
+        with self._reload_lock:
+            _load_env_file(override=True)
+            
+            old = self._snapshot
+            new = ConfigSnapshot.from_env()
+            self._snapshot = new
+            
+            changed = new.changed_fields(old)
+            if changed:
+                log = get_logger("config")
+                
+                log.info(f"Reloaded, changed: {', '.join(changed)}")
+                for listener in list(self._listeners):
+                    try:
+                        listener(old, new)
+                    except Exception as e:
+                        log.warning(f"Reload listener failed: {e}")
+            return changed
+    
+    def install_reload_signal(self) -> bool:
+        """
+        Reload the configuration on SIGHUP.
+        
+        Only possible from the main thread on platforms with SIGHUP; use it
+        when running the built-in server (process managers like gunicorn use
+        SIGHUP themselves).
+        
+        Returns:
+            True if the handler was installed.
+        """
+        if not hasattr(signal, "SIGHUP"):
+            return False
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+        return True
+    
+    def start_env_watcher(self) -> bool:
+        """
+        Start a daemon thread that reloads when the .env file changes.
+        
+        Polls the file's mtime every ENV_WATCH_INTERVAL seconds. Does nothing
+        if the interval is 0, there is no .env file, or it already runs.
+        
+        Returns:
+            True if a watcher is running.
+        """
+        interval = self.env_watch_interval
+        if interval <= 0 or ENV_FILE is None:
+            return False
+        
+        with self._reload_lock:
+            if self._watcher is not None:
+                return True
+            self._watcher = threading.Thread(
+                target=self._watch_env_file,
+                args=(ENV_FILE,),
+                name="config-env-watcher",
+                daemon=True,
+            )
+            self._watcher.start()
+        return True
+    
+    def _watch_env_file(self, path: Path) -> None:
+        """Watcher loop: reload whenever the .env mtime changes."""
+        import time
+        
+        def mtime() -> Optional[float]:
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return None
+        
+        last = mtime()
+        while True:
+            time.sleep(self.env_watch_interval or 1.0)
+            current = mtime()
+            if current is not None and current != last:
+                last = current
+                self.reload()
     
     # ==========================================================================
     # Utility Methods
@@ -112,15 +1087,57 @@ class Config:
     
     def to_dict(self) -> dict:
         """Export configuration as dictionary (without sensitive keys)."""
+        snapshot = self._snapshot
         return {
-            "active_provider": self.active_provider,
-            "active_model": self.active_model,
-            "has_google_api_key": self.has_api_key("gemini"),
-            "has_groq_api_key": self.has_api_key("groq"),
-            "flask_host": self.flask_host,
-            "flask_port": self.flask_port,
-            "flask_debug": self.flask_debug,
-            "demo_mode": self.demo_mode,
+            "active_provider": snapshot.active_provider,
+            "active_model": snapshot.active_model,
+            "has_google_api_key": snapshot.has_google_api_key,
+            "has_groq_api_key": snapshot.has_groq_api_key,
+            "flask_host": snapshot.flask_host,
+            "flask_port": snapshot.flask_port,
+            "flask_debug": snapshot.flask_debug,
+            "demo_mode": snapshot.demo_mode,
+            "provider_preload": snapshot.provider_preload,
+            "concept_cache_enabled": snapshot.concept_cache_enabled,
+            "concept_cache_size": snapshot.concept_cache_size,
+            "concept_cache_ttl": snapshot.concept_cache_ttl,
+            "mentor_cache_enabled": snapshot.mentor_cache_enabled,
+            "mentor_cache_threshold": snapshot.mentor_cache_threshold,
+            "session_store_size": snapshot.session_store_size,
+            "session_ttl": snapshot.session_ttl,
+            "history_window_enabled": snapshot.history_window_enabled,
+            "history_token_budget": snapshot.history_token_budget,
+            "singleflight_enabled": snapshot.singleflight_enabled,
+            "batch_max_items": snapshot.batch_max_items,
+            "batch_concurrency": snapshot.batch_concurrency,
+            "hedge_enabled": snapshot.hedge_enabled,
+            "hedge_provider": self.hedge_provider,
+            "hedge_model": snapshot.hedge_model,
+            "breaker_enabled": snapshot.breaker_enabled,
+            "provider_timeout_ms": snapshot.provider_timeout_ms,
+            "concept_json_mode": snapshot.concept_json_mode,
+            "retry_enabled": snapshot.retry_enabled,
+            "retry_max_attempts": snapshot.retry_max_attempts,
+            "rate_limit_enabled": snapshot.rate_limit_enabled,
+            "metrics_enabled": snapshot.metrics_enabled,
+            "usage_ledger_enabled": snapshot.usage_ledger_enabled,
+            "usage_ledger_bucket_seconds": snapshot.usage_ledger_bucket_seconds,
+            "usage_ledger_retention_hours": snapshot.usage_ledger_retention_hours,
+            "usage_ledger_max_rows": snapshot.usage_ledger_max_rows,
+            "tracing_enabled": snapshot.tracing_enabled,
+            "trace_sample_rate": snapshot.trace_sample_rate,
+            "trace_exporter": snapshot.trace_exporter,
+            "log_level": snapshot.log_level,
+            "log_format": snapshot.log_format,
+            "deadline_default_ms": snapshot.deadline_default_ms,
+            "deadline_routes": snapshot.deadline_routes,
+            "admission_enabled": snapshot.admission_enabled,
+            "admission_max_in_flight": snapshot.admission_max_in_flight,
+            "fake_ttft_ms": snapshot.fake_ttft_ms,
+            "fake_tokens_per_second": snapshot.fake_tokens_per_second,
+            "fake_error_rate": snapshot.fake_error_rate,
+            "fake_rate_limit_rate": snapshot.fake_rate_limit_rate,
+            "fake_seed": snapshot.fake_seed,
         }
     
     def __repr__(self) -> str:
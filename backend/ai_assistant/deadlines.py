@@ -0,0 +1,203 @@
+"""
+End-to-end request deadlines.
+
+Each endpoint sets a deadline for its request (per-route default, or the
+client's X-Request-Deadline-Ms header). The deadline lives in a context
+variable, so it follows the request through the client wrappers, thread
+pools (run with a copy of the caller's context) and asyncio tasks down to
+the provider SDK calls, which get `timeout=` set to the time that's left.
+
+When the deadline passes, DeadlineExceeded is raised instead of returning
+a demo fallback, and the endpoint answers 504 with outcome
+"deadline_exceeded", so blown deadlines are counted, not hidden.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from config import config
+
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Absolute time.monotonic() deadline of the current request, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the work finished."""
+    
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message)
+
+
+# =============================================================================
+# DEADLINE SCOPE
+# =============================================================================
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """
+    Set the current deadline to `seconds` from now (None clears it).
+    
+    Returns:
+        Token for reset_deadline().
+    """
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    """Restore the deadline that was active before set_deadline()."""
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Run a block with a deadline `seconds` from now."""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def call_timeout() -> float:
+    """
+    Timeout for an upstream call, in seconds.
+    
+    The time left before the deadline, capped by PROVIDER_TIMEOUT_MS so no
+    call waits forever even without a deadline.
+    
+    Raises:
+        DeadlineExceeded: If there is no time left to make the call.
+    """
+    limit = config.provider_timeout_ms / 1000.0
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(left, limit)
+
+
+# =============================================================================
+# REQUEST DEADLINES
+# =============================================================================
+
+def request_deadline(route: Optional[str], header: Optional[str] = None) -> float:
+    """
+    Deadline in seconds for a request.
+    
+    Args:
+        route: The matched URL rule (e.g. "/analyze/batch").
+        header: Value of the X-Request-Deadline-Ms header, if sent.
+    """
+    limit_ms = config.deadline_routes.get(route or "", config.deadline_default_ms)
+    if header:
+        try:
+            # A client can ask for less time than the route allows, or more
+            # up to DEADLINE_MAX_MS
+            limit_ms = min(max(int(header), 1), config.deadline_max_ms)
+        except ValueError:
+            pass
+    return limit_ms / 1000.0
+
+
+def first_chunk_deadline(chunks: Iterator[str], route: Optional[str] = None) -> Iterator[str]:
+    """
+    Apply the current deadline to a stream until its first chunk.
+    
+    A stream that has started keeps the client waiting by design, so only
+    the time to the first chunk is bounded. Wrap the generator *before*
+    the request scope ends; the deadline is captured here.
+    
+    Args:
+        chunks: The provider's chunk stream.
+        route: Route a blown deadline is counted against.
+    """
+    deadline = _deadline.get()
+    
+    def generate() -> Iterator[str]:
+        token = _deadline.set(deadline)
+        try:
+            iterator = iter(chunks)
+            try:
+                first = next(iterator)
+            except StopIteration:
+                return
+            except DeadlineExceeded:
+                record_deadline_exceeded(route)
+                raise
+        finally:
+            _deadline.reset(token)
+        yield first
+        yield from iterator
+    
+    return generate()
+
+
+def afirst_chunk_deadline(
+    chunks: AsyncIterator[str],
+    route: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Async version of first_chunk_deadline()."""
+    deadline = _deadline.get()
+    
+    async def generate() -> AsyncIterator[str]:
+        iterator = chunks.__aiter__()
+        token = _deadline.set(deadline)
+        try:
+            try:
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            except DeadlineExceeded:
+                record_deadline_exceeded(route)
+                raise
+        finally:
+            _deadline.reset(token)
+        yield first
+        async for chunk in iterator:
+            yield chunk
+    
+    return generate()
+
+
+# =============================================================================
+# OUTCOME COUNTERS
+# =============================================================================
+
+_exceeded: Dict[str, int] = {}
+_exceeded_lock = threading.Lock()
+
+
+def record_deadline_exceeded(route: Optional[str]) -> None:
+    """Count a request that ended with a blown deadline."""
+    with _exceeded_lock:
+        _exceeded[route or "unknown"] = _exceeded.get(route or "unknown", 0) + 1
+
+
+def deadline_stats() -> Dict[str, int]:
+    """Blown deadlines per route, for /health."""
+    with _exceeded_lock:
+        return dict(_exceeded)
@@ -5,8 +5,8 @@ Provides mock responses when API keys are not configured or when
 demo mode is enabled. Ported from React frontend geminiService.js.
 """
 
-import re
-from typing import List, Dict, Any
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple
 
 
 # =============================================================================
@@ -20,7 +20,7 @@ def get_mentor_demo_response(messages: List[Dict[str, str]], topic: str) -> str:
     Args:
         messages: List of conversation messages with 'role' and 'content' keys.
         topic: The topic being discussed.
-        
+    
     Returns:
         A mock mentor response string.
     """
@@ -89,6 +89,123 @@ Just let me know!"""
 # CONCEPT MIRROR MODE DEMO RESPONSES
 # =============================================================================
 
+# Phrases that signal each trait of an explanation, matched case-insensitively
+# anywhere in the text (so "but" also matches "attribute", as it always has)
+CONCEPT_FEATURES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("has_examples", ("for example", "e.g.", "such as", "like when", "consider", "imagine")),
+    ("has_edge_cases", ("edge case", "corner case", "exception", "special case", "however", "but", "unless")),
+    ("is_vague", ("kind of", "sort of", "basically", "probably", "maybe", "i think", "something like")),
+    ("is_confident", ("always", "never", "must", "definitely", "certainly", "obviously")),
+    ("has_technical_terms", ("o(", "complexity", "algorithm", "data structure", "time", "space", "memory")),
+    ("has_why", ("because", "reason", "purpose", "in order to", "so that")),
+    ("has_how", ("step", "first", "then", "next", "process", "procedure")),
+)
+
+FEATURE_NAMES: Tuple[str, ...] = tuple(name for name, _ in CONCEPT_FEATURES)
+
+# (bit, phrases) per feature, in FEATURE_NAMES order
+_FEATURE_PHRASES = tuple((1 << i, phrases) for i, (_, phrases) in enumerate(CONCEPT_FEATURES))
+
+# Non-ASCII characters that re.IGNORECASE matches to an ASCII letter. str.lower()
+# leaves "ſ" and "ı" alone and turns "İ" into "i" + a combining dot, and
+# str.casefold() folds many more ("ß", "ﬁ"), so neither alone matches like
+# the old regexes did.
+_IGNORECASE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+def _fold(text: str) -> str:
+    """Lowercase `text` the way re.IGNORECASE compares it with the ASCII phrases."""
+    if text.isascii():
+        return text.lower()
+    return text.translate(_IGNORECASE_FOLD).lower()
+
+
+def _feature_mask(text: str) -> int:
+    """Bitmask of the features whose phrases occur in folded `text`."""
+    mask = 0
+    for bit, phrases in _FEATURE_PHRASES:
+        for phrase in phrases:
+            if phrase in text:
+                mask |= bit
+                break
+    return mask
+
+
+def extract_concept_features(explanation: str) -> Tuple[int, int]:
+    """
+    Extract the Concept Mirror features of an explanation.
+    
+    The text is folded once and every phrase is a plain substring test,
+    stopping at each feature's first hit. (CPython's substring search is
+    far cheaper than the IGNORECASE regex scans this replaces, and than one
+    combined overlapping regex.)
+    
+    Args:
+        explanation: The user's explanation of the concept.
+    
+    Returns:
+        (mask, word_count), where bit i of mask is set when the feature
+        FEATURE_NAMES[i] was found.
+    """
+    return _feature_mask(_fold(explanation)), len(explanation.split())
+
+
+def feature_flags(mask: int) -> Dict[str, bool]:
+    """Expand a feature bitmask into {feature name: present}."""
+    return {name: bool(mask & (1 << i)) for i, name in enumerate(FEATURE_NAMES)}
+
+
+class ConceptFeatureMatrix:
+    """
+    Features of many explanations, one row per explanation.
+    
+    Stored as two flat arrays (a byte of feature bits and a word count per
+    row), so thousands of rows take a few kilobytes.
+    """
+    
+    __slots__ = ("masks", "word_counts")
+    
+    def __init__(self, masks: "array[int]", word_counts: "array[int]"):
+        self.masks = masks
+        self.word_counts = word_counts
+    
+    def __len__(self) -> int:
+        return len(self.masks)
+    
+    def row(self, index: int) -> Dict[str, bool]:
+        """The feature flags of one explanation."""
+        return feature_flags(self.masks[index])
+    
+    def column(self, name: str) -> List[bool]:
+        """Whether each explanation has the feature `name`."""
+        bit = 1 << FEATURE_NAMES.index(name)
+        return [bool(mask & bit) for mask in self.masks]
+    
+    def totals(self) -> Dict[str, int]:
+        """How many explanations have each feature."""
+        return {name: sum(self.column(name)) for name in FEATURE_NAMES}
+
+
+def extract_concept_features_batch(explanations: Iterable[str]) -> ConceptFeatureMatrix:
+    """
+    Extract the Concept Mirror features of many explanations at once.
+    
+    Args:
+        explanations: The explanations to analyze.
+    
+    Returns:
+        A ConceptFeatureMatrix with one row per explanation, in order.
+    """
+    masks = array("B")
+    word_counts = array("I")
+    feature_mask = _feature_mask
+    fold = _fold
+    for explanation in explanations:
+        masks.append(feature_mask(fold(explanation)))
+        word_counts.append(len(explanation.split()))
+    return ConceptFeatureMatrix(masks, word_counts)
+
+
 def get_concept_mirror_demo_response(concept_name: str, explanation: str) -> Dict[str, Any]:
     """
     Generate a demo analysis response for Concept Mirror Mode.
@@ -96,51 +213,35 @@ def get_concept_mirror_demo_response(concept_name: str, explanation: str) -> Dic
     Args:
         concept_name: The name of the concept being explained.
         explanation: The user's explanation of the concept.
-        
+    
     Returns:
         A dictionary matching the Concept Mirror JSON structure.
     """
-    lower_explanation = explanation.lower()
-    word_count = len(explanation.split())
-    
-    # Pattern detection
-    patterns = {
-        "has_examples": bool(re.search(
-            r"for example|e\.g\.|such as|like when|consider|imagine", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "has_edge_cases": bool(re.search(
-            r"edge case|corner case|exception|special case|however|but|unless", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "is_vague": bool(re.search(
-            r"kind of|sort of|basically|probably|maybe|I think|something like", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "is_confident": bool(re.search(
-            r"always|never|must|definitely|certainly|obviously", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "has_technical_terms": bool(re.search(
-            r"O\(|complexity|algorithm|data structure|time|space|memory", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "has_why": bool(re.search(
-            r"because|reason|purpose|in order to|so that", 
-            explanation, 
-            re.IGNORECASE
-        )),
-        "has_how": bool(re.search(
-            r"steps?|first|then|next|process|procedure", 
-            explanation, 
-            re.IGNORECASE
-        )),
-    }
+    mask, word_count = extract_concept_features(explanation)
+    return _build_concept_mirror_demo_response(concept_name, mask, word_count)
+
+
+def get_concept_mirror_demo_responses(requests: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Batch version of get_concept_mirror_demo_response().
+    
+    Args:
+        requests: (concept_name, explanation) pairs.
+    
+    Returns:
+        One Concept Mirror dictionary per pair, in order.
+    """
+    requests = list(requests)
+    features = extract_concept_features_batch(explanation for _, explanation in requests)
+    return [
+        _build_concept_mirror_demo_response(concept_name, mask, word_count)
+        for (concept_name, _), mask, word_count in zip(requests, features.masks, features.word_counts)
+    ]
+
+
+def _build_concept_mirror_demo_response(concept_name: str, mask: int, word_count: int) -> Dict[str, Any]:
+    """Build the demo analysis from an explanation's features."""
+    patterns = feature_flags(mask)
     
     understood = []
     missing = []
@@ -241,3 +342,19 @@ def get_concept_mirror_demo_response(concept_name: str, explanation: str) -> Dic
         "assumptions": assumptions[:3],  # Limit to 3 items
         "summary": summary
     }
+
+
+def get_concept_mirror_parse_error_response() -> Dict[str, Any]:
+    """
+    Fallback analysis used when a provider's output cannot be parsed.
+    
+    Returns:
+        A dictionary matching the Concept Mirror JSON structure.
+    """
+    return {
+        "understood": ["Unable to parse the analysis response properly"],
+        "missing": [],
+        "incorrect": [],
+        "assumptions": [],
+        "summary": "The analysis could not be completed. Please try again."
+    }
@@ -0,0 +1,10 @@
+"""
+Fake provider module.
+
+This module exports the FakeClient, a simulated upstream for offline load
+and latency testing, for use by the main ai_assistant package.
+"""
+
+from .client import FakeClient
+
+__all__ = ["FakeClient"]
@@ -0,0 +1,621 @@
+"""
+Fake AI provider implementation.
+
+A simulated upstream behind the regular BaseAIClient interface, selected
+with ACTIVE_PROVIDER=fake. It makes no network calls and needs no API key,
+but behaves like a real provider from the server's point of view:
+
+- latency: a time to first token (FAKE_TTFT_MS +- FAKE_TTFT_JITTER_MS),
+  then FAKE_TOKENS_PER_SECOND; streams yield token by token at that pace;
+- response size: log-normal around FAKE_RESPONSE_TOKENS, capped by the
+  request's max tokens;
+- failures: FAKE_ERROR_RATE of calls fail with 503 and FAKE_RATE_LIMIT_RATE
+  with 429 + retry-after-ms, shaped like SDK errors so retries, breakers
+  and fallbacks react to them as they would in production;
+- timeouts: a call that would outlast call_timeout() times out.
+
+Calls go through the same retries, history window, concept cache and token
+metrics as the real providers. With FAKE_SEED set, each request draws its
+behavior from a generator seeded by the seed and the request itself, so a
+repeated run sees the same latencies, lengths and failures.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Tuple
+
+from base import BaseAIClient, FallbackText, FallbackResult
+from prompts import (
+    MENTOR_SYSTEM_PROMPT,
+    CONCEPT_MIRROR_SYSTEM_PROMPT,
+    build_concept_mirror_prompt,
+)
+from demo import (
+    get_mentor_demo_response,
+    get_concept_mirror_demo_response,
+    get_concept_mirror_parse_error_response,
+)
+from cache import acache_call, lookup_concept_analysis, store_concept_analysis
+from concept_parser import parse_concept_analysis
+from config import config
+from deadlines import call_timeout, check_deadline
+from history import estimate_tokens, get_conversation_window
+from logs import get_logger
+from metrics import record_concept_parse, record_tokens
+from retry import awith_retries, with_retries
+from tracing import span
+
+log = get_logger("fake")
+
+
+# Filler vocabulary for generated text
+_WORDS = (
+    "the", "a", "function", "returns", "value", "list", "each", "element", "loop",
+    "index", "because", "so", "when", "array", "key", "recursion", "base", "case",
+    "memory", "time", "complexity", "sorted", "search", "half", "node", "tree",
+    "stack", "queue", "call", "example", "think", "about", "why", "this", "works",
+)
+
+
+class FakeAPIError(Exception):
+    """A simulated upstream error, shaped like an SDK status error."""
+    
+    def __init__(self, status_code: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.response = _FakeResponse(status_code, headers or {})
+
+
+class _FakeResponse:
+    """The parts of an HTTP response that retry.py and ratelimit.py read."""
+    
+    def __init__(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class _Plan:
+    """How one simulated call will behave."""
+    
+    __slots__ = ("ttft", "interval", "words", "failure")
+    
+    def __init__(self, ttft: float, interval: float, words: List[str], failure: Optional[int]):
+        self.ttft = ttft
+        self.interval = interval
+        self.words = words
+        self.failure = failure
+    
+    @property
+    def duration(self) -> float:
+        """Time to the last token."""
+        return self.ttft + self.interval * max(len(self.words) - 1, 0)
+
+
+class FakeClient(BaseAIClient):
+    """
+    Simulated AI client for load and latency testing.
+    
+    Thread-safe; one instance is shared by all requests like the real clients.
+    """
+    
+    DEFAULT_MODEL = "fake-model"
+    
+    # Per-request call counters kept for seeded runs
+    MAX_TRACKED_REQUESTS = 10000
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None
+    ):
+        """
+        Initialize the fake client.
+        
+        Args:
+            api_key: Ignored; the fake provider needs no key.
+            model: Model name reported in responses (default: 'fake-model').
+        """
+        super().__init__(api_key=api_key, model=model or self.DEFAULT_MODEL)
+        self._calls: "OrderedDict[str, int]" = OrderedDict()
+        self._calls_lock = threading.Lock()
+    
+    # ==========================================================================
+    # Simulation
+    # ==========================================================================
+    
+    def _rng(self, key: str) -> random.Random:
+        """
+        Random generator for one call.
+        
+        Seeded runs derive it from the seed, the request and how often the
+        request was made before, so a retry doesn't repeat the same failure
+        but a rerun of the whole workload does.
+        """
+        seed = config.fake_seed
+        if seed is None:
+            return random.Random()
+        
+        with self._calls_lock:
+            count = self._calls.pop(key, 0)
+            self._calls[key] = count + 1
+            while len(self._calls) > self.MAX_TRACKED_REQUESTS:
+                self._calls.popitem(last=False)
+        digest = hashlib.sha256(f"{seed}:{count}:{key}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+    
+    def _plan(self, key: str, max_tokens: int) -> _Plan:
+        """Draw the latency, length and outcome of a call."""
+        rng = self._rng(key)
+        
+        roll = rng.random()
+        failure = None
+        if roll < config.fake_rate_limit_rate:
+            failure = 429
+        elif roll < config.fake_rate_limit_rate + config.fake_error_rate:
+            failure = 503
+        
+        ttft = max(rng.gauss(config.fake_ttft_ms, config.fake_ttft_jitter_ms), 0.0) / 1000.0
+        length = rng.lognormvariate(math.log(config.fake_response_tokens), config.fake_response_tokens_sigma)
+        length = min(max(int(round(length)), 1), max(max_tokens, 1))
+        speed = config.fake_tokens_per_second
+        interval = 1.0 / speed if speed > 0 else 0.0
+        words = [rng.choice(_WORDS) for _ in range(length)]
+        return _Plan(ttft, interval, words, failure)
+    
+    @staticmethod
+    def _error(status: int) -> FakeAPIError:
+        if status == 429:
+            return FakeAPIError(
+                429, "Rate limit reached (simulated)",
+                {"retry-after-ms": str(config.fake_retry_after_ms)},
+            )
+        return FakeAPIError(503, "Service unavailable (simulated)")
+    
+    @staticmethod
+    def _timed_out(timeout: float) -> TimeoutError:
+        return TimeoutError(f"Fake provider timed out after {timeout:.1f}s")
+    
+    def _complete(self, key: str, prompt_tokens: int, max_tokens: int) -> str:
+        """One simulated non-streamed call: wait, then return the whole text."""
+        plan = self._plan(key, max_tokens)
+        timeout = call_timeout()
+        if plan.failure is not None:
+            time.sleep(min(plan.ttft, timeout))
+            raise self._error(plan.failure)
+        if plan.duration > timeout:
+            time.sleep(timeout)
+            raise self._timed_out(timeout)
+        time.sleep(plan.duration)
+        record_tokens("fake", self.model, prompt_tokens, len(plan.words))
+        return " ".join(plan.words)
+    
+    async def _acomplete(self, key: str, prompt_tokens: int, max_tokens: int) -> str:
+        """Async version of _complete()."""
+        plan = self._plan(key, max_tokens)
+        timeout = call_timeout()
+        if plan.failure is not None:
+            await asyncio.sleep(min(plan.ttft, timeout))
+            raise self._error(plan.failure)
+        if plan.duration > timeout:
+            await asyncio.sleep(timeout)
+            raise self._timed_out(timeout)
+        await asyncio.sleep(plan.duration)
+        record_tokens("fake", self.model, prompt_tokens, len(plan.words))
+        return " ".join(plan.words)
+    
+    def _open_stream(self, key: str, prompt_tokens: int, max_tokens: int) -> Iterator[str]:
+        """
+        One simulated streamed call: wait for the first token (or fail),
+        then return an iterator that paces the rest.
+        """
+        plan = self._plan(key, max_tokens)
+        timeout = call_timeout()
+        if plan.ttft > timeout:
+            time.sleep(timeout)
+            raise self._timed_out(timeout)
+        time.sleep(plan.ttft)
+        if plan.failure is not None:
+            raise self._error(plan.failure)
+        
+        def tokens() -> Iterator[str]:
+            for i, word in enumerate(plan.words):
+                if i:
+                    time.sleep(plan.interval)
+                yield word if i == 0 else " " + word
+            record_tokens("fake", self.model, prompt_tokens, len(plan.words))
+        
+        return tokens()
+    
+    async def _aopen_stream(self, key: str, prompt_tokens: int, max_tokens: int) -> AsyncIterator[str]:
+        """Async version of _open_stream()."""
+        plan = self._plan(key, max_tokens)
+        timeout = call_timeout()
+        if plan.ttft > timeout:
+            await asyncio.sleep(timeout)
+            raise self._timed_out(timeout)
+        await asyncio.sleep(plan.ttft)
+        if plan.failure is not None:
+            raise self._error(plan.failure)
+        
+        async def tokens() -> AsyncIterator[str]:
+            for i, word in enumerate(plan.words):
+                if i:
+                    await asyncio.sleep(plan.interval)
+                yield word if i == 0 else " " + word
+            record_tokens("fake", self.model, prompt_tokens, len(plan.words))
+        
+        return tokens()
+    
+    @staticmethod
+    def _prompt_tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+    
+    @staticmethod
+    def _key(*parts: Any) -> str:
+        return json.dumps(parts, sort_keys=True, default=str)
+    
+    # ==========================================================================
+    # Sync Interface
+    # ==========================================================================
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        """
+        Generate a simulated response.
+        
+        Args:
+            prompt: The input prompt.
+            **kwargs: max_tokens caps the response length (default 1024).
+        
+        Returns:
+            Filler text of the simulated length.
+        
+        Raises:
+            Exception: If the simulated call fails.
+        """
+        max_tokens = kwargs.get("max_tokens", 1024)
+        try:
+            return with_retries(lambda: self._complete(
+                self._key("generate", prompt), estimate_tokens(prompt), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Fake API error: {str(e)}") from e
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Generate a simulated response with context and a system prompt."""
+        parts = [part for part in (system_prompt, context, prompt) if part]
+        return self.generate_response("\n".join(parts), **kwargs)
+    
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """
+        Conduct a simulated multi-turn chat (Mentor Mode).
+        
+        Returns:
+            The simulated reply, or the demo response if the call fails.
+        """
+        window, sys_prompt = self._fit_history(messages, topic, system_prompt)
+        chat_messages = self._build_chat_messages(window, sys_prompt)
+        max_tokens = kwargs.get("max_tokens", 1024)
+        
+        try:
+            return with_retries(lambda: self._complete(
+                self._key("chat", chat_messages), self._prompt_tokens(chat_messages), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat failed: {e}")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Stream a simulated response token by token."""
+        max_tokens = kwargs.get("max_tokens", 1024)
+        try:
+            stream = with_retries(lambda: self._open_stream(
+                self._key("generate", prompt), estimate_tokens(prompt), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Fake API error: {str(e)}") from e
+        
+        yield from stream
+    
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a simulated chat reply (Mentor Mode) token by token.
+        
+        If the call fails before anything was sent, the demo response is
+        yielded instead.
+        """
+        window, sys_prompt = self._fit_history(messages, topic, system_prompt)
+        chat_messages = self._build_chat_messages(window, sys_prompt)
+        max_tokens = kwargs.get("max_tokens", 1024)
+        
+        try:
+            stream = with_retries(lambda: self._open_stream(
+                self._key("chat", chat_messages), self._prompt_tokens(chat_messages), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+            return
+        
+        yield from stream
+    
+    @span("prompt")
+    def _build_chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """Build a chat-style message list, as a real provider would send it."""
+        chat_messages = [{"role": "system", "content": system_prompt or MENTOR_SYSTEM_PROMPT}]
+        chat_messages.extend(
+            {"role": "user" if msg["role"] == "user" else "assistant", "content": msg["content"]}
+            for msg in messages
+        )
+        return chat_messages
+    
+    def _fit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Window a long conversation to the model's token budget."""
+        sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, sys_prompt
+        with span("history"):
+            return window.fit(messages, topic, sys_prompt, self.model, self._summarize)
+    
+    async def _afit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Async version of _fit_history()."""
+        sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, sys_prompt
+        with span("history"):
+            return await window.afit(messages, topic, sys_prompt, self.model, self._asummarize)
+    
+    def _summarize(self, prompt: str) -> str:
+        """Simulate a history summary."""
+        return self._complete(
+            self._key("summary", prompt), estimate_tokens(prompt), config.history_summary_tokens
+        )
+    
+    async def _asummarize(self, prompt: str) -> str:
+        """Async version of _summarize()."""
+        return await self._acomplete(
+            self._key("summary", prompt), estimate_tokens(prompt), config.history_summary_tokens
+        )
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Simulate a Concept Mirror analysis.
+        
+        Returns:
+            Dictionary with keys: understood, missing, incorrect, assumptions, summary.
+        """
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = lookup_concept_analysis(
+            "fake", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        messages = self._build_concept_messages(concept_name, user_explanation)
+        max_tokens = kwargs.get("max_tokens", 4096)
+        
+        try:
+            text = with_retries(lambda: self._complete(
+                self._key("analyze", messages), self._prompt_tokens(messages), max_tokens
+            ))
+            return self._finish_concept_analysis(cache_key, self._concept_json(text))
+        
+        except Exception as e:
+            check_deadline()
+            # Fall back to demo response on error
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
+    
+    @span("prompt")
+    def _build_concept_messages(
+        self,
+        concept_name: str,
+        user_explanation: str
+    ) -> List[Dict[str, str]]:
+        """Build the message list for a Concept Mirror analysis."""
+        return [
+            {"role": "system", "content": CONCEPT_MIRROR_SYSTEM_PROMPT},
+            {"role": "user", "content": build_concept_mirror_prompt(concept_name, user_explanation)}
+        ]
+    
+    @staticmethod
+    def _concept_json(text: str) -> str:
+        """Shape generated filler into a Concept Mirror JSON answer."""
+        words = text.split()
+        fifth = max(len(words) // 5, 1)
+        sections = [" ".join(words[i * fifth:(i + 1) * fifth]) for i in range(5)]
+        return json.dumps({
+            "understood": [sections[0]] if sections[0] else [],
+            "missing": [sections[1]] if sections[1] else [],
+            "incorrect": [sections[2]] if sections[2] else [],
+            "assumptions": [sections[3]] if sections[3] else [],
+            "summary": sections[4] or text,
+        })
+    
+    @span("parse")
+    def _finish_concept_analysis(
+        self,
+        cache_key: Optional[str],
+        text: str
+    ) -> Dict[str, Any]:
+        """Parse the simulated output and cache it, like the real providers."""
+        analysis, outcome = parse_concept_analysis(text)
+        record_concept_parse("fake", outcome)
+        if analysis is None:
+            # Return error structure if parsing fails (never cached)
+            return FallbackResult(get_concept_mirror_parse_error_response(), reason="parse_error")
+        if outcome == "ok":
+            store_concept_analysis(cache_key, analysis)
+        return analysis
+    
+    # ==========================================================================
+    # Async Interface (used by the ASGI app)
+    # ==========================================================================
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        """Async version of generate_response()."""
+        max_tokens = kwargs.get("max_tokens", 1024)
+        try:
+            return await awith_retries(lambda: self._acomplete(
+                self._key("generate", prompt), estimate_tokens(prompt), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Fake API error: {str(e)}") from e
+    
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Async version of chat()."""
+        window, sys_prompt = await self._afit_history(messages, topic, system_prompt)
+        chat_messages = self._build_chat_messages(window, sys_prompt)
+        max_tokens = kwargs.get("max_tokens", 1024)
+        
+        try:
+            return await awith_retries(lambda: self._acomplete(
+                self._key("chat", chat_messages), self._prompt_tokens(chat_messages), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat failed: {e}")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async version of analyze_concept()."""
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = await acache_call(
+            lookup_concept_analysis, "fake", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        messages = self._build_concept_messages(concept_name, user_explanation)
+        max_tokens = kwargs.get("max_tokens", 4096)
+        
+        try:
+            text = await awith_retries(lambda: self._acomplete(
+                self._key("analyze", messages), self._prompt_tokens(messages), max_tokens
+            ))
+            return await acache_call(self._finish_concept_analysis, cache_key, self._concept_json(text))
+        
+        except Exception as e:
+            check_deadline()
+            # Fall back to demo response on error
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
+    
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async version of stream_response()."""
+        max_tokens = kwargs.get("max_tokens", 1024)
+        try:
+            stream = await awith_retries(lambda: self._aopen_stream(
+                self._key("generate", prompt), estimate_tokens(prompt), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Fake API error: {str(e)}") from e
+        
+        async for text in stream:
+            yield text
+    
+    async def astream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Async version of stream_chat()."""
+        window, sys_prompt = await self._afit_history(messages, topic, system_prompt)
+        chat_messages = self._build_chat_messages(window, sys_prompt)
+        max_tokens = kwargs.get("max_tokens", 1024)
+        
+        try:
+            stream = await awith_retries(lambda: self._aopen_stream(
+                self._key("chat", chat_messages), self._prompt_tokens(chat_messages), max_tokens
+            ))
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+            return
+        
+        async for text in stream:
+            yield text
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """
+        Get information about the fake provider's simulated behavior.
+        
+        Returns:
+            Dictionary with provider, model, and simulation settings.
+        """
+        return {
+            "provider": "fake",
+            "provider_name": "Fake (simulated upstream)",
+            "model": self.model,
+            "sdk_available": True,
+            "default_model": self.DEFAULT_MODEL,
+            "ttft_ms": config.fake_ttft_ms,
+            "tokens_per_second": config.fake_tokens_per_second,
+            "error_rate": config.fake_error_rate,
+            "rate_limit_rate": config.fake_rate_limit_rate,
+            "seed": config.fake_seed,
+        }
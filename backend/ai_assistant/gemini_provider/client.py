@@ -6,9 +6,9 @@ interface, using Google's Generative AI SDK.
 """
 
 import os
-import json
-import re
-from typing import Optional, Dict, Any, List
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Tuple
 
 try:
     import google.generativeai as genai
@@ -16,15 +16,28 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
-from base import BaseAIClient
+from base import BaseAIClient, FallbackText, FallbackResult
 from prompts import (
     MENTOR_SYSTEM_PROMPT,
     CONCEPT_MIRROR_SYSTEM_PROMPT,
-    get_mentor_initial_response,
-    get_concept_mirror_acknowledgment,
     build_concept_mirror_prompt,
 )
-from demo import get_mentor_demo_response, get_concept_mirror_demo_response
+from demo import (
+    get_mentor_demo_response,
+    get_concept_mirror_demo_response,
+    get_concept_mirror_parse_error_response,
+)
+from cache import acache_call, lookup_concept_analysis, store_concept_analysis
+from concept_parser import CONCEPT_MIRROR_SCHEMA, parse_concept_analysis
+from config import config
+from deadlines import call_timeout, check_deadline
+from history import get_conversation_window
+from logs import get_logger
+from metrics import record_concept_parse, record_tokens
+from retry import awith_retries, with_retries
+from tracing import span
+
+log = get_logger("gemini")
 
 
 class GeminiClient(BaseAIClient):
@@ -38,6 +51,13 @@ class GeminiClient(BaseAIClient):
     # Default model to use if none specified
     DEFAULT_MODEL = "gemini-1.5-flash"
     
+    # Cheap, fast model used to summarize older turns of long conversations
+    SUMMARY_MODEL = "gemini-1.5-flash-8b"
+    
+    # Max GenerativeModel objects kept per client, one per (model, system prompt);
+    # per-conversation text (topic, history summary) goes in the contents instead
+    MODEL_CACHE_SIZE = 32
+    
     def __init__(
         self, 
         api_key: Optional[str] = None, 
@@ -74,6 +94,10 @@ class GeminiClient(BaseAIClient):
         
         # Initialize the generative model
         self._model = genai.GenerativeModel(self.model)
+        
+        # Models with a native system instruction, built on first use
+        self._models: "OrderedDict[tuple, genai.GenerativeModel]" = OrderedDict()
+        self._models_lock = threading.Lock()
     
     def generate_response(self, prompt: str, **kwargs) -> str:
         """
@@ -89,29 +113,21 @@ class GeminiClient(BaseAIClient):
         
         Returns:
             The generated text response.
-            
+        
         Raises:
             Exception: If the API call fails.
         """
-        # Build generation config from kwargs
-        generation_config = {}
-        
-        if "temperature" in kwargs:
-            generation_config["temperature"] = kwargs["temperature"]
-        if "max_output_tokens" in kwargs:
-            generation_config["max_output_tokens"] = kwargs["max_output_tokens"]
-        if "top_p" in kwargs:
-            generation_config["top_p"] = kwargs["top_p"]
-        if "top_k" in kwargs:
-            generation_config["top_k"] = kwargs["top_k"]
-        
         try:
-            response = self._model.generate_content(
+            response = with_retries(lambda: self._model.generate_content(
                 prompt,
-                generation_config=generation_config if generation_config else None
-            )
+                generation_config=self._build_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
+            self._record_usage(response)
             return response.text
         except Exception as e:
+            # A blown deadline is reported as such, not as a fallback
+            check_deadline()
             raise Exception(f"Gemini API error: {str(e)}") from e
     
     def generate_response_with_context(
@@ -129,7 +145,7 @@ class GeminiClient(BaseAIClient):
             context: Additional context to include.
             system_prompt: System-level instructions.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             The generated text response.
         """
@@ -163,51 +179,276 @@ class GeminiClient(BaseAIClient):
             topic: The topic being discussed.
             system_prompt: Optional system prompt override.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             The assistant's response text.
         """
-        # Use Mentor system prompt by default
-        sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
+        window, instruction, context = self._fit_history(messages, topic, system_prompt)
+        model = self._model_for(instruction)
+        contents = self._build_chat_contents(window, context)
+        
+        try:
+            response = with_retries(lambda: model.generate_content(
+                contents,
+                generation_config=self._chat_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
+            self._record_usage(response)
+            return response.text
+        except Exception as e:
+            check_deadline()
+            # Log the actual error
+            log.exception("Chat failed")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Stream a response from Gemini chunk by chunk.
+        
+        Args:
+            prompt: The input prompt to send to the model.
+            **kwargs: Same generation parameters as generate_response().
+        
+        Yields:
+            Text chunks as they arrive from the API.
+        
+        Raises:
+            Exception: If the API call fails.
+        """
+        try:
+            response = with_retries(lambda: self._model.generate_content(
+                prompt,
+                generation_config=self._build_generation_config(kwargs),
+                stream=True,
+                request_options={"timeout": call_timeout()},
+            ))
+            yield from self._iter_stream(response)
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Gemini API error: {str(e)}") from e
+    
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a multi-turn chat response (Mentor Mode) chunk by chunk.
         
-        # Build conversation contents for Gemini
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys.
+            topic: The topic being discussed.
+            system_prompt: Optional system prompt override.
+            **kwargs: Same generation parameters as chat().
+        
+        Yields:
+            Text chunks of the assistant's response. If the call fails
+            before anything was sent, the demo response is yielded instead.
+        """
+        window, instruction, context = self._fit_history(messages, topic, system_prompt)
+        model = self._model_for(instruction)
+        contents = self._build_chat_contents(window, context)
+        started = False
+        
+        try:
+            response = with_retries(lambda: model.generate_content(
+                contents,
+                generation_config=self._chat_generation_config(kwargs),
+                stream=True,
+                request_options={"timeout": call_timeout()},
+            ))
+            for text in self._iter_stream(response):
+                started = True
+                yield text
+        except Exception as e:
+            check_deadline()
+            # Once chunks have been sent we cannot swap in a demo answer
+            if started:
+                raise Exception(f"Gemini API error: {str(e)}") from e
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+    
+    def _model_for(
+        self,
+        system_instruction: Optional[str] = None,
+        model_name: Optional[str] = None
+    ) -> "genai.GenerativeModel":
+        """
+        Get a GenerativeModel for a model name and native system instruction.
+        
+        Instances are cached (LRU) and reused across calls, so the system
+        prompt is sent as a system instruction instead of extra chat turns
+        and no model object is built per request.
+        """
+        model_name = model_name or self.model
+        if system_instruction is None and model_name == self.model:
+            return self._model
+        
+        key = (model_name, system_instruction)
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            self._models[key] = model
+            while len(self._models) > self.MODEL_CACHE_SIZE:
+                self._models.popitem(last=False)
+            return model
+    
+    @staticmethod
+    @span("prompt")
+    def _build_chat_contents(messages: List[Dict[str, str]], context: str) -> List[Dict[str, Any]]:
+        """
+        Build the Gemini contents list for a Mentor Mode conversation.
+        
+        `context` (topic and history summary) leads the first user turn, or
+        gets a user turn of its own if the window starts with the model.
+        """
         contents = [
             {
-                "role": "user",
-                "parts": [{"text": sys_prompt}]
-            },
-            {
-                "role": "model",
-                "parts": [{"text": get_mentor_initial_response(topic)}]
+                "role": "user" if msg["role"] == "user" else "model",
+                "parts": [{"text": msg["content"]}]
             }
+            for msg in messages
         ]
+        if contents and contents[0]["role"] == "user":
+            contents[0]["parts"].insert(0, {"text": context})
+        else:
+            contents.insert(0, {"role": "user", "parts": [{"text": context}]})
+        return contents
+    
+    @staticmethod
+    def _mentor_context(topic: str, instruction: str, fitted_prompt: str) -> str:
+        """
+        Per-conversation context, kept out of the system instruction so the
+        cached model for the instruction is shared by every conversation.
         
-        # Add conversation history
-        for msg in messages:
-            role = "user" if msg["role"] == "user" else "model"
-            contents.append({
-                "role": role,
-                "parts": [{"text": msg["content"]}]
-            })
+        The window returns the instruction with the history summary (if any)
+        appended; that tail goes into the context with the topic.
+        """
+        return f"The learner is studying: {topic}{fitted_prompt[len(instruction):]}"
+    
+    def _fit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str, str]:
+        """
+        Window a long conversation to the model's token budget.
         
-        try:
-            response = self._model.generate_content(
-                contents,
-                generation_config={
-                    "temperature": kwargs.get("temperature", 0.8),
-                    "top_k": kwargs.get("top_k", 40),
-                    "top_p": kwargs.get("top_p", 0.95),
-                    "max_output_tokens": kwargs.get("max_output_tokens", 4096),
-                }
+        Returns:
+            (messages to send, system instruction, context for the contents).
+        """
+        instruction = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, instruction, self._mentor_context(topic, instruction, instruction)
+        with span("history"):
+            recent, fitted = window.fit(messages, topic, instruction, self.model, self._summarize)
+        return recent, instruction, self._mentor_context(topic, instruction, fitted)
+    
+    async def _afit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str, str]:
+        """Async version of _fit_history()."""
+        instruction = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, instruction, self._mentor_context(topic, instruction, instruction)
+        with span("history"):
+            recent, fitted = await window.afit(messages, topic, instruction, self.model, self._asummarize)
+        return recent, instruction, self._mentor_context(topic, instruction, fitted)
+    
+    @property
+    def _summarizer(self) -> "genai.GenerativeModel":
+        """The cheap model used for history summaries."""
+        return self._model_for(model_name=config.history_summary_model or self.SUMMARY_MODEL)
+    
+    def _summarize(self, prompt: str) -> str:
+        """Summarize older conversation turns with the cheap model."""
+        response = self._summarizer.generate_content(
+            prompt,
+            generation_config={
+                "temperature": 0.2,
+                "max_output_tokens": config.history_summary_tokens,
+            },
+            request_options={"timeout": call_timeout()},
+        )
+        self._record_usage(response, config.history_summary_model or self.SUMMARY_MODEL)
+        return response.text
+    
+    async def _asummarize(self, prompt: str) -> str:
+        """Async version of _summarize()."""
+        response = await self._summarizer.generate_content_async(
+            prompt,
+            generation_config={
+                "temperature": 0.2,
+                "max_output_tokens": config.history_summary_tokens,
+            },
+            request_options={"timeout": call_timeout()},
+        )
+        self._record_usage(response, config.history_summary_model or self.SUMMARY_MODEL)
+        return response.text
+    
+    def _record_usage(self, response: Any, model_name: Optional[str] = None) -> None:
+        """Count a response's (or a stream's last chunk's) tokens for /metrics and /usage."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            record_tokens(
+                "gemini", model_name or self.model,
+                usage.prompt_token_count, usage.candidates_token_count
             )
-            return response.text
-        except Exception as e:
-            # Log the actual error
-            print(f"[GEMINI ERROR] Chat failed: {e}")
-            import traceback
-            traceback.print_exc()
-            # Fall back to demo response on error
-            return get_mentor_demo_response(messages, topic)
+    
+    @staticmethod
+    def _build_generation_config(kwargs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build a generation config from the supported kwargs, if any."""
+        generation_config = {}
+        
+        if "temperature" in kwargs:
+            generation_config["temperature"] = kwargs["temperature"]
+        if "max_output_tokens" in kwargs:
+            generation_config["max_output_tokens"] = kwargs["max_output_tokens"]
+        if "top_p" in kwargs:
+            generation_config["top_p"] = kwargs["top_p"]
+        if "top_k" in kwargs:
+            generation_config["top_k"] = kwargs["top_k"]
+        
+        return generation_config if generation_config else None
+    
+    @staticmethod
+    def _chat_generation_config(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Mentor Mode generation config with its defaults."""
+        return {
+            "temperature": kwargs.get("temperature", 0.8),
+            "top_k": kwargs.get("top_k", 40),
+            "top_p": kwargs.get("top_p", 0.95),
+            "max_output_tokens": kwargs.get("max_output_tokens", 4096),
+        }
+    
+    def _iter_stream(self, response) -> Iterator[str]:
+        """Yield the text of each streamed Gemini chunk."""
+        last = None
+        for chunk in response:
+            last = chunk
+            # Chunks without text parts (e.g. safety metadata) raise on .text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+        # Every chunk carries the running usage; the last one has the totals
+        if last is not None:
+            self._record_usage(last)
     
     def analyze_concept(
         self,
@@ -222,62 +463,229 @@ class GeminiClient(BaseAIClient):
             concept_name: Name of the concept being explained.
             user_explanation: The user's explanation text.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             Dictionary with keys: understood, missing, incorrect, assumptions, summary.
         """
-        # Build conversation for concept analysis
-        contents = [
-            {
-                "role": "user",
-                "parts": [{"text": CONCEPT_MIRROR_SYSTEM_PROMPT}]
-            },
-            {
-                "role": "model",
-                "parts": [{"text": get_concept_mirror_acknowledgment()}]
-            },
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = lookup_concept_analysis(
+            "gemini", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        contents = self._build_concept_contents(concept_name, user_explanation)
+        
+        try:
+            response = with_retries(lambda: self._model_for(CONCEPT_MIRROR_SYSTEM_PROMPT).generate_content(
+                contents,
+                generation_config=self._concept_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
+            
+            # Parse JSON from response
+            self._record_usage(response)
+            return self._finish_concept_analysis(cache_key, response.text)
+        
+        except Exception as e:
+            check_deadline()
+            # Fall back to demo response on error
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
+    
+    @staticmethod
+    @span("prompt")
+    def _build_concept_contents(
+        concept_name: str,
+        user_explanation: str
+    ) -> List[Dict[str, Any]]:
+        """Build the Gemini contents list for a Concept Mirror analysis."""
+        # The system prompt goes in as the model's system instruction
+        return [
             {
                 "role": "user",
                 "parts": [{"text": build_concept_mirror_prompt(concept_name, user_explanation)}]
             }
         ]
+    
+    @staticmethod
+    def _concept_generation_config(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the Concept Mirror generation config with its defaults.
+        
+        Asks for JSON matching CONCEPT_MIRROR_SCHEMA unless CONCEPT_JSON_MODE
+        is off.
+        """
+        generation_config = {
+            "temperature": kwargs.get("temperature", 0.7),
+            "top_k": kwargs.get("top_k", 40),
+            "top_p": kwargs.get("top_p", 0.95),
+            "max_output_tokens": kwargs.get("max_output_tokens", 4096),
+        }
+        if config.concept_json_mode:
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = CONCEPT_MIRROR_SCHEMA
+        return generation_config
+    
+    @span("parse")
+    def _finish_concept_analysis(
+        self,
+        cache_key: Optional[str],
+        text: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Parse and validate the model output (see concept_parser.py).
         
+        Only output that was valid as sent is cached; a repaired (e.g.
+        truncated) analysis is returned but may come out whole next time.
+        """
+        analysis, outcome = parse_concept_analysis(text)
+        record_concept_parse("gemini", outcome)
+        if analysis is None:
+            log.warning(
+                "Unparseable Concept Mirror output",
+                extra={"fields": {"model": self.model, "chars": len(text or "")}},
+            )
+            # Return error structure if parsing fails (never cached)
+            return FallbackResult(get_concept_mirror_parse_error_response(), reason="parse_error")
+        if outcome == "ok":
+            store_concept_analysis(cache_key, analysis)
+        return analysis
+    
+    # ==========================================================================
+    # Async Interface (used by the ASGI app)
+    # ==========================================================================
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        """Async version of generate_response()."""
         try:
-            response = self._model.generate_content(
+            response = await awith_retries(lambda: self._model.generate_content_async(
+                prompt,
+                generation_config=self._build_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
+            self._record_usage(response)
+            return response.text
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Gemini API error: {str(e)}") from e
+    
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Async version of chat()."""
+        window, instruction, context = await self._afit_history(messages, topic, system_prompt)
+        model = self._model_for(instruction)
+        contents = self._build_chat_contents(window, context)
+        
+        try:
+            response = await awith_retries(lambda: model.generate_content_async(
                 contents,
-                generation_config={
-                    "temperature": kwargs.get("temperature", 0.7),
-                    "top_k": kwargs.get("top_k", 40),
-                    "top_p": kwargs.get("top_p", 0.95),
-                    "max_output_tokens": kwargs.get("max_output_tokens", 4096),
-                }
-            )
+                generation_config=self._chat_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
+            self._record_usage(response)
+            return response.text
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat failed: {e}")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async version of analyze_concept()."""
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = await acache_call(
+            lookup_concept_analysis, "gemini", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        contents = self._build_concept_contents(concept_name, user_explanation)
+        
+        try:
+            response = await awith_retries(lambda: self._model_for(CONCEPT_MIRROR_SYSTEM_PROMPT).generate_content_async(
+                contents,
+                generation_config=self._concept_generation_config(kwargs),
+                request_options={"timeout": call_timeout()},
+            ))
             
             # Parse JSON from response
-            return self._parse_concept_mirror_response(response.text)
-            
+            self._record_usage(response)
+            return await acache_call(self._finish_concept_analysis, cache_key, response.text)
+        
         except Exception as e:
+            check_deadline()
             # Fall back to demo response on error
-            return get_concept_mirror_demo_response(concept_name, user_explanation)
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
     
-    def _parse_concept_mirror_response(self, text: str) -> Dict[str, Any]:
-        """Parse JSON from Concept Mirror response."""
-        # Try to extract JSON from the response
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            try:
-                return json.loads(json_match.group(0))
-            except json.JSONDecodeError:
-                pass
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async version of stream_response()."""
+        try:
+            response = await awith_retries(lambda: self._model.generate_content_async(
+                prompt,
+                generation_config=self._build_generation_config(kwargs),
+                stream=True,
+                request_options={"timeout": call_timeout()},
+            ))
+            async for text in self._aiter_stream(response):
+                yield text
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Gemini API error: {str(e)}") from e
+    
+    async def astream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Async version of stream_chat()."""
+        window, instruction, context = await self._afit_history(messages, topic, system_prompt)
+        model = self._model_for(instruction)
+        contents = self._build_chat_contents(window, context)
+        started = False
         
-        # Return error structure if parsing fails
-        return {
-            "understood": ["Unable to parse the analysis response properly"],
-            "missing": [],
-            "incorrect": [],
-            "assumptions": [],
-            "summary": "The analysis could not be completed. Please try again."
-        }
+        try:
+            response = await awith_retries(lambda: model.generate_content_async(
+                contents,
+                generation_config=self._chat_generation_config(kwargs),
+                stream=True,
+                request_options={"timeout": call_timeout()},
+            ))
+            async for text in self._aiter_stream(response):
+                started = True
+                yield text
+        except Exception as e:
+            check_deadline()
+            # Once chunks have been sent we cannot swap in a demo answer
+            if started:
+                raise Exception(f"Gemini API error: {str(e)}") from e
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+    
+    async def _aiter_stream(self, response) -> AsyncIterator[str]:
+        """Yield the text of each chunk of an async Gemini stream."""
+        last = None
+        async for chunk in response:
+            last = chunk
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+        if last is not None:
+            self._record_usage(last)
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -6,23 +6,37 @@ interface, using Groq's Python SDK for ultra-fast inference.
 """
 
 import os
-import json
-import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator, AsyncIterator, Tuple
 
 try:
-    from groq import Groq
+    from groq import Groq, AsyncGroq
     GROQ_AVAILABLE = True
 except ImportError:
     GROQ_AVAILABLE = False
 
-from base import BaseAIClient
+from base import BaseAIClient, FallbackText, FallbackResult
 from prompts import (
     MENTOR_SYSTEM_PROMPT,
     CONCEPT_MIRROR_SYSTEM_PROMPT,
     build_concept_mirror_prompt,
 )
-from demo import get_mentor_demo_response, get_concept_mirror_demo_response
+from demo import (
+    get_mentor_demo_response,
+    get_concept_mirror_demo_response,
+    get_concept_mirror_parse_error_response,
+)
+from cache import acache_call, lookup_concept_analysis, store_concept_analysis
+from concept_parser import parse_concept_analysis
+from config import config
+from deadlines import call_timeout, check_deadline
+from history import estimate_tokens, get_conversation_window
+from logs import get_logger
+from metrics import record_concept_parse, record_tokens
+from ratelimit import get_rate_limiter
+from retry import awith_retries, with_retries
+from tracing import span
+
+log = get_logger("groq")
 
 
 class GroqClient(BaseAIClient):
@@ -36,6 +50,9 @@ class GroqClient(BaseAIClient):
     # Default model to use if none specified
     DEFAULT_MODEL = "llama-3.3-70b-versatile"
     
+    # Cheap, fast model used to summarize older turns of long conversations
+    SUMMARY_MODEL = "llama-3.1-8b-instant"
+    
     # Available models on Groq
     AVAILABLE_MODELS = [
         "llama-3.3-70b-versatile",
@@ -79,7 +96,11 @@ class GroqClient(BaseAIClient):
         super().__init__(api_key=resolved_api_key, model=model or self.DEFAULT_MODEL)
         
         # Initialize the Groq client
-        self._client = Groq(api_key=self.api_key)
+        # Retries are handled by retry.with_retries(), within the request deadline
+        self._client = Groq(api_key=self.api_key, max_retries=0)
+        
+        # Async client is created on first use (only the ASGI app needs it)
+        self._async_client: Optional["AsyncGroq"] = None
     
     def generate_response(self, prompt: str, **kwargs) -> str:
         """
@@ -91,11 +112,10 @@ class GroqClient(BaseAIClient):
                 - temperature (float): Controls randomness (0.0 to 2.0)
                 - max_tokens (int): Maximum tokens in response
                 - top_p (float): Nucleus sampling parameter
-                - stream (bool): Whether to stream the response
         
         Returns:
             The generated text response.
-            
+        
         Raises:
             Exception: If the API call fails.
         """
@@ -105,18 +125,21 @@ class GroqClient(BaseAIClient):
         ]
         
         try:
-            completion = self._client.chat.completions.create(
+            completion = with_retries(lambda: self._create(
                 model=self.model,
                 messages=messages,
                 temperature=kwargs.get("temperature", 0.7),
                 max_tokens=kwargs.get("max_tokens", 1024),
                 top_p=kwargs.get("top_p", 1.0),
                 stream=False,  # Non-streaming for simple response
-            )
+                timeout=call_timeout(),
+            ))
             
             return completion.choices[0].message.content
-            
+        
         except Exception as e:
+            # A blown deadline is reported as such, not as a fallback
+            check_deadline()
             raise Exception(f"Groq API error: {str(e)}") from e
     
     def generate_response_with_context(
@@ -134,7 +157,7 @@ class GroqClient(BaseAIClient):
             context: Additional context to include.
             system_prompt: System-level instructions.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             The generated text response.
         """
@@ -159,18 +182,20 @@ class GroqClient(BaseAIClient):
         })
         
         try:
-            completion = self._client.chat.completions.create(
+            completion = with_retries(lambda: self._create(
                 model=self.model,
                 messages=messages,
                 temperature=kwargs.get("temperature", 0.7),
                 max_tokens=kwargs.get("max_tokens", 1024),
                 top_p=kwargs.get("top_p", 1.0),
                 stream=False,
-            )
+                timeout=call_timeout(),
+            ))
             
             return completion.choices[0].message.content
-            
+        
         except Exception as e:
+            check_deadline()
             raise Exception(f"Groq API error: {str(e)}") from e
     
     def chat(
@@ -188,10 +213,119 @@ class GroqClient(BaseAIClient):
             topic: The topic being discussed.
             system_prompt: Optional system prompt override.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             The assistant's response text.
         """
+        window, sys_prompt = self._fit_history(messages, topic, system_prompt)
+        groq_messages = self._build_chat_messages(window, sys_prompt)
+        
+        try:
+            completion = with_retries(lambda: self._create(
+                model=self.model,
+                messages=groq_messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 0.9),
+                stream=False,
+                timeout=call_timeout(),
+            ))
+            
+            return completion.choices[0].message.content
+        
+        except Exception as e:
+            check_deadline()
+            # Log the actual error
+            log.exception("Chat failed")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        Stream a response from Groq token by token.
+        
+        Args:
+            prompt: The input prompt to send to the model.
+            **kwargs: Same generation parameters as generate_response().
+        
+        Yields:
+            Text chunks as they arrive from the API.
+        
+        Raises:
+            Exception: If the API call fails.
+        """
+        messages: List[Dict[str, str]] = [
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            stream = with_retries(lambda: self._create(
+                model=self.model,
+                messages=messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 1.0),
+                stream=True,
+                timeout=call_timeout(),
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Groq API error: {str(e)}") from e
+        
+        yield from self._iter_stream(stream)
+    
+    def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a multi-turn chat response (Mentor Mode) token by token.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys.
+            topic: The topic being discussed.
+            system_prompt: Optional system prompt override.
+            **kwargs: Same generation parameters as chat().
+        
+        Yields:
+            Text chunks of the assistant's response. If the call fails
+            before anything was sent, the demo response is yielded instead.
+        """
+        window, sys_prompt = self._fit_history(messages, topic, system_prompt)
+        groq_messages = self._build_chat_messages(window, sys_prompt)
+        started = False
+        
+        try:
+            stream = with_retries(lambda: self._create(
+                model=self.model,
+                messages=groq_messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 0.9),
+                stream=True,
+                timeout=call_timeout(),
+            ))
+            for text in self._iter_stream(stream):
+                started = True
+                yield text
+        except Exception as e:
+            check_deadline()
+            # Once tokens have been sent we cannot swap in a demo answer
+            if started:
+                raise Exception(f"Groq API error: {str(e)}") from e
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+    
+    @span("prompt")
+    def _build_chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """Build the Groq message list for a Mentor Mode conversation."""
         # Use Mentor system prompt by default
         sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
         
@@ -208,25 +342,126 @@ class GroqClient(BaseAIClient):
                 "content": msg["content"]
             })
         
+        return groq_messages
+    
+    def _fit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Window a long conversation to the model's token budget."""
+        sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, sys_prompt
+        with span("history"):
+            return window.fit(messages, topic, sys_prompt, self.model, self._summarize)
+    
+    async def _afit_history(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Async version of _fit_history()."""
+        sys_prompt = system_prompt or MENTOR_SYSTEM_PROMPT
+        window = get_conversation_window()
+        if window is None:
+            return messages, sys_prompt
+        with span("history"):
+            return await window.afit(messages, topic, sys_prompt, self.model, self._asummarize)
+    
+    def _summary_request(self, prompt: str) -> Dict[str, Any]:
+        """Request parameters for a history summary on the cheap model."""
+        return {
+            "model": config.history_summary_model or self.SUMMARY_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.2,
+            "max_tokens": config.history_summary_tokens,
+            "stream": False,
+            "timeout": call_timeout(),
+        }
+    
+    def _summarize(self, prompt: str) -> str:
+        """Summarize older conversation turns with the cheap model."""
+        completion = self._create(**self._summary_request(prompt))
+        return completion.choices[0].message.content
+    
+    async def _asummarize(self, prompt: str) -> str:
+        """Async version of _summarize()."""
+        completion = await self._acreate(**self._summary_request(prompt))
+        return completion.choices[0].message.content
+    
+    def _create(self, **params: Any) -> Any:
+        """
+        chat.completions.create(), paced by the model's rate limiter.
+        
+        Uses the raw-response API so the limiter can read Groq's
+        x-ratelimit-* headers; returns the parsed completion (or stream).
+        """
+        limiter = get_rate_limiter("groq", params["model"], self.api_key)
+        if limiter is None:
+            return self._record_usage(params, self._client.chat.completions.create(**params))
+        
+        limiter.acquire(self._estimate_tokens(params))
         try:
-            completion = self._client.chat.completions.create(
-                model=self.model,
-                messages=groq_messages,
-                temperature=kwargs.get("temperature", 0.7),
-                max_tokens=kwargs.get("max_tokens", 1024),
-                top_p=kwargs.get("top_p", 0.9),
-                stream=False,
-            )
-            
-            return completion.choices[0].message.content
-            
+            raw = self._client.chat.completions.with_raw_response.create(**params)
         except Exception as e:
-            # Log the actual error
-            print(f"[GROQ ERROR] Chat failed: {e}")
-            import traceback
-            traceback.print_exc()
-            # Fall back to demo response on error
-            return get_mentor_demo_response(messages, topic)
+            limiter.observe_error(e)
+            raise
+        limiter.observe(raw.headers)
+        return self._record_usage(params, raw.parse())
+    
+    async def _acreate(self, **params: Any) -> Any:
+        """Async version of _create()."""
+        limiter = get_rate_limiter("groq", params["model"], self.api_key)
+        if limiter is None:
+            return self._record_usage(params, await self._aclient.chat.completions.create(**params))
+        
+        await limiter.aacquire(self._estimate_tokens(params))
+        try:
+            raw = await self._aclient.chat.completions.with_raw_response.create(**params)
+        except Exception as e:
+            limiter.observe_error(e)
+            raise
+        limiter.observe(raw.headers)
+        return self._record_usage(params, await raw.parse())
+    
+    @staticmethod
+    def _record_usage(params: Dict[str, Any], completion: Any) -> Any:
+        """Count the tokens of a (non-streamed) completion for /metrics and /usage."""
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            record_tokens("groq", params["model"], usage.prompt_tokens, usage.completion_tokens)
+        return completion
+    
+    def _record_stream_usage(self, chunk: Any) -> None:
+        """Count a stream's tokens, which Groq reports on its last chunk (x_groq.usage)."""
+        x_groq = getattr(chunk, "x_groq", None)
+        usage = getattr(chunk, "usage", None) or getattr(x_groq, "usage", None)
+        if usage is not None:
+            record_tokens("groq", self.model, usage.prompt_tokens, usage.completion_tokens)
+    
+    @staticmethod
+    def _estimate_tokens(params: Dict[str, Any]) -> int:
+        """Tokens a request counts against the quota: prompt plus max_tokens."""
+        prompt = sum(estimate_tokens(str(m.get("content", ""))) for m in params["messages"])
+        return prompt + int(params.get("max_tokens") or 0)
+    
+    def _iter_stream(self, stream) -> Iterator[str]:
+        """Yield text deltas from a Groq stream, closing it when done."""
+        try:
+            for chunk in stream:
+                self._record_stream_usage(chunk)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    yield text
+        finally:
+            # Release the connection even if the consumer stops early
+            stream.close()
     
     def analyze_concept(
         self,
@@ -241,51 +476,269 @@ class GroqClient(BaseAIClient):
             concept_name: Name of the concept being explained.
             user_explanation: The user's explanation text.
             **kwargs: Additional generation parameters.
-            
+        
         Returns:
             Dictionary with keys: understood, missing, incorrect, assumptions, summary.
         """
-        # Build messages for concept analysis
-        messages: List[Dict[str, str]] = [
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = lookup_concept_analysis(
+            "groq", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        messages = self._build_concept_messages(concept_name, user_explanation)
+        
+        try:
+            completion = with_retries(lambda: self._create(
+                model=self.model,
+                messages=messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 4096),
+                top_p=kwargs.get("top_p", 0.95),
+                stream=False,
+                timeout=call_timeout(),
+                **self._concept_response_format(),
+            ))
+            
+            # Parse JSON from response
+            return self._finish_concept_analysis(cache_key, completion.choices[0].message.content)
+        
+        except Exception as e:
+            check_deadline()
+            # JSON mode rejects output that doesn't parse; repair it locally instead
+            rejected = self._failed_generation(e)
+            if rejected is not None:
+                return self._finish_concept_analysis(cache_key, rejected)
+            # Fall back to demo response on error
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
+    
+    @span("prompt")
+    def _build_concept_messages(
+        self,
+        concept_name: str,
+        user_explanation: str
+    ) -> List[Dict[str, str]]:
+        """Build the Groq message list for a Concept Mirror analysis."""
+        return [
             {"role": "system", "content": CONCEPT_MIRROR_SYSTEM_PROMPT},
             {"role": "user", "content": build_concept_mirror_prompt(concept_name, user_explanation)}
         ]
+    
+    @staticmethod
+    def _concept_response_format() -> Dict[str, Any]:
+        """JSON mode for Concept Mirror calls, unless CONCEPT_JSON_MODE is off."""
+        if not config.concept_json_mode:
+            return {}
+        return {"response_format": {"type": "json_object"}}
+    
+    @staticmethod
+    def _failed_generation(error: Exception) -> Optional[str]:
+        """The output JSON mode rejected (400 json_validate_failed), if that's the error."""
+        body = getattr(error, "body", None)
+        if isinstance(body, dict):
+            body = body.get("error", body)
+        if isinstance(body, dict) and body.get("code") == "json_validate_failed":
+            return body.get("failed_generation")
+        return None
+    
+    @span("parse")
+    def _finish_concept_analysis(
+        self,
+        cache_key: Optional[str],
+        text: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Parse and validate the model output (see concept_parser.py).
+        
+        Only output that was valid as sent is cached; a repaired (e.g.
+        truncated) analysis is returned but may come out whole next time.
+        """
+        analysis, outcome = parse_concept_analysis(text)
+        record_concept_parse("groq", outcome)
+        if analysis is None:
+            log.warning(
+                "Unparseable Concept Mirror output",
+                extra={"fields": {"model": self.model, "chars": len(text or "")}},
+            )
+            # Return error structure if parsing fails (never cached)
+            return FallbackResult(get_concept_mirror_parse_error_response(), reason="parse_error")
+        if outcome == "ok":
+            store_concept_analysis(cache_key, analysis)
+        return analysis
+    
+    # ==========================================================================
+    # Async Interface (used by the ASGI app)
+    # ==========================================================================
+    
+    @property
+    def _aclient(self) -> "AsyncGroq":
+        """Lazily created async Groq client."""
+        if self._async_client is None:
+            self._async_client = AsyncGroq(api_key=self.api_key, max_retries=0)
+        return self._async_client
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        """Async version of generate_response()."""
+        messages: List[Dict[str, str]] = [
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            completion = await awith_retries(lambda: self._acreate(
+                model=self.model,
+                messages=messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 1.0),
+                stream=False,
+                timeout=call_timeout(),
+            ))
+            
+            return completion.choices[0].message.content
+        
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Groq API error: {str(e)}") from e
+    
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Async version of chat()."""
+        window, sys_prompt = await self._afit_history(messages, topic, system_prompt)
+        groq_messages = self._build_chat_messages(window, sys_prompt)
         
         try:
-            completion = self._client.chat.completions.create(
+            completion = await awith_retries(lambda: self._acreate(
+                model=self.model,
+                messages=groq_messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 0.9),
+                stream=False,
+                timeout=call_timeout(),
+            ))
+            
+            return completion.choices[0].message.content
+        
+        except Exception as e:
+            check_deadline()
+            log.warning(f"Chat failed: {e}")
+            # Fall back to demo response on error
+            return FallbackText(get_mentor_demo_response(messages, topic))
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Async version of analyze_concept()."""
+        # Serve repeated analyses (retries, double-submits) from the cache
+        cache_key, cached = await acache_call(
+            lookup_concept_analysis, "groq", self.model, concept_name, user_explanation
+        )
+        if cached is not None:
+            return cached
+        
+        messages = self._build_concept_messages(concept_name, user_explanation)
+        
+        try:
+            completion = await awith_retries(lambda: self._acreate(
                 model=self.model,
                 messages=messages,
                 temperature=kwargs.get("temperature", 0.7),
                 max_tokens=kwargs.get("max_tokens", 4096),
                 top_p=kwargs.get("top_p", 0.95),
                 stream=False,
-            )
+                timeout=call_timeout(),
+                **self._concept_response_format(),
+            ))
             
             # Parse JSON from response
-            return self._parse_concept_mirror_response(completion.choices[0].message.content)
-            
+            return await acache_call(self._finish_concept_analysis, cache_key, completion.choices[0].message.content)
+        
         except Exception as e:
+            check_deadline()
+            # JSON mode rejects output that doesn't parse; repair it locally instead
+            rejected = self._failed_generation(e)
+            if rejected is not None:
+                return await acache_call(self._finish_concept_analysis, cache_key, rejected)
             # Fall back to demo response on error
-            return get_concept_mirror_demo_response(concept_name, user_explanation)
-    
-    def _parse_concept_mirror_response(self, text: str) -> Dict[str, Any]:
-        """Parse JSON from Concept Mirror response."""
-        # Try to extract JSON from the response
-        json_match = re.search(r'\{[\s\S]*\}', text)
-        if json_match:
-            try:
-                return json.loads(json_match.group(0))
-            except json.JSONDecodeError:
-                pass
-        
-        # Return error structure if parsing fails
-        return {
-            "understood": ["Unable to parse the analysis response properly"],
-            "missing": [],
-            "incorrect": [],
-            "assumptions": [],
-            "summary": "The analysis could not be completed. Please try again."
-        }
+            return FallbackResult(get_concept_mirror_demo_response(concept_name, user_explanation))
+    
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Async version of stream_response()."""
+        messages: List[Dict[str, str]] = [
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            stream = await awith_retries(lambda: self._acreate(
+                model=self.model,
+                messages=messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 1.0),
+                stream=True,
+                timeout=call_timeout(),
+            ))
+        except Exception as e:
+            check_deadline()
+            raise Exception(f"Groq API error: {str(e)}") from e
+        
+        async for text in self._aiter_stream(stream):
+            yield text
+    
+    async def astream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Async version of stream_chat()."""
+        window, sys_prompt = await self._afit_history(messages, topic, system_prompt)
+        groq_messages = self._build_chat_messages(window, sys_prompt)
+        started = False
+        
+        try:
+            stream = await awith_retries(lambda: self._acreate(
+                model=self.model,
+                messages=groq_messages,
+                temperature=kwargs.get("temperature", 0.7),
+                max_tokens=kwargs.get("max_tokens", 1024),
+                top_p=kwargs.get("top_p", 0.9),
+                stream=True,
+                timeout=call_timeout(),
+            ))
+            async for text in self._aiter_stream(stream):
+                started = True
+                yield text
+        except Exception as e:
+            check_deadline()
+            # Once tokens have been sent we cannot swap in a demo answer
+            if started:
+                raise Exception(f"Groq API error: {str(e)}") from e
+            log.warning(f"Chat stream failed: {e}")
+            yield FallbackText(get_mentor_demo_response(messages, topic))
+    
+    async def _aiter_stream(self, stream) -> AsyncIterator[str]:
+        """Yield text deltas from an async Groq stream, closing it when done."""
+        try:
+            async for chunk in stream:
+                self._record_stream_usage(chunk)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    yield text
+        finally:
+            await stream.close()
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -0,0 +1,433 @@
+"""
+Request handling shared by the Flask app (api.py) and the Quart app (asgi.py).
+
+Both apps expose the same endpoints with the same contracts; they differ only
+in how they read a request and whether they await the provider. Everything
+else lives here: input validation, demo and fallback answers, response
+bodies and the health report. Helpers return plain dicts and the apps wrap
+them in JSON responses; invalid input raises RequestError, which both apps
+turn into an error response.
+
+Modules that only some requests need (demo answers, sessions, the mentor
+cache, the resilience layers reported by /health) are imported where they
+are used, so importing the app stays cheap on a cold start (see
+coldstart.py).
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import hmac
+
+from config import config
+from base import answered_by
+from deadlines import DeadlineExceeded, deadline_stats, record_deadline_exceeded
+from ledger import get_usage_ledger
+from logs import get_logger
+from metrics import record_fallback
+from preload import preload_stats
+from tracing import span, trace_export_stats
+
+if TYPE_CHECKING:
+    from base import BaseAIClient
+    from sessions import MentorTurn
+
+log = get_logger("handlers")
+
+
+class RequestError(Exception):
+    """A request that can't be served as sent, with its HTTP status."""
+    
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+    
+    def body(self) -> Dict[str, str]:
+        return {"error": str(self)}
+
+
+# =============================================================================
+# Clients and Access
+# =============================================================================
+
+def get_client() -> "BaseAIClient":
+    """Get the pooled AI client (imported lazily to avoid circular imports)."""
+    try:
+        with span("client"):
+            from ai_client import get_ai_client
+            return get_ai_client()
+    except Exception:
+        log.exception("Failed to get AI client")
+        raise
+
+
+def use_demo() -> bool:
+    """Answer from canned demo responses (demo mode, or no API key)."""
+    return config.demo_mode or not config.has_api_key()
+
+
+def check_admin(token: Optional[str]) -> None:
+    """
+    Gate an admin endpoint on the X-Admin-Token header.
+    
+    Raises:
+        RequestError: 404 when no ADMIN_RELOAD_TOKEN is configured (the
+            endpoint doesn't exist), 403 when the token doesn't match.
+    """
+    expected = config.admin_token
+    if not expected:
+        raise RequestError("Not found", 404)
+    
+    # Constant-time comparison
+    if not (token and hmac.compare_digest(token, expected)):
+        raise RequestError("Invalid admin token", 403)
+
+
+def client_id(forwarded_for: Optional[str], remote_addr: Optional[str]) -> str:
+    """
+    Client identity for per-client rate limits (the caller's IP).
+    
+    Behind a trusted proxy, that is the right-most X-Forwarded-For entry,
+    the address the proxy itself saw; entries left of it come from the
+    client and can be anything.
+    """
+    if config.admission_trust_proxy and forwarded_for and forwarded_for.strip():
+        return forwarded_for.split(",")[-1].strip()
+    return remote_addr or "unknown"
+
+
+# =============================================================================
+# Status Endpoints
+# =============================================================================
+
+def health_report(admission) -> Dict[str, Any]:
+    """Body of /health, including the admission stats of the calling app."""
+    health = {
+        "status": "healthy",
+        "service": "ai-assistant",
+        "provider": config.active_provider,
+        "model": config.active_model,
+        "has_api_key": config.has_api_key(),
+        "demo_mode": config.demo_mode,
+    }
+    
+    if config.mentor_cache_enabled:
+        from mentor_cache import get_mentor_cache
+        health["mentor_cache"] = get_mentor_cache().stats()
+    
+    if config.hedge_enabled:
+        from hedging import hedge_stats
+        health["hedging"] = hedge_stats.snapshot()
+    
+    if config.breaker_enabled:
+        from breaker import breaker_states
+        health["circuit_breakers"] = breaker_states()
+    
+    if config.retry_enabled:
+        from retry import retry_stats
+        health["retries"] = retry_stats.snapshot()
+    
+    if config.rate_limit_enabled:
+        from ratelimit import rate_limiter_states
+        health["rate_limits"] = rate_limiter_states()
+    
+    if admission is not None:
+        health["admission"] = admission.stats()
+    
+    health["deadlines_exceeded"] = deadline_stats()
+    
+    ledger = get_usage_ledger()
+    if ledger is not None:
+        health["usage_ledger"] = ledger.stats()
+    
+    if config.provider_preload != "off":
+        health["preload"] = preload_stats()
+    
+    if config.tracing_enabled and config.trace_exporter != "none":
+        health["trace_export"] = trace_export_stats()
+    
+    return health
+
+
+def reload_report() -> Dict[str, Any]:
+    """Reload the configuration; body of /admin/reload."""
+    changed = config.reload()
+    return {
+        "reloaded": True,
+        "changed": changed,
+        "config": config.to_dict(),
+    }
+
+
+# =============================================================================
+# Request Bodies
+# =============================================================================
+
+def json_body(data: Any) -> Dict[str, Any]:
+    """Check that a request carried a JSON object."""
+    if not data or not isinstance(data, dict):
+        raise RequestError("Request body is required")
+    return data
+
+
+def validate_concept_input(concept_name, explanation) -> Optional[str]:
+    """Return the validation error for a Concept Mirror input, if any."""
+    if not concept_name:
+        return "Concept name is required"
+    
+    if not explanation or len(explanation) < 20:
+        return "Explanation must be at least 20 characters"
+    
+    return None
+
+
+def concept_input(data: Any) -> Tuple[str, str]:
+    """(concept, explanation) of an /analyze body or a batch item."""
+    if not isinstance(data, dict):
+        raise RequestError("Each item must be an object")
+    
+    concept_name = data.get("concept", "")
+    explanation = data.get("explanation", "")
+    
+    error = validate_concept_input(concept_name, explanation)
+    if error:
+        raise RequestError(error)
+    return concept_name, explanation
+
+
+def batch_items(data: Any) -> List[Any]:
+    """The items of an /analyze/batch body (each is validated on its own)."""
+    items = json_body(data).get("items")
+    
+    if not isinstance(items, list) or not items:
+        raise RequestError("Items array is required")
+    
+    if len(items) > config.batch_max_items:
+        raise RequestError(f"At most {config.batch_max_items} items are allowed per batch")
+    return items
+
+
+def prompt_input(data: Any) -> str:
+    """The prompt of a /generate body."""
+    prompt = json_body(data).get("prompt", "")
+    
+    if not prompt:
+        raise RequestError("Prompt is required")
+    return prompt
+
+
+def mentor_turn(data: Any) -> "MentorTurn":
+    """Resolve a /mentor body (either protocol, see sessions.MentorTurn)."""
+    from sessions import MentorTurn, SessionError
+    
+    try:
+        return MentorTurn.from_request(json_body(data))
+    except SessionError as e:
+        raise RequestError(str(e), e.status) from None
+
+
+async def amentor_turn(data: Any) -> "MentorTurn":
+    """Async version of mentor_turn() (session store access runs off the event loop)."""
+    from sessions import MentorTurn, SessionError
+    
+    try:
+        return await MentorTurn.afrom_request(json_body(data))
+    except SessionError as e:
+        raise RequestError(str(e), e.status) from None
+
+
+def session_body(session_id: str) -> Dict[str, Any]:
+    """Body of GET /mentor/session/<id>."""
+    from sessions import get_session_store
+    
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise RequestError("Session not found or expired", 404)
+    
+    topic, messages = session
+    return {
+        "session_id": session_id,
+        "topic": topic,
+        "messages": messages,
+    }
+
+
+def delete_session(session_id: str) -> Dict[str, Any]:
+    """End a Mentor session; body of DELETE /mentor/session/<id>."""
+    from sessions import get_session_store
+    
+    if not get_session_store().delete(session_id):
+        raise RequestError("Session not found or expired", 404)
+    return {"session_id": session_id, "deleted": True}
+
+
+async def asession_body(session_id: str) -> Dict[str, Any]:
+    """Async version of session_body()."""
+    from sessions import astore_call
+    return await astore_call(session_body, session_id)
+
+
+async def adelete_session(session_id: str) -> Dict[str, Any]:
+    """Async version of delete_session()."""
+    from sessions import astore_call
+    return await astore_call(delete_session, session_id)
+
+
+# =============================================================================
+# Answers
+# =============================================================================
+
+DEMO_FIELDS = {"provider": "demo", "demo_mode": True}
+
+
+def provider_fields(client: "BaseAIClient") -> Dict[str, Any]:
+    """Provider and model fields of a stream (streams are never hedged)."""
+    return {
+        "provider": config.active_provider,
+        "model": client.model,
+    }
+
+
+def answer_fields(client: "BaseAIClient") -> Dict[str, Any]:
+    """
+    Provider and model fields of the answer to the last call on `client`.
+    
+    That is the secondary provider when a hedge or a breaker failover
+    answered (see base.record_answer), otherwise the active provider.
+    """
+    provider, model = answered_by(client, config.active_provider)
+    return {
+        "provider": provider,
+        "model": model,
+    }
+
+
+def fallback_fields(error: Exception) -> Dict[str, Any]:
+    """Fields of a demo answer given in place of a failed provider call."""
+    return {
+        "provider": "demo",
+        "error": str(error),
+        "fallback": True,
+    }
+
+
+def mentor_demo(messages: list, topic: str) -> str:
+    from demo import get_mentor_demo_response
+    return get_mentor_demo_response(messages, topic)
+
+
+def mentor_fallback(error: Exception, data: Any, turn: Optional["MentorTurn"]) -> Dict[str, Any]:
+    """Body of a /mentor demo answer after a failure (turn is None if parsing failed)."""
+    log.warning(f"Mentor request failed, answering in demo mode: {error}")
+    record_fallback("endpoint_error")
+    with span("fallback"):
+        if turn is not None:
+            response = mentor_demo(turn.messages, turn.topic)
+        else:
+            response = mentor_demo(
+                data.get("messages", []) if isinstance(data, dict) else [],
+                data.get("topic", "General") if isinstance(data, dict) else "General"
+            )
+    return {
+        "response": response,
+        **fallback_fields(error),
+        **(turn.response_fields() if turn is not None else {}),
+    }
+
+
+def mentor_stream_fallback(error: Exception, turn: "MentorTurn") -> Tuple[str, Dict[str, Any]]:
+    """(reply, done event) of a /mentor/stream demo answer after a failure."""
+    record_fallback("endpoint_error")
+    with span("fallback"):
+        response = mentor_demo(turn.messages, turn.topic)
+    return response, {**fallback_fields(error), **turn.response_fields()}
+
+
+def mentor_cache_lookup(
+    turn: "MentorTurn",
+    client: "BaseAIClient"
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Reuse the answer to a near-identical opening question, if enabled.
+    
+    Answers are cached under the provider and model that produced them, so
+    a hedged client also checks its secondary's entries.
+    
+    Returns:
+        (answer, provider and model fields), or None on a miss.
+    """
+    if not config.mentor_cache_enabled:
+        return None
+    from mentor_cache import get_mentor_cache
+    
+    sources = [(config.active_provider, client.model)]
+    secondary = getattr(client, "secondary", None)  # a HedgedClient
+    if secondary is not None:
+        sources.append((config.hedge_provider, secondary.model))
+    
+    mentor_cache = get_mentor_cache()
+    for provider, model in sources:
+        cached = mentor_cache.lookup(turn.messages, turn.topic, provider, model)
+        if cached is not None:
+            return cached, {"provider": provider, "model": model}
+    return None
+
+
+def mentor_cache_store(turn: "MentorTurn", client: "BaseAIClient", response: str) -> None:
+    """Remember a provider answer for mentor_cache_lookup() (demo fallbacks never are)."""
+    if not config.mentor_cache_enabled:
+        return
+    from base import is_fallback
+    from mentor_cache import get_mentor_cache
+    
+    if not is_fallback(response):
+        provider, model = answered_by(client, config.active_provider)
+        get_mentor_cache().store(turn.messages, turn.topic, provider, model, response)
+
+
+def concept_demo(concept_name: str, explanation: str) -> Dict[str, Any]:
+    """Body of a demo-mode Concept Mirror analysis."""
+    from demo import get_concept_mirror_demo_response
+    result = get_concept_mirror_demo_response(concept_name, explanation)
+    return {**result, **DEMO_FIELDS}
+
+
+def concept_fallback(error: Exception, concept_name: str, explanation: str) -> Dict[str, Any]:
+    """Body of a demo analysis given in place of a failed provider call."""
+    from demo import get_concept_mirror_demo_response
+    
+    record_fallback("endpoint_error")
+    with span("fallback"):
+        result = get_concept_mirror_demo_response(concept_name, explanation)
+    return {**result, **fallback_fields(error)}
+
+
+def analyze_fallback(error: Exception, data: Any) -> Dict[str, Any]:
+    """Body of an /analyze demo answer after a failure."""
+    log.warning(f"Analyze request failed, answering in demo mode: {error}")
+    data = data if isinstance(data, dict) else {}
+    return concept_fallback(error, data.get("concept", ""), data.get("explanation", ""))
+
+
+def batch_item_failure(
+    error: Exception,
+    concept_name: str,
+    explanation: str,
+    route: Optional[str]
+) -> Dict[str, Any]:
+    """Result of a batch item whose provider call failed (per item, never the batch)."""
+    if isinstance(error, DeadlineExceeded):
+        record_deadline_exceeded(route)
+        return {"error": str(error), "outcome": "deadline_exceeded"}
+    return concept_fallback(error, concept_name, explanation)
+
+
+def generate_demo(prompt: str) -> str:
+    return f"Demo response for: {prompt[:50]}..."
+
+
+def generate_error(error: Exception) -> Dict[str, Any]:
+    """Body of a failed /generate call (500; generation has no demo fallback)."""
+    log.warning(f"Generate request failed: {error}")
+    return {
+        "error": str(error),
+        "provider": "error",
+    }
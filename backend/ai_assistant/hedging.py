@@ -0,0 +1,447 @@
+"""
+Hedged requests across providers.
+
+Tail latency, not the median, decides how slow the Mentor feels. A hedged
+client sends each request to the primary provider first; if it hasn't
+answered within a delay derived from its own recent latency percentile
+(e.g. p95), the same request also goes to a secondary provider/model, and
+whichever returns a real answer first wins. Only ~5% of requests pay for a
+second call, but a stuck primary no longer holds the user hostage.
+
+A primary that fails fast (or returns a demo fallback) triggers the
+secondary right away instead of waiting out the delay.
+
+The sync path runs calls on thread pools; a losing call there can't be
+interrupted and is simply ignored. The async path cancels the loser.
+
+Hedges are bounded separately from primaries: at most HEDGE_MAX_IN_FLIGHT
+secondary calls run at once, and past that slow primaries simply aren't
+hedged. When every primary worker is busy, a sync call runs unhedged on the
+request thread rather than queueing behind the pool.
+
+The client that answered is noted with base.record_answer(), so responses
+name the secondary when it won.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from base import BaseAIClient, DelegatingClient, is_fallback, record_answer
+from config import config, ConfigSnapshot
+from deadlines import DeadlineExceeded, remaining
+
+
+# Below this many samples the configured initial delay is used
+_MIN_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Rolling window of call latencies with percentile lookup."""
+    
+    def __init__(self, window: int = 256):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        """The pct-th percentile (nearest rank), or None without enough samples."""
+        with self._lock:
+            if len(self._samples) < _MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(int(len(ordered) * pct / 100.0), len(ordered) - 1)
+        return ordered[index]
+
+
+class HedgeStats:
+    """Process-wide hedging counters."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "calls": 0,          # hedged-client calls
+            "hedges_fired": 0,   # secondary requests sent after the delay
+            "failovers": 0,      # secondary sent early because the primary failed
+            "hedge_wins": 0,     # answers that came from the secondary
+            "primary_wins": 0,   # answers that came from the primary
+            "no_answer": 0,      # neither provider produced a real answer
+            "hedges_skipped": 0, # hedges not sent: HEDGE_MAX_IN_FLIGHT reached
+            "saturated": 0,      # calls run unhedged: every primary worker busy
+        }
+    
+    def incr(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+        calls = stats["calls"]
+        stats["fire_rate"] = round(stats["hedges_fired"] / calls, 4) if calls else 0.0
+        fired = stats["hedges_fired"] + stats["failovers"]
+        stats["win_rate"] = round(stats["hedge_wins"] / fired, 4) if fired else 0.0
+        return stats
+
+
+hedge_stats = HedgeStats()
+
+
+class _Slots:
+    """Non-blocking counter of in-flight calls (e.g. hedges) against a limit."""
+    
+    def __init__(self, limit: int):
+        self._free = threading.BoundedSemaphore(limit)
+    
+    def try_acquire(self) -> bool:
+        return self._free.acquire(blocking=False)
+    
+    def release(self, _: Any = None) -> None:
+        self._free.release()
+
+
+class _BoundedPool:
+    """Thread pool that refuses work instead of queueing it when every worker is busy."""
+    
+    def __init__(self, workers: int, name: str):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = _Slots(workers)
+    
+    def try_submit(self, fn: Callable[..., Any], *args: Any) -> Optional[Future]:
+        """Submit a call, or return None if no worker is free."""
+        if not self._slots.try_acquire():
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._slots.release)
+        return future
+    
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_pools: Optional[Tuple[_BoundedPool, _BoundedPool]] = None
+_async_hedges: Optional[_Slots] = None
+_pools_lock = threading.Lock()
+
+
+def _get_pools() -> Tuple[_BoundedPool, _BoundedPool]:
+    """(primary pool, hedge pool) for sync hedged calls."""
+    global _pools
+    
+    pools = _pools
+    if pools is None:
+        with _pools_lock:
+            if _pools is None:
+                _pools = (
+                    _BoundedPool(config.hedge_max_workers, "hedge-primary"),
+                    _BoundedPool(config.hedge_max_in_flight, "hedge"),
+                )
+            pools = _pools
+    return pools
+
+
+def _get_async_hedges() -> _Slots:
+    """In-flight limit for async hedges (HEDGE_MAX_IN_FLIGHT)."""
+    global _async_hedges
+    
+    slots = _async_hedges
+    if slots is None:
+        with _pools_lock:
+            if _async_hedges is None:
+                _async_hedges = _Slots(config.hedge_max_in_flight)
+            slots = _async_hedges
+    return slots
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Resize the pools on next use; calls already running finish on the old ones."""
+    global _pools, _async_hedges
+    
+    changed = new.changed_fields(old)
+    if "hedge_max_workers" in changed or "hedge_max_in_flight" in changed:
+        with _pools_lock:
+            old_pools, _pools, _async_hedges = _pools, None, None
+        for pool in old_pools or ():
+            pool.shutdown()
+
+
+config.on_reload(_on_config_reload)
+
+
+def _out_of_time() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+class HedgedClient(DelegatingClient):
+    """
+    Client wrapper that hedges request/response calls to a secondary client.
+    
+    Streaming methods go to the primary only: once tokens reach the user
+    the answer can't be switched.
+    """
+    
+    def __init__(
+        self,
+        primary: BaseAIClient,
+        secondary: BaseAIClient,
+        percentile: float = 95.0,
+        initial_delay: float = 2.0,
+        min_delay: float = 0.25
+    ):
+        """
+        Initialize the hedged client.
+        
+        Args:
+            primary: Client that gets every request.
+            secondary: Client that gets hedged requests.
+            percentile: Primary latency percentile used as the hedge delay.
+            initial_delay: Delay (seconds) used until enough latencies are known.
+            min_delay: Lower bound for the delay, in seconds.
+        """
+        super().__init__(primary)
+        self.secondary = secondary
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._latency = LatencyTracker()
+    
+    @property
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before hedging."""
+        observed = self._latency.percentile(self.percentile)
+        if observed is None:
+            return self.initial_delay
+        return max(observed, self.min_delay)
+    
+    # ==========================================================================
+    # Sync Interface
+    # ==========================================================================
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        return self._hedge(lambda c: c.generate_response(prompt, **kwargs))
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._hedge(
+            lambda c: c.generate_response_with_context(prompt, context, system_prompt, **kwargs)
+        )
+    
+    def chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._hedge(lambda c: c.chat(messages, topic, system_prompt, **kwargs))
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return self._hedge(lambda c: c.analyze_concept(concept_name, user_explanation, **kwargs))
+    
+    def _hedge(self, call: Callable[[BaseAIClient], Any]) -> Any:
+        """Run a call on the primary, hedging to the secondary if it's slow."""
+        hedge_stats.incr("calls")
+        primaries, hedges = _get_pools()
+        started = time.monotonic()
+        
+        def submit(pool: _BoundedPool, client: BaseAIClient) -> Optional[Future]:
+            # Run in a copy of the caller's context (request-scoped state)
+            return pool.try_submit(contextvars.copy_context().run, call, client)
+        
+        primary = submit(primaries, self._inner)
+        if primary is None:
+            # Queueing for a worker would only add latency: answer unhedged
+            hedge_stats.incr("saturated")
+            result = call(self._inner)
+            record_answer(self, None)
+            return result
+        primary.add_done_callback(lambda f: self._observe(f, started))
+        owners = {primary: "primary"}
+        
+        def hedge(counter: str) -> Optional[Future]:
+            secondary = submit(hedges, self.secondary)
+            if secondary is None:
+                hedge_stats.incr("hedges_skipped")
+                return None
+            hedge_stats.incr(counter)
+            owners[secondary] = "secondary"
+            return secondary
+        
+        done, _ = wait([primary], timeout=self._first_wait())
+        if not done and not _out_of_time():
+            hedge("hedges_fired")
+        
+        pending = set(owners)
+        fallback: Any = None
+        error: Optional[BaseException] = None
+        
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                # Out of time; the calls left running are abandoned
+                for other in pending:
+                    other.cancel()
+                raise DeadlineExceeded()
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    result = None
+                else:
+                    if not is_fallback(result):
+                        for other in pending:
+                            other.cancel()
+                        self._won(owners[future])
+                        return result
+                    fallback = fallback if fallback is not None else result
+                
+                # The primary gave no answer before the hedge fired: fail over now
+                if owners[future] == "primary" and len(owners) == 1:
+                    secondary = hedge("failovers")
+                    if secondary is not None:
+                        pending.add(secondary)
+        
+        hedge_stats.incr("no_answer")
+        record_answer(self, None)
+        if fallback is not None:
+            return fallback
+        raise error
+    
+    def _won(self, owner: str) -> None:
+        """Count a win and note which client answered."""
+        if owner == "primary":
+            hedge_stats.incr("primary_wins")
+            record_answer(self, None)
+        else:
+            hedge_stats.incr("hedge_wins")
+            record_answer(self, self.secondary)
+    
+    def _first_wait(self) -> float:
+        """Hedge delay, but never past the request deadline."""
+        left = remaining()
+        if left is None:
+            return self.hedge_delay
+        return max(min(self.hedge_delay, left), 0.0)
+    
+    def _observe(self, future: Future, started: float) -> None:
+        """Record the primary's latency (even if it lost the race)."""
+        if not future.cancelled() and future.exception() is None and not is_fallback(future.result()):
+            self._latency.record(time.monotonic() - started)
+    
+    # ==========================================================================
+    # Async Interface
+    # ==========================================================================
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        return await self._ahedge(lambda c: c.agenerate_response(prompt, **kwargs))
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return await self._ahedge(lambda c: c.achat(messages, topic, system_prompt, **kwargs))
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return await self._ahedge(
+            lambda c: c.aanalyze_concept(concept_name, user_explanation, **kwargs)
+        )
+    
+    async def _ahedge(self, call: Callable[[BaseAIClient], Awaitable[Any]]) -> Any:
+        """Async version of _hedge(); the losing call is cancelled."""
+        hedge_stats.incr("calls")
+        hedges = _get_async_hedges()
+        started = time.monotonic()
+        
+        primary = asyncio.ensure_future(call(self._inner))
+        owners = {primary: "primary"}
+        
+        def hedge(counter: str) -> Optional[asyncio.Future]:
+            if not hedges.try_acquire():
+                hedge_stats.incr("hedges_skipped")
+                return None
+            hedge_stats.incr(counter)
+            secondary = asyncio.ensure_future(call(self.secondary))
+            secondary.add_done_callback(hedges.release)
+            owners[secondary] = "secondary"
+            return secondary
+        
+        done, _ = await asyncio.wait({primary}, timeout=self._first_wait())
+        if not done and not _out_of_time():
+            hedge("hedges_fired")
+        
+        pending = set(owners)
+        fallback: Any = None
+        error: Optional[BaseException] = None
+        
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded()
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        result = None
+                    else:
+                        if owners[task] == "primary" and not is_fallback(result):
+                            self._latency.record(time.monotonic() - started)
+                        if not is_fallback(result):
+                            self._won(owners[task])
+                            return result
+                        fallback = fallback if fallback is not None else result
+                    
+                    if owners[task] == "primary" and len(owners) == 1:
+                        secondary = hedge("failovers")
+                        if secondary is not None:
+                            pending.add(secondary)
+        finally:
+            for task in pending:
+                if task is primary:
+                    # Cancelled while slow: its latency is at least this long
+                    self._latency.record(time.monotonic() - started)
+                task.cancel()
+        
+        hedge_stats.incr("no_answer")
+        record_answer(self, None)
+        if fallback is not None:
+            return fallback
+        raise error
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current hedge delay plus the process-wide counters."""
+        return {**hedge_stats.snapshot(), "delay_ms": round(self.hedge_delay * 1000)}
@@ -0,0 +1,333 @@
+"""
+Token-budgeted conversation windowing for Mentor Mode.
+
+Sending the whole history on every turn makes a long session cost O(n^2)
+tokens overall and slows each turn down until the context limit is hit.
+ConversationWindow fits a conversation into a per-model token budget: the
+newest turns are kept verbatim and older turns are folded into a rolling
+summary written by a cheap model.
+
+Summaries are cached by a hash of the folded prefix. When the window moves
+forward, the next summary starts from the cached one and only folds the new
+turns, and turns that fit the budget reuse the cached summary without any
+extra call. Folding goes down to a low-water mark rather than just below
+the budget, so a summary call happens once every several turns, not on
+every turn.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import config, ConfigSnapshot
+from logs import get_logger
+from prompts import HISTORY_SUMMARY_HEADER, build_history_summary_prompt
+
+log = get_logger("history")
+
+
+# Per-message overhead of role markers and separators in chat formats
+_MESSAGE_OVERHEAD = 4
+
+# After folding, the verbatim turns use at most this share of the budget
+_LOW_WATER = 0.6
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting (about 4 characters per token).
+    
+    Good enough for English prose and code with both providers' tokenizers,
+    and free: no tokenizer download or model-specific dependency.
+    """
+    return (len(text) + 3) // 4
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(str(message.get("content", ""))) + _MESSAGE_OVERHEAD
+
+
+class _Plan:
+    """How a conversation is windowed, and whether a summary call is needed."""
+    
+    __slots__ = ("recent", "summary", "fold", "fold_key", "unfolded")
+    
+    def __init__(
+        self,
+        recent: List[Dict[str, str]],
+        summary: Optional[str] = None,
+        fold: Optional[List[Dict[str, str]]] = None,
+        fold_key: Optional[str] = None,
+        unfolded: Optional[List[Dict[str, str]]] = None
+    ):
+        self.recent = recent
+        self.summary = summary
+        self.fold = fold
+        self.fold_key = fold_key
+        # Verbatim turns to send instead if the summary call fails
+        self.unfolded = unfolded
+
+
+class ConversationWindow:
+    """
+    Fits Mentor conversations into a token budget with a rolling summary.
+    
+    Thread-safe. The caller supplies the summarizer (a function that sends a
+    prompt to a cheap model), so one window serves every provider.
+    
+    Example:
+        messages, system_prompt = window.fit(
+            messages, topic, system_prompt, model, summarize=client_summarize
+        )
+    """
+    
+    def __init__(
+        self,
+        default_budget: int = 6000,
+        model_budgets: Optional[Dict[str, int]] = None,
+        summary_tokens: int = 300,
+        max_summaries: int = 256
+    ):
+        """
+        Initialize the window.
+        
+        Args:
+            default_budget: Prompt token budget (system prompt + history).
+            model_budgets: Per-model budget overrides.
+            summary_tokens: Tokens reserved for the summary.
+            max_summaries: Max number of cached summaries (LRU eviction).
+        """
+        self.default_budget = default_budget
+        self.model_budgets = dict(model_budgets or {})
+        self.summary_tokens = summary_tokens
+        self.max_summaries = max_summaries
+        
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"windowed": 0, "summary_hits": 0, "summary_calls": 0, "summary_errors": 0}
+    
+    # ==========================================================================
+    # Public API
+    # ==========================================================================
+    
+    def budget_for(self, model: Optional[str]) -> int:
+        """Token budget for a model."""
+        return self.model_budgets.get(model or "", self.default_budget)
+    
+    def fit(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: str,
+        model: Optional[str],
+        summarize: Callable[[str], str]
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """
+        Window a conversation to the model's budget.
+        
+        Args:
+            messages: Full conversation history.
+            topic: The topic being discussed.
+            system_prompt: The resolved system prompt.
+            model: Model the conversation is sent to (selects the budget).
+            summarize: Sends a prompt to a cheap model and returns its text.
+        
+        Returns:
+            (messages to send, system prompt with the summary appended).
+        """
+        plan = self._plan(messages, topic, system_prompt, model)
+        if plan.fold is not None:
+            prompt = build_history_summary_prompt(topic, plan.summary or "", plan.fold)
+            try:
+                summary = summarize(prompt)
+            except Exception as e:
+                summary = None
+                self._summary_failed(e)
+            self._finish(plan, summary)
+        return plan.recent, self._with_summary(system_prompt, plan.summary)
+    
+    async def afit(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: str,
+        model: Optional[str],
+        summarize: Callable[[str], Awaitable[str]]
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Async version of fit()."""
+        plan = self._plan(messages, topic, system_prompt, model)
+        if plan.fold is not None:
+            prompt = build_history_summary_prompt(topic, plan.summary or "", plan.fold)
+            try:
+                summary = await summarize(prompt)
+            except Exception as e:
+                summary = None
+                self._summary_failed(e)
+            self._finish(plan, summary)
+        return plan.recent, self._with_summary(system_prompt, plan.summary)
+    
+    def stats(self) -> Dict[str, int]:
+        """Windowing and summary-cache counters, for health and metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_summaries"] = len(self._summaries)
+        return stats
+    
+    def clear(self) -> None:
+        """Drop every cached summary."""
+        with self._lock:
+            self._summaries.clear()
+    
+    # ==========================================================================
+    # Internals
+    # ==========================================================================
+    
+    def _plan(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        system_prompt: str,
+        model: Optional[str]
+    ) -> _Plan:
+        """Decide which turns stay verbatim and which get folded."""
+        costs = [_message_tokens(m) for m in messages]
+        system_cost = estimate_tokens(system_prompt)
+        budget = self.budget_for(model)
+        
+        if system_cost + sum(costs) <= budget:
+            return _Plan(list(messages))
+        
+        available = max(budget - system_cost - self.summary_tokens, 0)
+        keys = self._prefix_keys(messages, topic)
+        
+        # suffix[i] = tokens of messages[i:]
+        suffix = [0] * (len(messages) + 1)
+        for i in range(len(messages) - 1, -1, -1):
+            suffix[i] = suffix[i + 1] + costs[i]
+        
+        # Longest prefix that already has a summary
+        start, summary = 0, None
+        with self._lock:
+            for i in range(len(messages) - 1, 0, -1):
+                cached = self._summaries.get(keys[i])
+                if cached is not None:
+                    self._summaries.move_to_end(keys[i])
+                    start, summary = i, cached
+                    break
+            self._stats["windowed"] += 1
+            if summary is not None and suffix[start] <= available:
+                self._stats["summary_hits"] += 1
+                return _Plan(list(messages[start:]), summary)
+        
+        # Fold down to the low-water mark, always keeping the newest message
+        split = len(messages) - 1
+        while split > start and suffix[split - 1] <= available * _LOW_WATER:
+            split -= 1
+        # Start the verbatim window on a learner turn so roles still alternate
+        while split < len(messages) - 1 and messages[split].get("role") != "user":
+            split += 1
+        
+        if split <= start:
+            # Nothing new to fold (the newest turns alone exceed the budget)
+            return _Plan(list(messages[start:]), summary)
+        
+        # Should the summary call fail, drop only the oldest turns this
+        # request can't fit; nothing is cached, so a later turn retries
+        trim = start
+        while trim < split and suffix[trim] > available:
+            trim += 1
+        while trim < split and messages[trim].get("role") != "user":
+            trim += 1
+        
+        return _Plan(
+            list(messages[split:]),
+            summary,
+            fold=list(messages[start:split]),
+            fold_key=keys[split],
+            unfolded=list(messages[trim:]),
+        )
+    
+    def _finish(self, plan: _Plan, summary: Optional[str]) -> None:
+        """Cache a new summary and apply it to the plan."""
+        if not summary:
+            # Keep the older summary (if any) and its fold point
+            plan.recent = plan.unfolded
+            return
+        summary = summary.strip()
+        plan.summary = summary
+        with self._lock:
+            self._summaries[plan.fold_key] = summary
+            self._summaries.move_to_end(plan.fold_key)
+            self._stats["summary_calls"] += 1
+            while len(self._summaries) > self.max_summaries:
+                self._summaries.popitem(last=False)
+    
+    def _summary_failed(self, error: Exception) -> None:
+        log.warning(f"Summary failed, trimming older turns for this request: {error}")
+        with self._lock:
+            self._stats["summary_errors"] += 1
+    
+    @staticmethod
+    def _prefix_keys(messages: List[Dict[str, str]], topic: str) -> List[str]:
+        """keys[i] identifies messages[:i] (a hash chain, so O(n) overall)."""
+        digest = hashlib.sha256(" ".join(str(topic).split()).casefold().encode("utf-8")).digest()
+        keys = [digest.hex()]
+        for msg in messages:
+            h = hashlib.sha256(digest)
+            h.update(str(msg.get("role", "")).encode("utf-8"))
+            h.update(b"\x00")
+            h.update(str(msg.get("content", "")).encode("utf-8"))
+            digest = h.digest()
+            keys.append(digest.hex())
+        return keys
+    
+    @staticmethod
+    def _with_summary(system_prompt: str, summary: Optional[str]) -> str:
+        if not summary:
+            return system_prompt
+        return f"{system_prompt}\n\n{HISTORY_SUMMARY_HEADER}\n{summary}"
+
+
+# =============================================================================
+# GLOBAL WINDOW INSTANCE
+# =============================================================================
+
+_window: Optional[ConversationWindow] = None
+_window_lock = threading.Lock()
+
+
+def get_conversation_window() -> Optional[ConversationWindow]:
+    """
+    Get the process-wide conversation window.
+    
+    Returns:
+        The shared window, or None when HISTORY_WINDOW_ENABLED is off.
+    """
+    global _window
+    
+    if not config.history_window_enabled:
+        return None
+    
+    if _window is None:
+        with _window_lock:
+            if _window is None:
+                _window = ConversationWindow(
+                    default_budget=config.history_token_budget,
+                    model_budgets=config.history_model_budgets,
+                    summary_tokens=config.history_summary_tokens,
+                    max_summaries=config.history_summary_cache_size,
+                )
+    return _window
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Rebuild the window on next use if its settings changed."""
+    global _window
+    
+    if any(name.startswith("history_") for name in new.changed_fields(old)):
+        with _window_lock:
+            _window = None
+
+
+config.on_reload(_on_config_reload)
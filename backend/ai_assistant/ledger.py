@@ -0,0 +1,349 @@
+"""
+Token and latency accounting per endpoint, model and topic.
+
+/metrics counts tokens per provider and model, which shows how fast the
+quota goes but not what spends it. The ledger keeps the same numbers broken
+down by the traffic that caused them:
+
+- every upstream call (MetricsClient) adds a call, its outcome and its
+  upstream latency;
+- every token count a provider reports (metrics.record_tokens) adds prompt
+  and completion tokens, history summaries included;
+
+both keyed by time bucket, endpoint, provider, model and topic (the Mentor
+topic or the Concept Mirror concept). Endpoint and topic come from the
+request's usage scope, set by the API layer (set_usage_scope /
+set_usage_topic), so the provider layer doesn't need to know about requests.
+
+Recording is one dict update under a lock. Buckets past the retention are
+dropped as new ones open, and the row count is capped (topics beyond it are
+counted as "(other)"). query() aggregates any time window by any of
+GROUP_FIELDS and backs the /usage endpoint.
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from config import config, ConfigSnapshot
+
+
+GROUP_FIELDS = ("time", "endpoint", "provider", "model", "topic")
+DEFAULT_GROUP_BY = ("endpoint", "model", "topic")
+
+OTHER_TOPIC = "(other)"
+MAX_TOPIC_LENGTH = 80
+
+# (endpoint, topic) of the current request
+_scope: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "usage_scope", default=("", "")
+)
+
+# Row layout: [calls, errors, prompt tokens, completion tokens, upstream seconds]
+_CALLS, _ERRORS, _PROMPT, _COMPLETION, _SECONDS = range(5)
+
+RowKey = Tuple[str, str, str, str]  # endpoint, provider, model, topic
+
+
+def _normalize_topic(topic: Optional[str]) -> str:
+    """Collapse case and whitespace so "Binary  Search" and "binary search" add up."""
+    if not topic:
+        return ""
+    return " ".join(str(topic).split())[:MAX_TOPIC_LENGTH].lower()
+
+
+def set_usage_scope(endpoint: Optional[str], topic: Optional[str] = None) -> None:
+    """Attribute the current request's provider usage to `endpoint` (and `topic`)."""
+    _scope.set((endpoint or "", _normalize_topic(topic)))
+
+
+def set_usage_topic(topic: Optional[str]) -> None:
+    """Set the topic of the current request's usage, keeping its endpoint."""
+    _scope.set((_scope.get()[0], _normalize_topic(topic)))
+
+
+def keep_usage_scope(chunks: Iterator[Any]) -> Iterator[Any]:
+    """
+    Carry the current usage scope into a streamed response.
+    
+    The server iterates a streamed body after the view has returned, in a
+    context where the request's scope isn't set; the stream's usage would
+    otherwise be recorded without endpoint or topic.
+    """
+    scope = _scope.get()
+    
+    def scoped():
+        _scope.set(scope)
+        yield from chunks
+    
+    return scoped()
+
+
+def akeep_usage_scope(chunks: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Async version of keep_usage_scope()."""
+    scope = _scope.get()
+    
+    async def scoped():
+        _scope.set(scope)
+        async for chunk in chunks:
+            yield chunk
+    
+    return scoped()
+
+
+class UsageLedger:
+    """
+    Thread-safe, time-bucketed usage totals.
+    
+    Buckets are opened in time order; each maps a row key (endpoint,
+    provider, model, topic) to its counters.
+    """
+    
+    def __init__(self, bucket_seconds: int, retention_seconds: int, max_rows: int):
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_seconds
+        self.max_rows = max_rows
+        self._buckets: "OrderedDict[int, Dict[RowKey, List[float]]]" = OrderedDict()
+        self._row_count = 0
+        self._lock = threading.Lock()
+    
+    # ==========================================================================
+    # Recording
+    # ==========================================================================
+    
+    def _row(self, provider: str, model: Optional[str]) -> List[float]:
+        """The counters of the current bucket and scope (call with the lock held)."""
+        now = time.time()
+        start = int(now // self.bucket_seconds) * self.bucket_seconds
+        bucket = self._buckets.get(start)
+        if bucket is None:
+            self._expire(now)
+            bucket = self._buckets[start] = {}
+        
+        endpoint, topic = _scope.get()
+        key = (endpoint, provider, model or "", topic)
+        row = bucket.get(key)
+        if row is None:
+            if self._row_count >= self.max_rows:
+                key = (endpoint, provider, model or "", OTHER_TOPIC)
+                row = bucket.get(key)
+            if row is None:
+                row = bucket[key] = [0, 0, 0, 0, 0.0]
+                self._row_count += 1
+        return row
+    
+    def _expire(self, now: float) -> None:
+        """Drop buckets older than the retention."""
+        cutoff = now - self.retention_seconds
+        while self._buckets:
+            start, bucket = next(iter(self._buckets.items()))
+            if start + self.bucket_seconds > cutoff:
+                break
+            self._buckets.popitem(last=False)
+            self._row_count -= len(bucket)
+    
+    def record_call(self, provider: str, model: Optional[str], seconds: float, failed: bool = False) -> None:
+        """Add one upstream call and its latency."""
+        with self._lock:
+            row = self._row(provider, model)
+            row[_CALLS] += 1
+            row[_SECONDS] += seconds
+            if failed:
+                row[_ERRORS] += 1
+    
+    def record_tokens(self, provider: str, model: Optional[str], prompt: Optional[int], completion: Optional[int]) -> None:
+        """Add the tokens a provider reported for a call."""
+        with self._lock:
+            row = self._row(provider, model)
+            row[_PROMPT] += prompt or 0
+            row[_COMPLETION] += completion or 0
+    
+    # ==========================================================================
+    # Queries
+    # ==========================================================================
+    
+    def query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        group_by: Sequence[str] = DEFAULT_GROUP_BY,
+        filters: Optional[Mapping[str, str]] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Aggregate usage over a time window.
+        
+        Args:
+            since: Start of the window (Unix time; default: everything kept).
+            until: End of the window (Unix time; default: now).
+            group_by: Fields of GROUP_FIELDS to group rows by ("time" groups
+                by bucket start).
+            filters: Exact values to keep, e.g. {"endpoint": "/mentor"}.
+            limit: Most rows to return (the biggest token spenders first,
+                or the earliest buckets when grouping by time).
+        
+        Returns:
+            {"window": ..., "group_by": [...], "totals": {...}, "rows": [...]}.
+        """
+        unknown = [field for field in group_by if field not in GROUP_FIELDS]
+        unknown += [field for field in (filters or {}) if field not in GROUP_FIELDS[1:]]
+        if unknown:
+            raise ValueError(f"Unknown usage field(s): {', '.join(unknown)}")
+        
+        until = time.time() if until is None else until
+        since = 0.0 if since is None else since
+        key_fields = GROUP_FIELDS[1:]
+        wanted = [(key_fields.index(field), value) for field, value in (filters or {}).items()]
+        
+        with self._lock:
+            rows = [
+                (start, key, tuple(row))
+                for start, bucket in self._buckets.items()
+                if start + self.bucket_seconds > since and start < until
+                for key, row in bucket.items()
+                if all(key[index] == value for index, value in wanted)
+            ]
+        
+        groups: Dict[Tuple[Any, ...], List[float]] = {}
+        totals = [0, 0, 0, 0, 0.0]
+        for start, key, row in rows:
+            group = tuple(start if field == "time" else key[key_fields.index(field)] for field in group_by)
+            counters = groups.get(group)
+            if counters is None:
+                counters = groups[group] = [0, 0, 0, 0, 0.0]
+            for i, value in enumerate(row):
+                counters[i] += value
+                totals[i] += value
+        
+        if "time" in group_by:
+            order = sorted(groups, key=lambda group: group[list(group_by).index("time")])
+        else:
+            order = sorted(groups, key=lambda group: (-(groups[group][_PROMPT] + groups[group][_COMPLETION]),
+                                                      -groups[group][_CALLS]))
+        if limit is not None:
+            order = order[:limit]
+        
+        return {
+            "window": {
+                "since": since or None,
+                "until": until,
+                "bucket_seconds": self.bucket_seconds,
+            },
+            "group_by": list(group_by),
+            "totals": _summary(totals),
+            "rows": [{**dict(zip(group_by, group)), **_summary(groups[group])} for group in order],
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size of the ledger, for /health."""
+        with self._lock:
+            oldest = next(iter(self._buckets), None)
+            return {"rows": self._row_count, "buckets": len(self._buckets), "oldest": oldest}
+
+
+def _summary(counters: List[float]) -> Dict[str, Any]:
+    """Counters as a JSON row, with per-call and per-token figures."""
+    calls, errors, prompt, completion, seconds = counters
+    return {
+        "calls": int(calls),
+        "errors": int(errors),
+        "prompt_tokens": int(prompt),
+        "completion_tokens": int(completion),
+        "total_tokens": int(prompt + completion),
+        "upstream_seconds": round(seconds, 3),
+        "avg_latency_ms": round(seconds / calls * 1000, 1) if calls else None,
+        "tokens_per_call": round((prompt + completion) / calls, 1) if calls else None,
+        "ms_per_completion_token": round(seconds / completion * 1000, 2) if completion else None,
+    }
+
+
+# =============================================================================
+# GLOBAL LEDGER INSTANCE
+# =============================================================================
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> Optional[UsageLedger]:
+    """
+    Get the process-wide usage ledger.
+    
+    Returns:
+        The shared ledger, or None when USAGE_LEDGER_ENABLED is off.
+    """
+    global _ledger
+    
+    if not config.usage_ledger_enabled:
+        return None
+    
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger(
+                    bucket_seconds=config.usage_ledger_bucket_seconds,
+                    retention_seconds=config.usage_ledger_retention_hours * 3600,
+                    max_rows=config.usage_ledger_max_rows,
+                )
+    return _ledger
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Start a new ledger if its settings changed."""
+    global _ledger
+    
+    if any(name.startswith("usage_ledger_") for name in new.changed_fields(old)):
+        with _ledger_lock:
+            _ledger = None
+
+
+config.on_reload(_on_config_reload)
+
+
+def record_usage_call(provider: str, model: Optional[str], seconds: float, failed: bool = False) -> None:
+    """Add an upstream call to the ledger (no-op when it's off)."""
+    ledger = get_usage_ledger()
+    if ledger is not None:
+        ledger.record_call(provider, model, seconds, failed)
+
+
+def record_usage_tokens(provider: str, model: Optional[str], prompt: Optional[int], completion: Optional[int]) -> None:
+    """Add reported tokens to the ledger (no-op when it's off)."""
+    ledger = get_usage_ledger()
+    if ledger is not None and (prompt or completion):
+        ledger.record_tokens(provider, model, prompt, completion)
+
+
+def usage_report(args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+    """
+    Answer a /usage query.
+    
+    Query parameters:
+        window: Seconds back from now (default 3600); or since/until as
+            Unix times.
+        group_by: Comma-separated GROUP_FIELDS (default endpoint,model,topic).
+        endpoint, provider, model, topic: Exact filters.
+        limit: Most rows to return (default 50).
+    
+    Returns:
+        (JSON body, HTTP status).
+    """
+    ledger = get_usage_ledger()
+    if ledger is None:
+        return {"error": "Usage ledger is disabled"}, 404
+    
+    try:
+        now = time.time()
+        since = float(args["since"]) if args.get("since") else now - float(args.get("window") or 3600)
+        until = float(args["until"]) if args.get("until") else None
+        group_by = [field.strip() for field in (args.get("group_by") or ",".join(DEFAULT_GROUP_BY)).split(",")]
+        filters = {
+            field: (_normalize_topic(args[field]) if field == "topic" else args[field])
+            for field in GROUP_FIELDS[1:] if args.get(field)
+        }
+        limit = int(args.get("limit") or 50)
+        return ledger.query(since, until, [field for field in group_by if field], filters, limit), 200
+    except ValueError as e:
+        return {"error": str(e)}, 400
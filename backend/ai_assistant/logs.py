@@ -0,0 +1,140 @@
+"""
+Structured, non-blocking application logging.
+
+Request handlers and provider clients used to print() progress lines and
+traceback.print_exc() inline, flushing stdout on every request. Under load
+that blocking console I/O showed up in request latency.
+
+Log calls now only put a record on an in-memory queue; a background thread
+(logging.handlers.QueueListener) formats it and writes it to stdout. Each
+record carries the trace and span ids of the request it was logged from
+(see tracing.py), and any `extra={"fields": {...}}` passed by the caller.
+
+Example:
+    log = get_logger("mentor")
+    log.info("Response received", extra={"fields": {"provider": "groq"}})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Optional
+
+from config import config, ConfigSnapshot
+from tracing import current_ids
+
+
+ROOT_LOGGER = "ai_assistant"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records with the request context attached.
+    
+    Only the cheap work happens on the calling thread: the message is
+    merged with its args and the trace ids are read from the context.
+    Formatting (including tracebacks) is left to the listener thread.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        record.trace_id, record.span_id = current_ids()
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+            entry["span_id"] = record.span_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The console format the service used to print: "[TAG] message"."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        tag = record.name.rsplit(".", 1)[-1].upper()
+        line = f"[{tag}] {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def _formatter(log_format: str) -> logging.Formatter:
+    return JsonFormatter() if log_format == "json" else TextFormatter()
+
+
+def setup_logging() -> None:
+    """Attach the queue handler and start the writer thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    
+    with _setup_lock:
+        if _listener is not None:
+            return
+        
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(_formatter(config.log_format))
+        
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(_ContextQueueHandler(log_queue))
+        root.setLevel(_level(config.log_level))
+        root.propagate = False
+        
+        listener = logging.handlers.QueueListener(log_queue, output)
+        listener.start()
+        # Drain what's queued before the interpreter exits
+        atexit.register(listener.stop)
+        _listener = listener
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Get a component logger, e.g. get_logger("groq") -> "ai_assistant.groq"."""
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Apply LOG_LEVEL / LOG_FORMAT changes to the running logger."""
+    if _listener is None:
+        return
+    if new.log_level != old.log_level:
+        logging.getLogger(ROOT_LOGGER).setLevel(_level(new.log_level))
+    if new.log_format != old.log_format:
+        for handler in _listener.handlers:
+            handler.setFormatter(_formatter(new.log_format))
+
+
+config.on_reload(_on_config_reload)
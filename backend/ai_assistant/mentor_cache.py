@@ -0,0 +1,295 @@
+"""
+Near-duplicate answer cache for Mentor Mode.
+
+Many conversations open with nearly the same question on the same topic
+("what is recursion", "explain recursion pls"). This opt-in cache matches
+short conversations by a 64-bit SimHash of their normalized text, so a
+rephrased question can reuse an earlier answer without a provider call.
+
+Everything runs locally: no embedding service is involved. Candidate
+lookup uses LSH banding, which guarantees that any stored signature within
+the configured Hamming distance is found without scanning the whole cache.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import config, ConfigSnapshot
+
+
+SIGNATURE_BITS = 64
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+# Filler words that don't change what is being asked
+_STOPWORDS = frozenset("""
+a about an and any are can could define describe do does explain for give
+help hey hi how i im in is it me my of on or please pls plz quick simple
+simply so tell that the this to u understand want what whats with you
+""".split())
+
+
+# =============================================================================
+# SIMHASH
+# =============================================================================
+
+def _features(text: str) -> List[str]:
+    """Normalized tokens plus adjacent-token bigrams (word order matters a bit)."""
+    tokens = [t for t in _TOKEN_RE.findall(text.casefold()) if t not in _STOPWORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    Compute the 64-bit SimHash of a text.
+    
+    Returns:
+        The signature, or None if the text has no meaningful tokens.
+    """
+    features = _features(text)
+    if not features:
+        return None
+    
+    weights = [0] * SIGNATURE_BITS
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        for bit in range(SIGNATURE_BITS):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+
+def _hamming(a: int, b: int) -> int:
+    """Number of differing bits between two signatures."""
+    return (a ^ b).bit_count()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class _Entry:
+    """A cached answer and the signature it was stored under."""
+    
+    __slots__ = ("scope", "signature", "answer", "expires_at")
+    
+    def __init__(self, scope: Tuple[str, ...], signature: int, answer: str, expires_at: float):
+        self.scope = scope
+        self.signature = signature
+        self.answer = answer
+        self.expires_at = expires_at
+
+
+class MentorAnswerCache:
+    """
+    Bounded, TTL'd cache of Mentor answers keyed by SimHash similarity.
+    
+    Entries are scoped by (provider, model, topic); inside a scope a lookup
+    hits when the stored signature is within `max_distance` bits. Signatures
+    are split into `max_distance + 1` bands, so by the pigeonhole principle
+    every match shares at least one band exactly and is found via the band
+    index.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        ttl: float = 3600,
+        max_entries: int = 512,
+        max_history: int = 1
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            threshold: Required similarity (1 - hamming / 64) for a hit.
+            ttl: Time-to-live for each answer, in seconds.
+            max_entries: Max number of answers kept (LRU eviction).
+            max_history: Longest conversation (in messages) that is cached.
+        """
+        self.max_distance = int((1.0 - threshold) * SIGNATURE_BITS)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_history = max_history
+        
+        self._bands = self.max_distance + 1
+        self._band_bits = SIGNATURE_BITS // self._bands
+        self._band_mask = (1 << self._band_bits) - 1
+        
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._index: Dict[Tuple[Any, ...], Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "skipped": 0, "stores": 0}
+    
+    # ==========================================================================
+    # Public API
+    # ==========================================================================
+    
+    def lookup(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        provider: str,
+        model: Optional[str]
+    ) -> Optional[str]:
+        """Return a cached answer for a near-identical conversation, if any."""
+        key = self._signature(messages)
+        if key is None:
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None
+        
+        scope = self._scope(topic, provider, model)
+        now = time.time()
+        
+        with self._lock:
+            best: Optional[Tuple[int, int]] = None
+            for band_key in self._band_keys(scope, key):
+                for entry_id in self._index.get(band_key, ()):
+                    entry = self._entries[entry_id]
+                    if entry.expires_at <= now:
+                        continue
+                    distance = _hamming(entry.signature, key)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, entry_id)
+            
+            if best is None:
+                self._stats["misses"] += 1
+                return None
+            
+            self._entries.move_to_end(best[1])
+            self._stats["hits"] += 1
+            return self._entries[best[1]].answer
+    
+    def store(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        provider: str,
+        model: Optional[str],
+        answer: str
+    ) -> None:
+        """Cache an answer for a short conversation."""
+        key = self._signature(messages)
+        if key is None:
+            return
+        
+        scope = self._scope(topic, provider, model)
+        entry = _Entry(scope, key, str(answer), time.time() + self.ttl)
+        
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for band_key in self._band_keys(scope, key):
+                self._index.setdefault(band_key, set()).add(entry_id)
+            self._stats["stores"] += 1
+            
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, hit rate and size, for health and metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["max_distance"] = self.max_distance
+        return stats
+    
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+    
+    # ==========================================================================
+    # Internals
+    # ==========================================================================
+    
+    def _signature(self, messages: List[Dict[str, str]]) -> Optional[int]:
+        """SimHash of an eligible conversation, or None if not cacheable."""
+        if not messages or len(messages) > self.max_history:
+            return None
+        if messages[-1].get("role") != "user":
+            return None
+        return simhash(" ".join(str(m.get("content", "")) for m in messages))
+    
+    @staticmethod
+    def _scope(topic: str, provider: str, model: Optional[str]) -> Tuple[str, ...]:
+        """Answers are only shared within the same provider, model and topic."""
+        return (provider, model or "", " ".join(str(topic).split()).casefold())
+    
+    def _band_keys(self, scope: Tuple[str, ...], signature: int):
+        """Index keys for each band of a signature."""
+        for band in range(self._bands):
+            value = (signature >> (band * self._band_bits)) & self._band_mask
+            yield (scope, band, value)
+    
+    def _evict_oldest(self) -> None:
+        """Remove the least recently used entry and its index references."""
+        entry_id, entry = self._entries.popitem(last=False)
+        for band_key in self._band_keys(entry.scope, entry.signature):
+            bucket = self._index.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._index[band_key]
+
+
+# =============================================================================
+# GLOBAL CACHE INSTANCE
+# =============================================================================
+
+_mentor_cache: Optional[MentorAnswerCache] = None
+_mentor_cache_lock = threading.Lock()
+
+
+def get_mentor_cache() -> Optional[MentorAnswerCache]:
+    """
+    Get the process-wide Mentor answer cache.
+    
+    Returns:
+        The shared cache, or None unless MENTOR_CACHE_ENABLED is on.
+    """
+    global _mentor_cache
+    
+    if not config.mentor_cache_enabled:
+        return None
+    
+    if _mentor_cache is None:
+        with _mentor_cache_lock:
+            if _mentor_cache is None:
+                _mentor_cache = MentorAnswerCache(
+                    threshold=config.mentor_cache_threshold,
+                    ttl=config.mentor_cache_ttl,
+                    max_entries=config.mentor_cache_size,
+                    max_history=config.mentor_cache_max_history,
+                )
+    return _mentor_cache
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Rebuild the cache on next use if its settings changed."""
+    global _mentor_cache
+    
+    if any(name.startswith("mentor_cache_") for name in new.changed_fields(old)):
+        with _mentor_cache_lock:
+            _mentor_cache = None
+
+
+config.on_reload(_on_config_reload)
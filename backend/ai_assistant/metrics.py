@@ -0,0 +1,635 @@
+"""
+Prometheus metrics for AI Assistant.
+
+/metrics serves the Prometheus text format, so the question "is it us or
+the provider?" can be answered from a dashboard instead of print() logs:
+
+- HTTP: request count, latency and time to first byte per route, and the
+  requests currently in flight;
+- providers: call latency, time to first chunk for streams, outcomes and
+  token usage per provider/model;
+- fallbacks to demo answers, by reason (provider_error, parse_error,
+  circuit_open, endpoint_error), and Concept Mirror parse outcomes;
+- the counters the caches, sessions, hedging, breakers, retries, rate
+  limiters and admission gates already keep, read at scrape time.
+
+Recording is a dict lookup and an add under a lock. The text is only
+built when /metrics is scraped. No client library is needed.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from base import BaseAIClient, DelegatingClient, is_fallback
+from config import config
+from ledger import record_usage_call, record_usage_tokens
+from logs import get_logger
+
+log = get_logger("metrics")
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans fast cache hits to slow long-form generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# =============================================================================
+# METRIC TYPES
+# =============================================================================
+
+class _Metric:
+    kind = "untyped"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+    
+    kind = "gauge"
+    
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations (cumulative on render)."""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        # Per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+    
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+    
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+_metrics: List[_Metric] = []
+
+
+def _register(metric: _Metric) -> Any:
+    _metrics.append(metric)
+    return metric
+
+
+HTTP_REQUESTS = _register(Counter(
+    "ai_http_requests_total", "HTTP requests handled.", ("route", "method", "status")
+))
+HTTP_LATENCY = _register(Histogram(
+    "ai_http_request_duration_seconds", "Time to handle a request (streams: until the last chunk).", ("route",)
+))
+HTTP_TTFB = _register(Histogram(
+    "ai_http_time_to_first_byte_seconds", "Time until the response (or first stream chunk) was ready.", ("route",)
+))
+HTTP_IN_FLIGHT = _register(Gauge(
+    "ai_http_requests_in_flight", "Requests currently being handled.", ("route",)
+))
+PROVIDER_CALLS = _register(Counter(
+    "ai_provider_calls_total", "Provider client calls by outcome (ok, fallback, error).",
+    ("provider", "model", "method", "outcome")
+))
+PROVIDER_LATENCY = _register(Histogram(
+    "ai_provider_call_duration_seconds", "Provider call latency (streams: until the last chunk).",
+    ("provider", "model", "method")
+))
+PROVIDER_TTFB = _register(Histogram(
+    "ai_provider_time_to_first_chunk_seconds", "Time until a provider stream's first chunk.",
+    ("provider", "model", "method")
+))
+PROVIDER_TOKENS = _register(Counter(
+    "ai_provider_tokens_total", "Tokens reported by the provider (kind: prompt, completion).",
+    ("provider", "model", "kind")
+))
+FALLBACKS = _register(Counter(
+    "ai_fallbacks_total", "Demo answers served instead of a provider answer, by reason.", ("reason",)
+))
+CONCEPT_PARSES = _register(Counter(
+    "ai_concept_parses_total", "Concept Mirror outputs parsed, by outcome (ok, repaired, failed).",
+    ("provider", "outcome")
+))
+
+
+def render() -> str:
+    """The current value of every metric, in Prometheus text format."""
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(_component_lines())
+    return "\n".join(lines) + "\n"
+
+
+# =============================================================================
+# RECORDING HELPERS
+# =============================================================================
+
+def record_tokens(provider: str, model: Optional[str], prompt: Optional[int], completion: Optional[int]) -> None:
+    """Add a call's token usage (None counts are skipped), here and in the usage ledger."""
+    record_usage_tokens(provider, model, prompt, completion)
+    if not config.metrics_enabled:
+        return
+    if prompt:
+        PROVIDER_TOKENS.inc(prompt, provider=provider, model=model or "", kind="prompt")
+    if completion:
+        PROVIDER_TOKENS.inc(completion, provider=provider, model=model or "", kind="completion")
+
+
+def record_fallback(reason: str) -> None:
+    """Count a demo answer served in place of a provider answer."""
+    if config.metrics_enabled:
+        FALLBACKS.inc(reason=reason)
+
+
+def record_concept_parse(provider: str, outcome: str) -> None:
+    """Count a Concept Mirror output by how it parsed (see concept_parser.py)."""
+    if config.metrics_enabled:
+        CONCEPT_PARSES.inc(provider=provider, outcome=outcome)
+
+
+def request_started(route: Optional[str]) -> float:
+    """Mark a request as in flight; returns its start time."""
+    if config.metrics_enabled:
+        HTTP_IN_FLIGHT.inc(route=route or "unmatched")
+    return time.monotonic()
+
+
+def request_first_byte(route: Optional[str], started: float) -> None:
+    if config.metrics_enabled:
+        HTTP_TTFB.observe(time.monotonic() - started, route=route or "unmatched")
+
+
+def request_finished(route: Optional[str], method: str, status: int, started: float) -> None:
+    if not config.metrics_enabled:
+        return
+    route = route or "unmatched"
+    HTTP_IN_FLIGHT.dec(route=route)
+    HTTP_LATENCY.observe(time.monotonic() - started, route=route)
+    HTTP_REQUESTS.inc(route=route, method=method, status=str(status))
+
+
+def first_chunk_timer(chunks: Iterable[str], route: Optional[str], started: float) -> Iterator[str]:
+    """Pass a stream through, recording the request's time to first byte."""
+    first = True
+    for chunk in chunks:
+        if first:
+            request_first_byte(route, started)
+            first = False
+        yield chunk
+
+
+class TimedStream:
+    """
+    Async iterator that times a streamed request until its last chunk.
+    
+    Quart tears the request down before it sends a streamed body, so the
+    request is recorded here instead of in the request hooks: time to first
+    byte on the first chunk, and the request itself once, when the stream
+    is exhausted, raises, or is closed by the server (e.g. on client
+    disconnect), even if it never started.
+    """
+    
+    def __init__(self, chunks: AsyncIterator[str], route: Optional[str], method: str, started: float):
+        self._chunks = chunks
+        self._route = route
+        self._method = method
+        self._started: Optional[float] = started
+        self._first = True
+    
+    def __aiter__(self) -> "TimedStream":
+        return self
+    
+    async def __anext__(self) -> str:
+        try:
+            chunk = await self._chunks.__anext__()
+        except BaseException:
+            # Exhausted (StopAsyncIteration), failed or cancelled
+            self._finish()
+            raise
+        if self._first:
+            self._first = False
+            if self._started is not None:
+                request_first_byte(self._route, self._started)
+        return chunk
+    
+    async def aclose(self) -> None:
+        try:
+            aclose = getattr(self._chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self._finish()
+    
+    def _finish(self) -> None:
+        started, self._started = self._started, None
+        if started is not None:
+            # The 200 went out with the first byte; errors end the stream in-band
+            request_finished(self._route, self._method, 200, started)
+
+
+# =============================================================================
+# PROVIDER CLIENT WRAPPER
+# =============================================================================
+
+class MetricsClient(DelegatingClient):
+    """
+    Client wrapper that records latency and outcome of every provider call.
+    
+    Sits directly around the provider client, so coalesced, hedged and
+    short-circuited calls are not counted as upstream calls. Also feeds the
+    usage ledger (see ledger.py).
+    """
+    
+    def __init__(self, inner: BaseAIClient, provider: str):
+        super().__init__(inner)
+        self.provider = provider
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        return self._timed("generate_response", lambda: self._inner.generate_response(prompt, **kwargs))
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._timed(
+            "generate_response_with_context",
+            lambda: self._inner.generate_response_with_context(prompt, context, system_prompt, **kwargs)
+        )
+    
+    def chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return self._timed("chat", lambda: self._inner.chat(messages, topic, system_prompt, **kwargs))
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return self._timed(
+            "analyze_concept",
+            lambda: self._inner.analyze_concept(concept_name, user_explanation, **kwargs)
+        )
+    
+    def stream_response(self, prompt: str, **kwargs) -> Iterator[str]:
+        return self._timed_stream("stream_response", self._inner.stream_response(prompt, **kwargs))
+    
+    def stream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        return self._timed_stream(
+            "stream_chat", self._inner.stream_chat(messages, topic, system_prompt, **kwargs)
+        )
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        return await self._atimed("agenerate_response", lambda: self._inner.agenerate_response(prompt, **kwargs))
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        return await self._atimed("achat", lambda: self._inner.achat(messages, topic, system_prompt, **kwargs))
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        return await self._atimed(
+            "aanalyze_concept",
+            lambda: self._inner.aanalyze_concept(concept_name, user_explanation, **kwargs)
+        )
+    
+    def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self._atimed_stream("astream_response", self._inner.astream_response(prompt, **kwargs))
+    
+    def astream_chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        return self._atimed_stream(
+            "astream_chat", self._inner.astream_chat(messages, topic, system_prompt, **kwargs)
+        )
+    
+    # ==========================================================================
+    # Recording
+    # ==========================================================================
+    
+    def _labels(self, method: str) -> Dict[str, str]:
+        return {"provider": self.provider, "model": self.model or "", "method": method}
+    
+    def _record(self, method: str, started: float, result: Any = None, failed: bool = False) -> None:
+        elapsed = time.monotonic() - started
+        record_usage_call(self.provider, self.model, elapsed, failed)
+        if not config.metrics_enabled:
+            return
+        labels = self._labels(method)
+        PROVIDER_LATENCY.observe(elapsed, **labels)
+        if failed:
+            outcome = "error"
+        elif is_fallback(result):
+            outcome = "fallback"
+            FALLBACKS.inc(reason=getattr(result, "reason", "provider_error"))
+        else:
+            outcome = "ok"
+        PROVIDER_CALLS.inc(outcome=outcome, **labels)
+    
+    def _timed(self, method: str, call: Callable[[], Any]) -> Any:
+        started = time.monotonic()
+        try:
+            result = call()
+        except Exception:
+            self._record(method, started, failed=True)
+            raise
+        self._record(method, started, result)
+        return result
+    
+    async def _atimed(self, method: str, call: Callable[[], Any]) -> Any:
+        started = time.monotonic()
+        try:
+            result = await call()
+        except Exception:
+            self._record(method, started, failed=True)
+            raise
+        self._record(method, started, result)
+        return result
+    
+    def _timed_stream(self, method: str, chunks: Iterator[str]) -> Iterator[str]:
+        started = time.monotonic()
+        first: Any = None
+        failed = False
+        try:
+            for chunk in chunks:
+                if first is None:
+                    first = chunk
+                    if config.metrics_enabled:
+                        PROVIDER_TTFB.observe(time.monotonic() - started, **self._labels(method))
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also when the consumer stops early (GeneratorExit): the
+            # upstream call still ran
+            self._record(method, started, first, failed=failed)
+    
+    async def _atimed_stream(self, method: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        started = time.monotonic()
+        first: Any = None
+        failed = False
+        try:
+            async for chunk in chunks:
+                if first is None:
+                    first = chunk
+                    if config.metrics_enabled:
+                        PROVIDER_TTFB.observe(time.monotonic() - started, **self._labels(method))
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also when the consumer stops early or is cancelled
+            self._record(method, started, first, failed=failed)
+
+
+# =============================================================================
+# COMPONENT STATS (read at scrape time)
+# =============================================================================
+
+def _component_stats() -> Iterable[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+    """(component, labels, stats dict) for every component that keeps counters."""
+    # Imported lazily: these modules are optional at the point metrics loads
+    from cache import get_concept_cache
+    from mentor_cache import get_mentor_cache
+    from history import get_conversation_window
+    from sessions import get_session_store
+    from hedging import hedge_stats
+    from retry import retry_stats
+    from breaker import breaker_states
+    from ratelimit import rate_limiter_states
+    from admission import get_admission_controller
+    
+    for name, component in (
+        ("concept_cache", get_concept_cache()),
+        ("mentor_cache", get_mentor_cache()),
+        ("history_window", get_conversation_window()),
+        ("sessions", get_session_store()),
+    ):
+        if component is not None:
+            yield name, {}, component.stats()
+    if config.hedge_enabled:
+        yield "hedging", {}, hedge_stats.snapshot()
+    if config.retry_enabled:
+        yield "retries", {}, retry_stats.snapshot()
+    for breaker, stats in breaker_states().items():
+        yield "breaker", {"breaker": breaker}, stats
+    for limiter, stats in rate_limiter_states().items():
+        yield "rate_limiter", {"limiter": limiter}, stats
+    for asynchronous in (False, True):
+        admission = get_admission_controller(asynchronous)
+        if admission is not None:
+            for route, stats in admission.stats().items():
+                yield "admission", {"route": route}, stats
+
+
+def _component_lines() -> List[str]:
+    """Numeric component stats as gauges, e.g. ai_mentor_cache_hits."""
+    by_metric: Dict[str, List[str]] = {}
+    try:
+        components = list(_component_stats())
+    except Exception as e:
+        log.warning(f"Component stats unavailable: {e}")
+        return []
+    for component, labels, stats in components:
+        names = tuple(labels)
+        values = tuple(labels.values())
+        for stat, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f"ai_{component}_{stat}"
+            by_metric.setdefault(metric, []).append(f"{metric}{_format_labels(names, values)} {_format_value(value)}")
+    lines = []
+    for metric, samples in sorted(by_metric.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(samples)
+    return lines
+
+
+# =============================================================================
+# APP INTEGRATION
+# =============================================================================
+
+def install_flask_metrics(app) -> None:
+    """Add request tracking hooks and the /metrics endpoint to a Flask app."""
+    from flask import Response, g, request
+    
+    def route() -> Optional[str]:
+        return request.url_rule.rule if request.url_rule is not None else None
+    
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = request_started(route())
+    
+    @app.after_request
+    def record_response_metrics(response):
+        g.metrics_status = response.status_code
+        if not response.is_streamed:
+            request_first_byte(route(), g.metrics_started)
+        return response
+    
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            status = 500 if exc is not None else g.pop("metrics_status", 500)
+            request_finished(route(), request.method, status, started)
+    
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        """Prometheus scrape endpoint."""
+        return Response(render(), content_type=CONTENT_TYPE)
+
+
+def install_quart_metrics(app) -> None:
+    """Async version of install_flask_metrics() for the Quart app."""
+    from quart import Response, g, request
+    
+    def route() -> Optional[str]:
+        return request.url_rule.rule if request.url_rule is not None else None
+    
+    @app.before_request
+    async def start_request_metrics():
+        g.metrics_started = request_started(route())
+    
+    @app.after_request
+    async def record_response_metrics(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Streams took their start time along (see TimedStream)
+            request_first_byte(route(), started)
+            request_finished(route(), request.method, response.status_code, started)
+        return response
+    
+    @app.teardown_request
+    async def finish_request_metrics(exc):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # No response was produced
+            request_finished(route(), request.method, 500, started)
+    
+    @app.route("/metrics", methods=["GET"])
+    async def metrics_endpoint():
+        """Prometheus scrape endpoint."""
+        return Response(render(), content_type=CONTENT_TYPE)
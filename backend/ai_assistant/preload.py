@@ -0,0 +1,90 @@
+"""
+Provider SDK preloading.
+
+api.py builds the app at import time, but the provider client, and with it
+the groq / google.generativeai SDK (by far the slowest imports on the cold
+path), used to be loaded by the first AI request. On serverless, the first
+request after every cold start paid for it.
+
+preload_provider() builds the pooled client for the active configuration
+at startup instead, as PROVIDER_PRELOAD says:
+
+- background: in a daemon thread, so the app answers at once; a request
+  that needs the client meanwhile waits on the import lock for the rest of
+  the import instead of starting it over;
+- eager: before create_app() returns, which moves the whole cost out of
+  request time (on platforms with a boosted init phase, for less);
+- off: on first use, as before.
+
+Nothing is loaded in demo mode or without an API key, since requests never
+reach the provider then. `python coldstart.py` shows where import time goes.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import config
+from logs import get_logger
+
+log = get_logger("preload")
+
+PRELOAD_MODES = ("background", "eager", "off")
+
+_lock = threading.Lock()
+_status: Dict[str, Any] = {"state": "idle"}
+_started = False
+
+
+def _load() -> None:
+    """Import the provider package and build the pooled client."""
+    started = time.perf_counter()
+    try:
+        from ai_client import get_ai_client
+        get_ai_client()
+    except Exception as e:
+        log.warning(f"Provider preload failed: {e}")
+        result = {"state": "failed", "error": str(e)}
+    else:
+        result = {"state": "done"}
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    
+    with _lock:
+        _status.update(result)
+    log.debug(
+        f"Provider preload {result['state']} in {result['seconds']:.3f}s",
+        extra={"fields": {"provider": config.active_provider}},
+    )
+
+
+def preload_provider(mode: Optional[str] = None) -> None:
+    """
+    Start loading the active provider (once per process).
+    
+    Args:
+        mode: "background", "eager" or "off" (default: PROVIDER_PRELOAD).
+    """
+    global _started
+    mode = mode or config.provider_preload
+    if mode not in PRELOAD_MODES:
+        log.warning(f"Unknown PROVIDER_PRELOAD {mode!r}; using 'background'")
+        mode = "background"
+    if mode == "off" or config.demo_mode or not config.has_api_key():
+        return
+    
+    with _lock:
+        if _started:
+            return
+        _started = True
+        _status.update(state="loading", mode=mode, provider=config.active_provider)
+    
+    if mode == "eager":
+        _load()
+    else:
+        threading.Thread(target=_load, name="provider-preload", daemon=True).start()
+
+
+def preload_stats() -> Dict[str, Any]:
+    """State of the provider preload, for /health."""
+    with _lock:
+        return dict(_status)
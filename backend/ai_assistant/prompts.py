@@ -5,6 +5,8 @@ Contains the exact prompts used by the React frontend for feature parity.
 These prompts define the behavior of Mentor Mode and Concept Mirror Mode.
 """
 
+import hashlib
+
 # =============================================================================
 # MENTOR MODE PROMPT
 # =============================================================================
@@ -134,6 +136,23 @@ If a category has no items, use an empty array [].
 The summary should be 2-4 sentences describing the overall mental model."""
 
 
+# =============================================================================
+# CONVERSATION SUMMARY PROMPT
+# =============================================================================
+
+HISTORY_SUMMARY_PROMPT = """You are summarizing the earlier part of a tutoring conversation so a mentor can continue it without the full transcript.
+
+Write a compact summary (at most 150 words) that keeps:
+- What the learner asked about and what has already been explained
+- Misconceptions the learner showed and whether they were corrected
+- Code, examples or definitions the conversation may refer back to
+- The learner's current level and any stated goals
+
+Do not add advice or new explanations. Plain text, no headers."""
+
+HISTORY_SUMMARY_HEADER = "SUMMARY OF THE EARLIER CONVERSATION (older turns are not shown):"
+
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -156,3 +175,40 @@ User's Explanation:
 {user_explanation}
 
 Analyze this explanation according to your instructions and respond with the JSON structure."""
+
+
+def build_history_summary_prompt(
+    topic: str,
+    previous_summary: str,
+    messages: list
+) -> str:
+    """Build the prompt that folds older Mentor turns into a rolling summary."""
+    transcript = "\n\n".join(
+        f"{'Learner' if msg['role'] == 'user' else 'Mentor'}: {msg['content']}"
+        for msg in messages
+    )
+    previous = previous_summary or "(none yet)"
+    return f"""{HISTORY_SUMMARY_PROMPT}
+
+Topic: {topic}
+
+Summary so far:
+{previous}
+
+New turns to fold into the summary:
+{transcript}
+
+Updated summary:"""
+
+
+def _prompt_fingerprint(*parts: str) -> str:
+    """Short, stable hash of prompt text (used to version cached results)."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+# Changes whenever the Concept Mirror system prompt or user template changes,
+# so cached analyses produced by an older prompt are never served.
+CONCEPT_MIRROR_PROMPT_VERSION = _prompt_fingerprint(
+    CONCEPT_MIRROR_SYSTEM_PROMPT,
+    build_concept_mirror_prompt("{concept_name}", "{user_explanation}"),
+)
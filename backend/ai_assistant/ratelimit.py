@@ -0,0 +1,228 @@
+"""
+Outbound rate limiting driven by provider quota headers.
+
+Groq enforces request and token quotas per model and API key, and bursts
+of traffic used to run straight into them, paying for a 429 and a retry.
+A RateLimiter keeps two token buckets per provider/model/key, one for
+requests and one for (estimated) tokens, so calls are paced before they
+are sent.
+
+The buckets learn the real quota from every response: the
+x-ratelimit-limit-*, x-ratelimit-remaining-* and x-ratelimit-reset-*
+headers set each bucket's capacity, its current level and its refill rate.
+RATE_LIMIT_REQUESTS_PER_MINUTE / RATE_LIMIT_TOKENS_PER_MINUTE only seed the
+buckets until the first response arrives (0 = no limit until then).
+
+Callers queue for capacity up to RATE_LIMIT_MAX_WAIT_MS. A caller whose
+wait would outlast its request deadline fails fast with DeadlineExceeded
+instead of sleeping into a timeout.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from config import config, ConfigSnapshot
+from deadlines import DeadlineExceeded, remaining
+from retry import parse_duration
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would wait longer than RATE_LIMIT_MAX_WAIT_MS."""
+
+
+class _Bucket:
+    """A token bucket whose capacity and refill rate come from the provider."""
+    
+    __slots__ = ("capacity", "rate", "window", "level", "updated")
+    
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        # Seconds a full refill takes; learned from the reset headers
+        self.window = 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+    
+    @property
+    def limited(self) -> bool:
+        return self.capacity > 0
+    
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (after refill)."""
+        if not self.limited or self.level >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (min(amount, self.capacity) - self.level) / self.rate
+    
+    def sync(self, limit: Optional[str], left: Optional[str], reset: Optional[str], now: float) -> None:
+        """Adopt the provider's view of this quota."""
+        try:
+            if limit is not None:
+                self.capacity = float(limit)
+            if left is not None:
+                self.level = min(float(left), self.capacity)
+        except ValueError:
+            return
+        seconds = parse_duration(reset) if reset else None
+        if seconds and self.capacity > self.level:
+            # Full again at the reset time
+            self.rate = (self.capacity - self.level) / seconds
+            self.window = self.capacity / self.rate
+        elif self.capacity > 0:
+            # Nothing to learn from (bucket full, or no reset): capacity per
+            # window, so a limited bucket never stops refilling
+            self.rate = self.capacity / self.window
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Request and token buckets for one provider/model/API key.
+    
+    Thread-safe. Callers reserve capacity up front, so concurrent callers
+    queue in arrival order instead of all waking at once.
+    """
+    
+    def __init__(self, name: str, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.name = name
+        self._requests = _Bucket(requests_per_minute)
+        self._tokens = _Bucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "delayed": 0, "rejected": 0, "waited_ms": 0}
+    
+    def reserve(self, tokens: int, max_wait: float) -> float:
+        """
+        Reserve one request and `tokens` tokens.
+        
+        Returns:
+            Seconds the caller must wait before sending.
+        
+        Raises:
+            DeadlineExceeded: If the wait would outlast the request deadline.
+            RateLimitExceeded: If the wait is longer than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            wait = max(self._requests.wait_for(1), self._tokens.wait_for(tokens))
+            
+            left = remaining()
+            if left is not None and wait >= left:
+                self._stats["rejected"] += 1
+                raise DeadlineExceeded(f"Rate limit for {self.name} would outlast the request deadline")
+            if wait > max_wait:
+                self._stats["rejected"] += 1
+                raise RateLimitExceeded(f"Rate limit for {self.name}: next slot in {wait:.1f}s")
+            
+            # Buckets may go negative: later callers queue behind this one
+            if self._requests.limited:
+                self._requests.level -= 1
+            if self._tokens.limited:
+                self._tokens.level -= tokens
+            self._stats["calls"] += 1
+            if wait > 0:
+                self._stats["delayed"] += 1
+                self._stats["waited_ms"] += int(wait * 1000)
+        return wait
+    
+    def acquire(self, tokens: int) -> None:
+        """Wait for capacity (sync)."""
+        wait = self.reserve(tokens, config.rate_limit_max_wait_ms / 1000.0)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def aacquire(self, tokens: int) -> None:
+        """Wait for capacity (async)."""
+        wait = self.reserve(tokens, config.rate_limit_max_wait_ms / 1000.0)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def observe(self, headers: Optional[Mapping[str, str]]) -> None:
+        """Update the buckets from a response's (or 429 error's) rate-limit headers."""
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for kind, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                bucket.sync(
+                    headers.get(f"x-ratelimit-limit-{kind}"),
+                    headers.get(f"x-ratelimit-remaining-{kind}"),
+                    headers.get(f"x-ratelimit-reset-{kind}"),
+                    now,
+                )
+    
+    def observe_error(self, error: BaseException) -> None:
+        """Learn from the headers of a failed call, if it has any."""
+        self.observe(getattr(getattr(error, "response", None), "headers", None))
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return {
+                **self._stats,
+                "requests_available": round(self._requests.level, 1) if self._requests.limited else None,
+                "tokens_available": round(self._tokens.level) if self._tokens.limited else None,
+            }
+
+
+# =============================================================================
+# LIMITER REGISTRY
+# =============================================================================
+
+_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str, api_key: Optional[str]) -> Optional[RateLimiter]:
+    """
+    Get the process-wide limiter for a provider/model/API key.
+    
+    Returns:
+        The limiter, or None when RATE_LIMIT_ENABLED is off.
+    """
+    if not config.rate_limit_enabled:
+        return None
+    
+    # Quotas are per key; keep only a fingerprint of it
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    key = (provider, model, key_id)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = RateLimiter(
+                    name=f"{provider}:{model}",
+                    requests_per_minute=config.rate_limit_requests_per_minute,
+                    tokens_per_minute=config.rate_limit_tokens_per_minute,
+                )
+                _limiters[key] = limiter
+    return limiter
+
+
+def rate_limiter_states() -> Dict[str, Dict[str, Any]]:
+    """Stats of every limiter, keyed by name."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Start fresh limiters if their settings changed."""
+    if any(name.startswith("rate_limit_") for name in new.changed_fields(old)):
+        with _limiters_lock:
+            _limiters.clear()
+
+
+config.on_reload(_on_config_reload)
@@ -0,0 +1,254 @@
+"""
+Retries for transient provider errors.
+
+A single 429 or 503 from Groq/Gemini used to turn straight into a demo
+fallback (or a 500 from /generate). Provider calls now go through
+with_retries()/awith_retries(), which:
+
+- classify errors: rate limits (429), server errors (5xx), timeouts and
+  connection failures are retried; everything else (bad request, auth,
+  content blocked) is raised at once;
+- wait with exponential backoff and full jitter, so a burst of failing
+  requests doesn't retry in lockstep;
+- honour the provider's own hint when it sends one (Retry-After,
+  x-ratelimit-reset-* headers, or Gemini's RetryInfo);
+- never sleep past the request deadline (see deadlines.py): if the next
+  attempt can't start in time, the last error is raised instead.
+
+Every provider call passes through here, so this is also where the
+"upstream" trace span is recorded, with the number of attempts it took.
+
+The SDKs' built-in retries are turned off so this is the only policy.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import config
+from deadlines import DeadlineExceeded, remaining
+from logs import get_logger
+from tracing import span
+
+log = get_logger("retry")
+
+
+# HTTP statuses worth another attempt
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Exception class names (from the SDKs) for failures without a status
+_RETRYABLE_NAMES = frozenset({
+    "APIConnectionError", "APITimeoutError",        # groq
+    "ServiceUnavailable", "RetryError",              # google.api_core
+})
+
+# Leave this much of the deadline for the attempt itself
+_MIN_ATTEMPT_TIME = 0.5
+
+# Duration strings in rate-limit headers, e.g. "2m59.56s", "7.66s", "150ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+# =============================================================================
+# ERROR CLASSIFICATION
+# =============================================================================
+
+def _status_of(error: BaseException) -> Optional[int]:
+    """HTTP status of an SDK error (groq: status_code, google: code)."""
+    for attr in ("status_code", "code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed provider call is worth another attempt."""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    status = _status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return type(error).__name__ in _RETRYABLE_NAMES
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse "2m59.56s"-style durations (or plain seconds) into seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date."""
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    The provider's own hint for when to retry, in seconds, if it sent one.
+    
+    Looks at Retry-After / retry-after-ms and the x-ratelimit-reset-*
+    headers of the HTTP response, then at RetryInfo in Google error details.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after-ms")
+        if value:
+            seconds = parse_duration(value)
+            if seconds is not None:
+                return seconds / 1000.0
+        value = headers.get("retry-after")
+        if value:
+            seconds = _parse_retry_after(value)
+            if seconds is not None:
+                return max(seconds, 0.0)
+        # On a 429 without Retry-After, wait for the next limit reset
+        resets = [
+            parse_duration(headers.get(name) or "")
+            for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        ]
+        resets = [seconds for seconds in resets if seconds is not None]
+        if resets and _status_of(error) == 429:
+            return min(resets)
+    
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+        if isinstance(detail, dict) and detail.get("retryDelay"):
+            return parse_duration(str(detail["retryDelay"]))
+    return None
+
+
+# =============================================================================
+# POLICY
+# =============================================================================
+
+class _RetryStats:
+    """Process-wide retry counters, for /health."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"retries": 0, "recovered": 0, "gave_up": 0}
+    
+    def incr(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+retry_stats = _RetryStats()
+
+
+def backoff_delay(attempt: int, hint: Optional[float] = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (1-based).
+    
+    Full jitter: uniform in [0, min(max_delay, base * 2^(attempt-1))]. A
+    provider hint is a floor, since retrying sooner is bound to fail again.
+    """
+    base = config.retry_base_delay_ms / 1000.0
+    cap = config.retry_max_delay_ms / 1000.0
+    delay = random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+    if hint is not None:
+        delay = max(delay, hint)
+    return delay
+
+
+def _next_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Delay before the next attempt, or None to give up and raise `error`."""
+    if not config.retry_enabled or attempt >= config.retry_max_attempts:
+        return None
+    if not is_retryable(error):
+        return None
+    
+    delay = backoff_delay(attempt, retry_after(error))
+    if delay > config.retry_max_wait_ms / 1000.0:
+        # e.g. a daily quota reset; not a transient blip
+        return None
+    left = remaining()
+    if left is not None and delay + _MIN_ATTEMPT_TIME > left:
+        return None
+    return delay
+
+
+def with_retries(call: Callable[[], Any]) -> Any:
+    """
+    Run a provider call, retrying transient failures.
+    
+    Args:
+        call: Makes the call; invoked once per attempt, so per-attempt
+            arguments such as timeout=call_timeout() are fresh each time.
+    
+    Raises:
+        The last attempt's exception, once retries are exhausted or the
+        error isn't retryable.
+    """
+    with span("upstream") as upstream:
+        attempt = 1
+        while True:
+            upstream.set("attempts", attempt)
+            try:
+                result = call()
+            except Exception as e:
+                delay = _next_delay(e, attempt)
+                if delay is None:
+                    if attempt > 1:
+                        retry_stats.incr("gave_up")
+                    raise
+                log.warning(f"Attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+                retry_stats.incr("retries")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if attempt > 1:
+                retry_stats.incr("recovered")
+            return result
+
+
+async def awith_retries(call: Callable[[], Awaitable[Any]]) -> Any:
+    """Async version of with_retries(); `call` returns a fresh awaitable per attempt."""
+    with span("upstream") as upstream:
+        attempt = 1
+        while True:
+            upstream.set("attempts", attempt)
+            try:
+                result = await call()
+            except Exception as e:
+                delay = _next_delay(e, attempt)
+                if delay is None:
+                    if attempt > 1:
+                        retry_stats.incr("gave_up")
+                    raise
+                log.warning(f"Attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+                retry_stats.incr("retries")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if attempt > 1:
+                retry_stats.incr("recovered")
+            return result
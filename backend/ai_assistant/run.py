@@ -29,22 +29,19 @@ else:
 # Now import using absolute imports (will work because we added to sys.path)
 from config import config
 from demo import get_mentor_demo_response, get_concept_mirror_demo_response
+from metrics import install_flask_metrics, record_fallback
 
 # Flask app creation
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
 def get_ai_client():
-    """Get an AI client based on configuration."""
+    """Get a pooled AI client based on configuration."""
     try:
-        if config.active_provider == "gemini":
-            from gemini_provider.client import GeminiClient
-            return GeminiClient()
-        elif config.active_provider == "groq":
-            from groq_provider.client import GroqClient
-            return GroqClient()
-        else:
-            raise ValueError(f"Unknown provider: {config.active_provider}")
+        # Clients are long-lived and shared across requests (see ai_client);
+        # no explicit provider, so hedging applies like in api.py
+        from ai_client import get_ai_client as get_pooled_client
+        return get_pooled_client()
     except Exception as e:
         print(f"[ERROR] Failed to create AI client: {e}")
         import traceback
@@ -57,6 +54,9 @@ def create_app():
     # Allow all origins for development to prevent CORS issues
     CORS(app, resources={r"/*": {"origins": "*"}})
     
+    # Request metrics and /metrics
+    install_flask_metrics(app)
+    
     @app.route("/", methods=["GET"])
     @app.route("/health", methods=["GET"])
     def health_check():
@@ -104,9 +104,10 @@ def create_app():
                 "provider": config.active_provider,
                 "model": client.model,
             })
-            
+        
         except Exception as e:
             print(f"[MENTOR ERROR] {e}")
+            record_fallback("endpoint_error")
             response = get_mentor_demo_response(
                 data.get("messages", []) if data else [],
                 data.get("topic", "General") if data else "General"
@@ -152,8 +153,9 @@ def create_app():
                 "provider": config.active_provider,
                 "model": client.model,
             })
-            
+        
         except Exception as e:
+            record_fallback("endpoint_error")
             result = get_concept_mirror_demo_response(
                 data.get("concept", "") if data else "",
                 data.get("explanation", "") if data else ""
@@ -191,7 +193,7 @@ def create_app():
                 "provider": config.active_provider,
                 "model": client.model,
             })
-            
+        
         except Exception as e:
             return jsonify({
                 "error": str(e),
@@ -213,6 +215,9 @@ if __name__ == "__main__":
     print(f"Starting server at http://{config.flask_host}:{config.flask_port}")
     print("=" * 60)
     
+    # `kill -HUP <pid>` reloads the configuration
+    config.install_reload_signal()
+    
     app = create_app()
     app.run(
         host=config.flask_host,
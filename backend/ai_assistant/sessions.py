@@ -0,0 +1,552 @@
+"""
+Server-side Mentor sessions.
+
+Instead of re-uploading the whole `messages` array on every turn, a client
+can send a session id plus only its new message; the server keeps the
+conversation. Request bodies and JSON parsing stay constant-size no matter
+how long the session runs.
+
+The store is compact: roles are stored as small ints, each message is a
+`__slots__` record, and longer content is zlib-compressed. Sessions live in
+an in-memory LRU; evicted sessions spill to a local SQLite file (if
+configured) and are loaded back on their next turn.
+"""
+
+import asyncio
+import json
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import config, ConfigSnapshot
+from logs import get_logger
+
+log = get_logger("sessions")
+
+
+# Interned roles: a message stores an index into this tuple
+ROLES = ("user", "assistant")
+_ROLE_INDEX = {role: i for i, role in enumerate(ROLES)}
+
+# Content shorter than this isn't worth compressing
+_COMPRESS_MIN_BYTES = 128
+
+# Purge expired SQLite rows after this many writes
+_PURGE_EVERY = 256
+
+# Max length of a new message sent through the session protocol
+MAX_MESSAGE_CHARS = 20000
+
+
+class SessionError(Exception):
+    """A session request that can't be served (maps to an HTTP status)."""
+    
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# =============================================================================
+# COMPACT RECORDS
+# =============================================================================
+
+class _Message:
+    """One stored turn: interned role + (possibly compressed) UTF-8 content."""
+    
+    __slots__ = ("role", "compressed", "data")
+    
+    def __init__(self, role: str, content: str):
+        raw = content.encode("utf-8")
+        self.role = _ROLE_INDEX.get(role, 1)
+        self.compressed = len(raw) >= _COMPRESS_MIN_BYTES
+        self.data = zlib.compress(raw, 1) if self.compressed else raw
+    
+    @property
+    def content(self) -> str:
+        raw = zlib.decompress(self.data) if self.compressed else self.data
+        return raw.decode("utf-8")
+    
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": ROLES[self.role], "content": self.content}
+
+
+class _Session:
+    """A conversation and its bookkeeping."""
+    
+    __slots__ = ("topic", "messages", "updated_at")
+    
+    def __init__(self, topic: str, messages: Optional[List[_Message]] = None):
+        self.topic = topic
+        self.messages: List[_Message] = messages or []
+        self.updated_at = time.time()
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class SessionStore:
+    """
+    Bounded, TTL'd store of Mentor sessions with optional SQLite spill.
+    
+    Thread-safe. Sessions are kept in memory until the LRU evicts them; with
+    a db_path, evicted sessions are written to SQLite and moved back into
+    memory on their next use. Any SQLite error disables the disk tier and
+    the store keeps working from memory.
+    """
+    
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl: float = 86400,
+        max_messages: int = 500,
+        db_path: Optional[str] = None
+    ):
+        """
+        Initialize the store.
+        
+        Args:
+            max_sessions: Max sessions kept in memory (LRU eviction).
+            ttl: Idle time after which a session expires, in seconds.
+            max_messages: Max messages kept per session (oldest dropped).
+            db_path: SQLite file for spilled sessions, or None for memory only.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.db_path = db_path
+        
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"created": 0, "turns": 0, "spilled": 0, "restored": 0, "expired": 0}
+        self._writes_since_purge = 0
+        
+        if self.db_path:
+            self._init_db()
+    
+    # ==========================================================================
+    # Public API
+    # ==========================================================================
+    
+    def create(self, topic: str, messages: Iterable[Dict[str, str]] = ()) -> str:
+        """Start a session (optionally seeded with history) and return its id."""
+        session_id = secrets.token_urlsafe(16)
+        session = _Session(topic, [_Message(m["role"], m["content"]) for m in messages])
+        self._trim(session)
+        
+        with self._lock:
+            self._sessions[session_id] = session
+            self._stats["created"] += 1
+        self._evict()
+        return session_id
+    
+    def get(self, session_id: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """
+        Load a session.
+        
+        Returns:
+            (topic, messages), or None if the session is unknown or expired.
+        """
+        session = self._load(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            return session.topic, [m.to_dict() for m in session.messages]
+    
+    def append(self, session_id: str, messages: Iterable[Dict[str, str]]) -> bool:
+        """
+        Append turns to a session.
+        
+        Returns:
+            False if the session no longer exists.
+        """
+        session = self._load(session_id)
+        if session is None:
+            return False
+        records = [_Message(m["role"], m["content"]) for m in messages]
+        with self._lock:
+            session.messages.extend(records)
+            session.updated_at = time.time()
+            self._trim(session)
+            self._stats["turns"] += len(records)
+        return True
+    
+    def delete(self, session_id: str) -> bool:
+        """Remove a session. Returns True if it existed."""
+        with self._lock:
+            existed = self._sessions.pop(session_id, None) is not None
+        return self._db_delete(session_id) or existed
+    
+    def stats(self) -> Dict[str, Any]:
+        """Session counters and current size, for health and metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_memory"] = len(self._sessions)
+        stats["persistent"] = bool(self.db_path)
+        return stats
+    
+    # ==========================================================================
+    # Memory Tier
+    # ==========================================================================
+    
+    def _load(self, session_id: str) -> Optional[_Session]:
+        """Find a live session in memory, restoring it from SQLite if spilled."""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if session.updated_at + self.ttl > now:
+                    self._sessions.move_to_end(session_id)
+                    return session
+                del self._sessions[session_id]
+                self._stats["expired"] += 1
+                return None
+        
+        session = self._db_take(session_id, now)
+        if session is None:
+            return None
+        with self._lock:
+            # Another thread may have restored it meanwhile; keep that copy
+            session = self._sessions.setdefault(session_id, session)
+            self._sessions.move_to_end(session_id)
+            self._stats["restored"] += 1
+        self._evict()
+        return session
+    
+    def _trim(self, session: _Session) -> None:
+        """Drop the oldest turns beyond max_messages."""
+        excess = len(session.messages) - self.max_messages
+        if excess > 0:
+            del session.messages[:excess]
+    
+    def _evict(self) -> None:
+        """Evict least recently used sessions, spilling them to SQLite."""
+        evicted = []
+        with self._lock:
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False))
+        for session_id, session in evicted:
+            if session.updated_at + self.ttl > time.time() and self._db_put(session_id, session):
+                with self._lock:
+                    self._stats["spilled"] += 1
+    
+    # ==========================================================================
+    # SQLite Tier
+    # ==========================================================================
+    
+    def _init_db(self) -> None:
+        """Create the table (idempotent) and purge expired rows."""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS mentor_sessions ("
+                    " id TEXT PRIMARY KEY,"
+                    " topic TEXT NOT NULL,"
+                    " messages BLOB NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "DELETE FROM mentor_sessions WHERE updated_at <= ?",
+                    (time.time() - self.ttl,)
+                )
+        except sqlite3.Error as e:
+            self._disable_db(e)
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Get this thread's SQLite connection, opening it if needed."""
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=1.0)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error as e:
+                self._disable_db(e)
+                return None
+            self._local.conn = conn
+        return conn
+    
+    def _db_put(self, session_id: str, session: _Session) -> bool:
+        """Write a spilled session as one compressed row."""
+        conn = self._connection()
+        if conn is None:
+            return False
+        # Records already hold compressed bytes; the row stores plain JSON
+        # compressed once as a whole, which packs better than per-message
+        payload = zlib.compress(json.dumps(
+            [[m.role, m.content] for m in session.messages],
+            separators=(",", ":")
+        ).encode("utf-8"), 6)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO mentor_sessions (id, topic, messages, updated_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (session_id, session.topic, payload, session.updated_at)
+                )
+                self._writes_since_purge += 1
+                if self._writes_since_purge >= _PURGE_EVERY:
+                    self._writes_since_purge = 0
+                    conn.execute(
+                        "DELETE FROM mentor_sessions WHERE updated_at <= ?",
+                        (time.time() - self.ttl,)
+                    )
+        except sqlite3.Error as e:
+            self._disable_db(e)
+            return False
+        return True
+    
+    def _db_take(self, session_id: str, now: float) -> Optional[_Session]:
+        """Read a spilled session and remove its row (memory owns it again)."""
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT topic, messages, updated_at FROM mentor_sessions"
+                    " WHERE id = ? AND updated_at > ?",
+                    (session_id, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM mentor_sessions WHERE id = ?", (session_id,))
+        except sqlite3.Error as e:
+            self._disable_db(e)
+            return None
+        
+        topic, payload, updated_at = row
+        try:
+            items = json.loads(zlib.decompress(payload))
+        except (zlib.error, ValueError) as e:
+            log.warning(f"Dropping unreadable session {session_id}: {e}")
+            return None
+        session = _Session(topic, [_Message(ROLES[role], content) for role, content in items])
+        session.updated_at = updated_at
+        return session
+    
+    def _db_delete(self, session_id: str) -> bool:
+        """Delete a spilled session row."""
+        conn = self._connection()
+        if conn is None:
+            return False
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM mentor_sessions WHERE id = ?", (session_id,))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            self._disable_db(e)
+            return False
+    
+    def _disable_db(self, error: Exception) -> None:
+        """Fall back to memory-only sessions after a SQLite failure."""
+        log.warning(f"Disabling SQLite tier ({self.db_path}): {error}")
+        self.db_path = None
+    
+    def __repr__(self) -> str:
+        return (
+            f"SessionStore(max_sessions={self.max_sessions}, "
+            f"ttl={self.ttl}, db_path={self.db_path})"
+        )
+
+
+# =============================================================================
+# GLOBAL STORE INSTANCE
+# =============================================================================
+
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Get the process-wide Mentor session store."""
+    global _session_store
+    
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                _session_store = SessionStore(
+                    max_sessions=config.session_store_size,
+                    ttl=config.session_ttl,
+                    max_messages=config.session_max_messages,
+                    db_path=config.session_store_path,
+                )
+    return _session_store
+
+
+def _on_config_reload(old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+    """Apply new limits to the live store (sessions are kept)."""
+    store = _session_store
+    if store is None:
+        return
+    store.max_sessions = new.session_store_size
+    store.ttl = new.session_ttl
+    store.max_messages = new.session_max_messages
+
+
+config.on_reload(_on_config_reload)
+
+
+async def astore_call(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a session-store call from async code.
+    
+    A store that spills to SQLite can block on disk I/O, so the call runs
+    in a worker thread instead of on the event loop. Memory-only stores are
+    called inline.
+    """
+    if not get_session_store().db_path:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+# =============================================================================
+# MENTOR REQUEST PROTOCOL
+# =============================================================================
+
+def _validate_messages(messages: Any) -> None:
+    """
+    Check a client-sent history: a list of {"role": str, "content": str}.
+    
+    Raises:
+        SessionError: If it isn't one.
+    """
+    if not isinstance(messages, list):
+        raise SessionError("Messages must be an array")
+    for i, msg in enumerate(messages):
+        if not isinstance(msg, dict):
+            raise SessionError(f"Message {i} must be an object")
+        if not isinstance(msg.get("role"), str) or not msg["role"]:
+            raise SessionError(f"Message {i} needs a role")
+        if not isinstance(msg.get("content"), str):
+            raise SessionError(f"Message {i} needs a string content")
+
+
+class MentorTurn:
+    """
+    One /mentor request, in either the full-history or the session protocol.
+    
+    Full history (unchanged):
+        {"messages": [...], "topic": "Python"}
+    
+    Session (delta) protocol:
+        {"message": "first question", "topic": "Python"}   -> new session
+        {"session_id": "...", "message": "next question"}  -> continue
+        {"session_id": "...", "messages": [...]}           -> re-seed history
+    
+    Session responses carry "session_id". An unknown or expired session is a
+    404, and the client can re-seed it by sending its full history.
+    """
+    
+    __slots__ = ("messages", "topic", "session_id", "_new_message")
+    
+    def __init__(
+        self,
+        messages: List[Dict[str, str]],
+        topic: str,
+        session_id: Optional[str] = None,
+        new_message: Optional[Dict[str, str]] = None
+    ):
+        self.messages = messages
+        self.topic = topic
+        self.session_id = session_id
+        self._new_message = new_message
+    
+    @classmethod
+    def from_request(cls, data: Dict[str, Any]) -> "MentorTurn":
+        """
+        Resolve a request body into the conversation to answer.
+        
+        Raises:
+            SessionError: If the body is invalid or the session is unknown.
+        """
+        session_id = data.get("session_id")
+        message = data.get("message")
+        messages = data.get("messages")
+        
+        if messages is not None:
+            _validate_messages(messages)
+        
+        if session_id is None and message is None:
+            # Full-history protocol
+            if not messages:
+                raise SessionError("Messages array is required")
+            return cls(messages, data.get("topic", "General"))
+        
+        store = get_session_store()
+        
+        if messages:
+            # Re-seed (or start) a session with the client's full history
+            if session_id is not None:
+                store.delete(str(session_id))
+            topic = data.get("topic", "General")
+            session_id = store.create(topic, messages[:-1])
+            last = messages[-1]
+            return cls(list(messages), topic, session_id, last)
+        
+        if not isinstance(message, str) or not message.strip():
+            raise SessionError("Message is required")
+        if len(message) > MAX_MESSAGE_CHARS:
+            raise SessionError(f"Message must be at most {MAX_MESSAGE_CHARS} characters")
+        new_message = {"role": "user", "content": message}
+        
+        if session_id is None:
+            topic = data.get("topic", "General")
+            session_id = store.create(topic)
+            return cls([new_message], topic, session_id, new_message)
+        
+        session = store.get(str(session_id))
+        if session is None:
+            raise SessionError("Session not found or expired", status=404)
+        topic, history = session
+        return cls(history + [new_message], topic, str(session_id), new_message)
+    
+    @classmethod
+    async def afrom_request(cls, data: Dict[str, Any]) -> "MentorTurn":
+        """Async version of from_request() (store access runs off the event loop)."""
+        return await astore_call(cls.from_request, data)
+    
+    def record(self, response: str) -> None:
+        """Append the new message and the reply to the session, if any."""
+        if self.session_id is None or self._new_message is None:
+            return
+        get_session_store().append(self.session_id, [
+            self._new_message,
+            {"role": "assistant", "content": str(response)},
+        ])
+    
+    async def arecord(self, response: str) -> None:
+        """Async version of record()."""
+        if self.session_id is None or self._new_message is None:
+            return
+        await astore_call(self.record, response)
+    
+    def record_stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Pass chunks through, recording the full reply once the stream completes."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.record("".join(parts))
+    
+    async def arecord_stream(self, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Async version of record_stream()."""
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        await self.arecord("".join(parts))
+    
+    def response_fields(self) -> Dict[str, str]:
+        """Extra response fields for session requests."""
+        return {"session_id": self.session_id} if self.session_id is not None else {}
@@ -0,0 +1,287 @@
+"""
+Request coalescing (single-flight) for provider calls.
+
+When a classroom submits the same text at once, every identical in-flight
+request would otherwise make its own upstream call. A single-flight group
+lets the first caller (the leader) make the call while concurrent callers
+with the same fingerprint wait for it and share its result or its error.
+Nothing is kept once the call finishes, so results are never stale.
+
+The shared call runs under the leader's request deadline and in its task.
+If that deadline ended it, or the leader was cancelled, the outcome isn't
+shared: waiters with time left make the call again, one of them as the new
+leader.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from base import BaseAIClient, DelegatingClient, is_fallback
+from deadlines import DeadlineExceeded, remaining
+
+
+# Outcome of a call that waiters must not share (they make the call again):
+# the leader's deadline ended it, or the leader was cancelled
+_RETRY = object()
+
+
+def _expired(error: Optional[BaseException], result: Any = None) -> bool:
+    """Whether a failed call was cut short by the leader's own deadline."""
+    if isinstance(error, DeadlineExceeded):
+        return True
+    if error is None and not is_fallback(result):
+        return False
+    left = remaining()
+    return left is not None and left <= 0
+
+
+class _Call:
+    """An in-flight call that other callers can wait on."""
+    
+    __slots__ = ("done", "result", "error")
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Thread-based single-flight group.
+    
+    Example:
+        group = SingleFlight()
+        result = group.do(key, lambda: client.analyze_concept(...))
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "shared": 0}
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run `fn` once for all concurrent callers using the same key.
+        
+        Args:
+            key: Request fingerprint.
+            fn: Zero-argument function that performs the call.
+        
+        Returns:
+            The result of the leader's call.
+        
+        Raises:
+            Whatever the leader's call raised, delivered to every waiter
+            (except a blown leader deadline, after which waiters retry).
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    self._stats["calls"] += 1
+                    leader = True
+                else:
+                    self._stats["shared"] += 1
+                    leader = False
+            
+            if leader:
+                break
+            
+            # Wait no longer than this caller's own deadline allows
+            left = remaining()
+            if not call.done.wait(timeout=max(left, 0.0) if left is not None else None):
+                raise DeadlineExceeded()
+            if call.result is _RETRY:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            if _expired(e):
+                call.result = _RETRY
+            else:
+                call.error = e
+            raise
+        else:
+            call.result = _RETRY if _expired(None, result) else result
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    def stats(self) -> Dict[str, int]:
+        """Number of leader calls and of callers that shared one."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """asyncio-based single-flight group for the ASGI app."""
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {"calls": 0, "shared": 0}
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of SingleFlight.do()."""
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self._stats["shared"] += 1
+            # Shield so a cancelled (or timed-out) waiter doesn't cancel the shared call
+            left = remaining()
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.shield(future), max(left, 0.0) if left is not None else None
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded() from None
+            if result is not _RETRY:
+                return result
+        
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._stats["calls"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # The leader's request went away (client gone, hedge lost), but
+            # the waiters' requests haven't: they make the call again
+            future.set_result(_RETRY)
+            raise
+        except BaseException as e:
+            if _expired(e):
+                future.set_result(_RETRY)
+            else:
+                future.set_exception(e)
+                # Mark as retrieved so lone failures don't log "never retrieved"
+                future.exception()
+            raise
+        else:
+            future.set_result(_RETRY if _expired(None, result) else result)
+            return result
+        finally:
+            del self._calls[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Number of leader calls and of callers that shared one."""
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._calls)
+        return stats
+
+
+def request_fingerprint(method: str, model: Optional[str], *args: Any, **kwargs: Any) -> str:
+    """Stable hash identifying an upstream request."""
+    raw = json.dumps([method, model, args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CoalescingClient(DelegatingClient):
+    """
+    Client wrapper that coalesces identical concurrent calls.
+    
+    Applies to the request/response methods (sync and async). Streaming
+    methods are passed through unchanged, since a stream can't be shared.
+    """
+    
+    def __init__(self, inner: BaseAIClient):
+        super().__init__(inner)
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        key = request_fingerprint("generate_response", self.model, prompt, **kwargs)
+        return self._flight.do(
+            key, lambda: self._inner.generate_response(prompt, **kwargs)
+        )
+    
+    def generate_response_with_context(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        key = request_fingerprint(
+            "generate_response_with_context", self.model,
+            prompt, context, system_prompt, **kwargs
+        )
+        return self._flight.do(
+            key,
+            lambda: self._inner.generate_response_with_context(
+                prompt, context, system_prompt, **kwargs
+            )
+        )
+    
+    def chat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        key = request_fingerprint("chat", self.model, messages, topic, system_prompt, **kwargs)
+        return self._flight.do(
+            key, lambda: self._inner.chat(messages, topic, system_prompt, **kwargs)
+        )
+    
+    def analyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        key = request_fingerprint(
+            "analyze_concept", self.model, concept_name, user_explanation, **kwargs
+        )
+        return self._flight.do(
+            key, lambda: self._inner.analyze_concept(concept_name, user_explanation, **kwargs)
+        )
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        key = request_fingerprint("generate_response", self.model, prompt, **kwargs)
+        return await self._aflight.do(
+            key, lambda: self._inner.agenerate_response(prompt, **kwargs)
+        )
+    
+    async def achat(
+        self,
+        messages: list,
+        topic: str,
+        system_prompt: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        key = request_fingerprint("chat", self.model, messages, topic, system_prompt, **kwargs)
+        return await self._aflight.do(
+            key, lambda: self._inner.achat(messages, topic, system_prompt, **kwargs)
+        )
+    
+    async def aanalyze_concept(
+        self,
+        concept_name: str,
+        user_explanation: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        key = request_fingerprint(
+            "analyze_concept", self.model, concept_name, user_explanation, **kwargs
+        )
+        return await self._aflight.do(
+            key, lambda: self._inner.aanalyze_concept(concept_name, user_explanation, **kwargs)
+        )
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Coalescing counters for the sync and async paths."""
+        return {"sync": self._flight.stats(), "async": self._aflight.stats()}
@@ -0,0 +1,305 @@
+"""
+Streaming helpers for AI Assistant.
+
+Turns the text chunks produced by BaseAIClient.stream_chat() and
+stream_response() into server-sent events (SSE), coalescing tiny chunks
+so the client is not flooded with one event per token.
+"""
+
+import contextvars
+import json
+import queue
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from deadlines import DeadlineExceeded
+
+
+# Flush once this many characters are buffered...
+DEFAULT_MIN_CHARS = 24
+
+# ...or once the oldest buffered chunk has waited this long (seconds)
+DEFAULT_MAX_DELAY = 0.05
+
+# Upper bound for the adaptive flush size when the client reads slowly
+DEFAULT_MAX_CHARS = 2048
+
+
+class _Failure:
+    """An upstream error, passed from the reader to the consumer."""
+    
+    __slots__ = ("error",)
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+# Marks the end of the upstream stream
+_END = object()
+
+
+class _Coalescer:
+    """Flush decisions shared by coalesce_chunks() and acoalesce_chunks()."""
+    
+    def __init__(self, min_chars: int, max_delay: float, max_chars: int):
+        self.min_chars = min_chars
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._due = 0.0
+        self._threshold = min_chars
+        self._flushed_any = False
+    
+    def add(self, chunk: str) -> Optional[str]:
+        """Buffer a chunk; returns the text to flush now, if any."""
+        if not chunk:
+            return None
+        now = time.monotonic()
+        if not self._buffer:
+            self._due = now + self.max_delay
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._flushed_any and self._buffered < self._threshold and now < self._due:
+            return None
+        return self.take()
+    
+    def wait(self) -> Optional[float]:
+        """Seconds until the buffered text is due, or None if nothing is buffered."""
+        if not self._buffer:
+            return None
+        return max(self._due - time.monotonic(), 0.0)
+    
+    def take(self) -> str:
+        """Empty the buffer; returns its text (may be empty)."""
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        if text:
+            self._flushed_any = True
+        return text
+    
+    def sent(self, seconds: float) -> None:
+        """Adapt the flush size to how long the consumer took to accept a chunk."""
+        if seconds > self.max_delay:
+            self._threshold = min(self._threshold * 2, self.max_chars)
+        else:
+            self._threshold = max(self._threshold // 2, self.min_chars)
+
+
+def coalesce_chunks(
+    chunks: Iterable[str],
+    min_chars: int = DEFAULT_MIN_CHARS,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    max_chars: int = DEFAULT_MAX_CHARS,
+) -> Iterator[str]:
+    """
+    Merge small text chunks into larger ones.
+    
+    The first chunk is always flushed immediately to keep time-to-first-token
+    low. After that, text is flushed when enough characters are buffered or
+    when the oldest buffered text has waited `max_delay` seconds, even if
+    the upstream has paused (e.g. while the model thinks mid-answer).
+    
+    The upstream is read on a helper thread (in the caller's context) so the
+    timer can fire between chunks. When the consumer (a slow client socket)
+    takes longer than `max_delay` to accept a chunk, the flush size doubles
+    (up to `max_chars`) so fewer, larger events are written; it shrinks back
+    once the client keeps up. If the consumer stops early, the reader closes
+    the upstream after its next chunk.
+    
+    Args:
+        chunks: Iterable of text chunks, e.g. from stream_chat().
+        min_chars: Minimum number of characters per flushed chunk.
+        max_delay: Maximum time buffered text may wait before flushing.
+        max_chars: Maximum flush size under backpressure.
+    
+    Yields:
+        Coalesced text chunks, in order.
+    """
+    coalescer = _Coalescer(min_chars, max_delay, max_chars)
+    received: "queue.Queue[Any]" = queue.Queue()
+    stopped = threading.Event()
+    
+    def read() -> None:
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                received.put(chunk)
+                if stopped.is_set():
+                    break
+        except BaseException as e:
+            received.put(_Failure(e))
+        else:
+            received.put(_END)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+    
+    threading.Thread(
+        target=contextvars.copy_context().run, args=(read,),
+        name="stream-reader", daemon=True,
+    ).start()
+    
+    try:
+        while True:
+            try:
+                item = received.get(timeout=coalescer.wait())
+            except queue.Empty:
+                # The oldest buffered text is due and the upstream is quiet
+                text = coalescer.take()
+            else:
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                text = coalescer.add(item)
+                if text is None:
+                    continue
+            
+            sent_at = time.monotonic()
+            yield text
+            # Time spent suspended in yield is time the consumer took to write
+            coalescer.sent(time.monotonic() - sent_at)
+    finally:
+        stopped.set()
+    
+    text = coalescer.take()
+    if text:
+        yield text
+
+
+async def acoalesce_chunks(
+    chunks: AsyncIterable[str],
+    min_chars: int = DEFAULT_MIN_CHARS,
+    max_delay: float = DEFAULT_MAX_DELAY,
+    max_chars: int = DEFAULT_MAX_CHARS,
+) -> AsyncIterator[str]:
+    """
+    Async version of coalesce_chunks() for the ASGI app.
+    
+    The upstream is read by a task; waiting for its next chunk is bounded
+    by asyncio.wait_for() so buffered text is flushed on time. The reader
+    is cancelled if the consumer stops early.
+    """
+    # Imported here: the Flask app's cold start shouldn't pay for asyncio
+    import asyncio
+    
+    coalescer = _Coalescer(min_chars, max_delay, max_chars)
+    received: "asyncio.Queue[Any]" = asyncio.Queue()
+    
+    async def read() -> None:
+        try:
+            async for chunk in chunks:
+                received.put_nowait(chunk)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            received.put_nowait(_Failure(e))
+        else:
+            received.put_nowait(_END)
+    
+    reader = asyncio.ensure_future(read())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(received.get(), coalescer.wait())
+            except asyncio.TimeoutError:
+                text = coalescer.take()
+            else:
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                text = coalescer.add(item)
+                if text is None:
+                    continue
+            
+            sent_at = time.monotonic()
+            yield text
+            coalescer.sent(time.monotonic() - sent_at)
+    finally:
+        reader.cancel()
+    
+    text = coalescer.take()
+    if text:
+        yield text
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Format a payload as a single server-sent event.
+    
+    Args:
+        data: JSON-serializable payload for the `data:` field.
+        event: Optional event name (defaults to the SSE "message" event).
+    
+    Returns:
+        The encoded event, terminated by a blank line.
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_stream(chunks: Iterable[str], done: Dict[str, Any]) -> Iterator[str]:
+    """
+    Encode a chunk stream as SSE events.
+    
+    Each coalesced chunk is sent as `data: {"token": "..."}`. The stream ends
+    with an `event: done` carrying `done` (provider, model, ...) or, if the
+    upstream fails mid-stream, an `event: error` with the error message
+    (and `"outcome": "deadline_exceeded"` if the request ran out of time).
+    
+    Args:
+        chunks: Iterable of text chunks from the provider.
+        done: Payload for the final `done` event.
+    
+    Yields:
+        Encoded SSE events.
+    """
+    try:
+        for text in coalesce_chunks(chunks):
+            yield format_sse({"token": text})
+    except DeadlineExceeded as e:
+        yield format_sse({"error": str(e), "outcome": "deadline_exceeded"}, event="error")
+        return
+    except Exception as e:
+        yield format_sse({"error": str(e)}, event="error")
+        return
+    
+    yield format_sse(done, event="done")
+
+
+async def asse_stream(
+    chunks: AsyncIterable[str],
+    done: Dict[str, Any],
+) -> AsyncIterator[str]:
+    """Async version of sse_stream() for the ASGI app."""
+    try:
+        async for text in acoalesce_chunks(chunks):
+            yield format_sse({"token": text})
+    except DeadlineExceeded as e:
+        yield format_sse({"error": str(e), "outcome": "deadline_exceeded"}, event="error")
+        return
+    except Exception as e:
+        yield format_sse({"error": str(e)}, event="error")
+        return
+    
+    yield format_sse(done, event="done")
+
+
+async def aiter_once(text: str) -> AsyncIterator[str]:
+    """Wrap a complete text (e.g. a demo response) as a one-chunk stream."""
+    yield text
+
+
+# Response headers for SSE: disable caching and proxy buffering (nginx/Vercel)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
@@ -0,0 +1,11 @@
+"""
+Shared pytest setup.
+
+The modules import each other by bare name (as run.py arranges), so the
+ai_assistant directory goes on the path here.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,253 @@
+"""
+Tests for the resilience layers' cancellation and retry paths.
+
+These are the paths a load test rarely hits on purpose: a single-flight
+leader that goes away, a half-open breaker probe that never reports back,
+and a hedged call whose loser must be cancelled.
+
+Run from the ai_assistant directory:
+    python -m pytest -q tests
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from base import BaseAIClient, answered_by
+from breaker import BreakerClient, CircuitBreaker, HALF_OPEN
+from deadlines import DeadlineExceeded, reset_deadline, set_deadline
+from hedging import HedgedClient, hedge_stats
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+class StubClient(BaseAIClient):
+    """Provider stand-in that answers its own name after `delay` seconds."""
+    
+    def __init__(self, name: str, delay: float = 0.0):
+        super().__init__(api_key="test", model=f"{name}-model")
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = 0
+    
+    def generate_response(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.name
+    
+    def generate_response_with_context(self, prompt: str, context=None, system_prompt=None, **kwargs) -> str:
+        return self.generate_response(prompt)
+    
+    def chat(self, messages: list, topic: str, system_prompt=None, **kwargs) -> str:
+        return self.generate_response(topic)
+    
+    def analyze_concept(self, concept_name: str, user_explanation: str, **kwargs) -> Dict[str, Any]:
+        return {"concept": concept_name, "by": self.generate_response(concept_name)}
+    
+    def stream_response(self, prompt: str, **kwargs):
+        yield self.generate_response(prompt)
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        return {"provider": self.name, "model": self.model}
+    
+    async def agenerate_response(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.name
+
+
+# =============================================================================
+# SINGLE-FLIGHT
+# =============================================================================
+
+def test_async_waiter_retries_after_leader_cancelled():
+    group = AsyncSingleFlight()
+    calls: List[str] = []
+    
+    async def call(who: str) -> str:
+        calls.append(who)
+        await asyncio.sleep(0.05)
+        return who
+    
+    async def main():
+        leader = asyncio.ensure_future(group.do("key", lambda: call("leader")))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(group.do("key", lambda: call("waiter")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+    
+    # The waiter's request is still alive: it makes the call itself
+    assert asyncio.run(main()) == "waiter"
+    assert calls == ["leader", "waiter"]
+    assert group.stats()["in_flight"] == 0
+
+
+def test_waiter_retries_after_leader_deadline():
+    group = SingleFlight()
+    calls: List[str] = []
+    leader_started = threading.Event()
+    leader_error: List[BaseException] = []
+    
+    def slow_call(who: str) -> str:
+        calls.append(who)
+        leader_started.set()
+        time.sleep(0.1)
+        raise DeadlineExceeded()
+    
+    def lead():
+        token = set_deadline(0.05)
+        try:
+            group.do("key", lambda: slow_call("leader"))
+        except DeadlineExceeded as e:
+            leader_error.append(e)
+        finally:
+            reset_deadline(token)
+    
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert leader_started.wait(1.0)
+    
+    def answer() -> str:
+        calls.append("waiter")
+        return "answer"
+    
+    # No deadline of its own: the leader's blown deadline isn't shared
+    assert group.do("key", answer) == "answer"
+    leader.join()
+    assert len(leader_error) == 1
+    assert calls == ["leader", "waiter"]
+
+
+def test_waiter_shares_leader_error():
+    group = SingleFlight()
+    started = threading.Event()
+    
+    def failing() -> str:
+        started.set()
+        time.sleep(0.05)
+        raise ValueError("upstream down")
+    
+    errors: List[BaseException] = []
+    
+    def lead():
+        try:
+            group.do("key", failing)
+        except ValueError as e:
+            errors.append(e)
+    
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert started.wait(1.0)
+    with pytest.raises(ValueError):
+        group.do("key", lambda: "never called")
+    leader.join()
+    assert len(errors) == 1
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.0, half_open_probes=1)
+    assert breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def test_release_gives_back_half_open_probe():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_cancelled_probe_releases_its_slot():
+    breaker = _half_open_breaker()
+    inner = StubClient("slow", delay=1.0)
+    client = BreakerClient(inner, breaker)
+    
+    async def main():
+        probe = asyncio.ensure_future(client.agenerate_response("hi"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+    
+    asyncio.run(main())
+    assert inner.cancelled == 1
+    # Still half-open, and the next request may probe
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+# =============================================================================
+# HEDGING
+# =============================================================================
+
+def _hedged(primary_delay: float, secondary_delay: float) -> Tuple[HedgedClient, StubClient, StubClient]:
+    primary = StubClient("primary", primary_delay)
+    secondary = StubClient("secondary", secondary_delay)
+    client = HedgedClient(primary, secondary, initial_delay=0.02, min_delay=0.01)
+    return client, primary, secondary
+
+
+def _count(name: str) -> int:
+    return hedge_stats.snapshot()[name]
+
+
+def test_async_hedge_win_cancels_primary():
+    client, primary, _ = _hedged(primary_delay=1.0, secondary_delay=0.0)
+    wins = _count("hedge_wins")
+    
+    async def main():
+        answer = await client.agenerate_response("hi")
+        return answer, answered_by(client, "primary")
+    
+    answer, (provider, model) = asyncio.run(main())
+    assert answer == "secondary"
+    assert (provider, model) == ("secondary", "secondary-model")
+    assert primary.cancelled == 1
+    assert _count("hedge_wins") == wins + 1
+
+
+def test_async_primary_win_cancels_hedge():
+    # The primary answers after the hedge fired, before the secondary does
+    client, _, secondary = _hedged(primary_delay=0.05, secondary_delay=1.0)
+    
+    async def main():
+        answer = await client.agenerate_response("hi")
+        return answer, answered_by(client, "primary")
+    
+    answer, (provider, _) = asyncio.run(main())
+    assert answer == "primary"
+    assert provider == "primary"
+    assert secondary.calls == 1
+    assert secondary.cancelled == 1
+
+
+def test_sync_hedge_win_reports_secondary():
+    client, primary, secondary = _hedged(primary_delay=0.3, secondary_delay=0.0)
+    
+    assert client.generate_response("hi") == "secondary"
+    assert answered_by(client, "primary") == ("secondary", "secondary-model")
+    
+    # A fast primary is never hedged, and the attribution follows the call
+    primary.delay = 0.0
+    secondary_calls = secondary.calls
+    assert client.generate_response("hi") == "primary"
+    assert answered_by(client, "primary") == ("primary", "primary-model")
+    assert secondary.calls == secondary_calls
@@ -0,0 +1,417 @@
+"""
+Per-request tracing.
+
+Every request gets a trace: a root span for the request and child spans
+for the stages it goes through (validate, client, prompt, upstream, parse,
+fallback). Spans follow the request through context variables, the same
+way deadlines do, so provider clients and batch worker threads (run with
+a copy of the caller's context) attach theirs to the right trace.
+
+What each trace is used for:
+- Server-Timing: responses report their stage durations, so browser dev
+  tools show where the time went (SERVER_TIMING_ENABLED, off by default);
+- export: a sampled fraction (TRACE_SAMPLE_RATE, or the sampled flag of an
+  incoming W3C traceparent header) is handed to a background thread and
+  either written to the structured log or sent to an OpenTelemetry
+  collector as OTLP/HTTP JSON (TRACE_EXPORTER).
+
+Outside a request (or with TRACING_ENABLED off) span() is a no-op.
+
+Example:
+    with span("prompt"):
+        messages = build_messages(...)
+"""
+
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import config
+
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Spans kept per trace; a large batch shouldn't grow a trace without bound
+MAX_SPANS_PER_TRACE = 256
+
+# Traces waiting for the exporter; beyond this they are dropped
+MAX_EXPORT_QUEUE = 1024
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+# =============================================================================
+# SPANS
+# =============================================================================
+
+class Span:
+    """One timed stage of a request."""
+    
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "_started", "duration",
+                 "attributes", "error")
+    
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+    
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute."""
+        self.attributes[key] = value
+    
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+            self.end_ns = self.start_ns + int(self.duration * 1e9)
+    
+    def elapsed(self) -> float:
+        """Seconds since the span started (its duration once ended)."""
+        return self.duration if self.duration is not None else time.perf_counter() - self._started
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced."""
+    
+    __slots__ = ()
+    
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one request."""
+    
+    __slots__ = ("trace_id", "sampled", "root", "spans", "_lock")
+    
+    def __init__(self, trace_id: str, sampled: bool, root: Span):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.root = root
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+    
+    def add(self, finished: Span) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(finished)
+    
+    def finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self.spans)
+
+
+# Current (trace, span) of the running request, if traced
+_current: contextvars.ContextVar[Optional[Tuple[Trace, Span]]] = contextvars.ContextVar(
+    "trace_span", default=None
+)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    Time a block as a child of the current span.
+    
+    Also usable as a decorator on sync functions. Exceptions are recorded
+    on the span and re-raised.
+    """
+    current = _current.get()
+    if current is None:
+        yield _NOOP_SPAN
+        return
+    
+    trace, parent = current
+    child = Span(name, parent.span_id, attributes)
+    token = _current.set((trace, child))
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+        trace.add(child)
+
+
+def current_ids() -> Tuple[Optional[str], Optional[str]]:
+    """(trace_id, span_id) of the current span, for log records."""
+    current = _current.get()
+    if current is None:
+        return None, None
+    trace, active = current
+    return trace.trace_id, active.span_id
+
+
+# =============================================================================
+# REQUEST TRACES
+# =============================================================================
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Optional[Trace]:
+    """
+    Start the trace of a request and make its root span current.
+    
+    Args:
+        name: Root span name, e.g. "POST /mentor".
+        traceparent: Incoming W3C traceparent header; the trace continues
+            the caller's and follows its sampling decision.
+    
+    Returns:
+        The trace, or None when TRACING_ENABLED is off.
+    """
+    if not config.tracing_enabled:
+        return None
+    
+    match = _TRACEPARENT.match((traceparent or "").strip().lower())
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        sampled = bool(int(flags, 16) & 1)
+    else:
+        trace_id, parent_id = _new_id(16), None
+        sampled = random.random() < config.trace_sample_rate
+    
+    root = Span(name, parent_id, attributes)
+    trace = Trace(trace_id, sampled, root)
+    _current.set((trace, root))
+    return trace
+
+
+def finish_trace(trace: Trace, **attributes: Any) -> None:
+    """End a request's root span and queue the trace for export if sampled."""
+    _current.set(None)
+    if trace.root.duration is not None:
+        return
+    trace.root.attributes.update(attributes)
+    trace.root.end()
+    if trace.sampled and config.trace_exporter in ("log", "otlp"):
+        _exporter.submit(trace)
+
+
+def server_timing(trace: Trace) -> str:
+    """
+    Server-Timing header value: finished stages by name plus the total.
+    
+    Repeated stages (e.g. one upstream span per batch item) are summed.
+    """
+    totals: Dict[str, float] = {}
+    for finished in trace.finished_spans():
+        totals[finished.name] = totals.get(finished.name, 0.0) + finished.duration
+    totals["total"] = trace.root.elapsed()
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, exported: Span, kind: int) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {
+        "traceId": trace.trace_id,
+        "spanId": exported.span_id,
+        "name": exported.name,
+        "kind": kind,
+        "startTimeUnixNano": str(exported.start_ns),
+        "endTimeUnixNano": str(exported.end_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in exported.attributes.items()
+        ],
+    }
+    if exported.parent_id:
+        entry["parentSpanId"] = exported.parent_id
+    if exported.error:
+        entry["status"] = {"code": 2, "message": exported.error}
+    return entry
+
+
+def otlp_payload(traces: List[Trace]) -> Dict[str, Any]:
+    """An OTLP/HTTP JSON ExportTraceServiceRequest for finished traces."""
+    spans = []
+    for trace in traces:
+        spans.append(_otlp_span(trace, trace.root, kind=2))     # SPAN_KIND_SERVER
+        spans.extend(_otlp_span(trace, child, kind=1) for child in trace.finished_spans())
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": config.trace_service_name}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "ai_assistant"}, "spans": spans}],
+        }],
+    }
+
+
+class _Exporter:
+    """Ships sampled traces from a background thread, in batches."""
+    
+    BATCH_SIZE = 64
+    FLUSH_INTERVAL = 2.0
+    
+    def __init__(self):
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=MAX_EXPORT_QUEUE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"exported": 0, "dropped": 0, "failed": 0}
+    
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self._stats["dropped"] += 1
+    
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+    
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+    
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            flush_at = time.monotonic() + self.FLUSH_INTERVAL
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(flush_at - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._export(batch)
+                self._stats["exported"] += len(batch)
+            except Exception as e:
+                self._stats["failed"] += len(batch)
+                from logs import get_logger
+                get_logger("trace").warning(f"Trace export failed: {e}")
+    
+    @staticmethod
+    def _export(batch: List[Trace]) -> None:
+        if config.trace_exporter == "otlp":
+            body = json.dumps(otlp_payload(batch)).encode("utf-8")
+            request = urllib.request.Request(
+                config.trace_otlp_endpoint,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        elif config.trace_exporter == "log":
+            from logs import get_logger
+            log = get_logger("trace")
+            for trace in batch:
+                for exported in [trace.root] + trace.finished_spans():
+                    log.info(exported.name, extra={"fields": {
+                        "trace_id": trace.trace_id,
+                        "span_id": exported.span_id,
+                        "parent_id": exported.parent_id,
+                        "duration_ms": round(exported.duration * 1000, 2),
+                        "error": exported.error,
+                        **exported.attributes,
+                    }})
+
+
+_exporter = _Exporter()
+
+
+def trace_export_stats() -> Dict[str, int]:
+    """Export counters, for /health."""
+    return _exporter.stats()
+
+
+# =============================================================================
+# APP INTEGRATION
+# =============================================================================
+
+def install_flask_tracing(app) -> None:
+    """Trace every request of a Flask app and add Server-Timing headers."""
+    from flask import g, request
+    
+    @app.before_request
+    def start_request_trace():
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        g.trace = start_trace(
+            f"{request.method} {route}",
+            request.headers.get(TRACEPARENT_HEADER),
+            **{"http.method": request.method, "http.route": route},
+        )
+    
+    @app.after_request
+    def add_server_timing(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.root.set("http.status_code", response.status_code)
+            if config.server_timing_enabled:
+                response.headers["Server-Timing"] = server_timing(trace)
+        return response
+    
+    @app.teardown_request
+    def finish_request_trace(exc):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            if exc is not None:
+                trace.root.error = f"{type(exc).__name__}: {exc}"
+            finish_trace(trace)
+
+
+def install_quart_tracing(app) -> None:
+    """Async version of install_flask_tracing() for the Quart app."""
+    from quart import g, request
+    
+    @app.before_request
+    async def start_request_trace():
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        g.trace = start_trace(
+            f"{request.method} {route}",
+            request.headers.get(TRACEPARENT_HEADER),
+            **{"http.method": request.method, "http.route": route},
+        )
+    
+    @app.after_request
+    async def add_server_timing(response):
+        trace = g.get("trace")
+        if trace is not None:
+            trace.root.set("http.status_code", response.status_code)
+            if config.server_timing_enabled:
+                response.headers["Server-Timing"] = server_timing(trace)
+        return response
+    
+    @app.teardown_request
+    async def finish_request_trace(exc):
+        trace = g.pop("trace", None)
+        if trace is not None:
+            if exc is not None:
+                trace.root.error = f"{type(exc).__name__}: {exc}"
+            finish_trace(trace)